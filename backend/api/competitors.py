@@ -1,59 +1,122 @@
 # backend/api/competitors.py
 from flask import Blueprint, request, jsonify
-import pymysql
-from config import Config
+from services.db_pool import get_connection
 from datetime import datetime
+from utils.serp_context import invalidate_school_domains
+from utils.serp_competitors_helper import update_competitors_competitiveness
 
 competitors_bp = Blueprint('competitors', __name__)
 
 def get_db_connection():
-    """Создание подключения к БД"""
-    return pymysql.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD,
-        database=Config.DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
-    )
+    """Соединение из общего пула (close() возвращает его в пул)"""
+    return get_connection()
+
+# Разрешённые поля сортировки списка конкурентов
+COMPETITORS_SORT_FIELDS = {
+    'competitiveness': 'c.competitiveness',
+    'domain': 'c.domain',
+    'org_type': 'c.org_type',
+    'last_seen_at': 'c.last_seen_at',
+    'created_at': 'c.created_at',
+    'is_new': 'c.is_new'
+}
+
+COMPETITORS_MAX_PER_PAGE = 500
 
 @competitors_bp.route('/list', methods=['GET'])
 def get_competitors():
-    """Получение списка всех конкурентов"""
+    """
+    Получение списка конкурентов
+    
+    Конкурентность читается из поддерживаемой колонки competitor_schools.competitiveness.
+    
+    Query параметры (все необязательные, без page/per_page возвращается весь список):
+    - page, per_page - пагинация
+    - sort - поле сортировки (competitiveness, domain, org_type, last_seen_at, created_at, is_new)
+    - order - asc / desc
+    - org_type - фильтр по типу организации
+    - is_new - фильтр по флагу новых (true / false)
+    - search - поиск по домену
+    """
     connection = None
     try:
         print("📋 GET /api/competitors/list called")
+        
+        sort = request.args.get('sort', 'competitiveness')
+        if sort not in COMPETITORS_SORT_FIELDS:
+            return jsonify({'success': False, 'error': f'Недопустимое поле сортировки: {sort}'}), 400
+        default_order = 'desc' if sort == 'competitiveness' else 'asc'
+        order = request.args.get('order', default_order).lower()
+        if order not in ('asc', 'desc'):
+            return jsonify({'success': False, 'error': f'Недопустимый порядок сортировки: {order}'}), 400
+        
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', type=int)
+        paginate = page is not None or per_page is not None
+        if paginate:
+            page = max(page or 1, 1)
+            per_page = min(max(per_page or 50, 1), COMPETITORS_MAX_PER_PAGE)
+        
+        where = []
+        params = []
+        
+        org_type = request.args.get('org_type')
+        if org_type:
+            where.append("c.org_type = %s")
+            params.append(org_type)
+        
+        is_new = request.args.get('is_new')
+        if is_new is not None and is_new != '':
+            # Без функций над колонкой - фильтр использует idx_competitor_org_type
+            if is_new.lower() in ('1', 'true', 'yes'):
+                where.append("c.is_new = TRUE")
+            else:
+                where.append("(c.is_new = FALSE OR c.is_new IS NULL)")
+        
+        search = request.args.get('search', '').strip().lower()
+        if search:
+            where.append("c.domain LIKE %s")
+            params.append(f"%{search}%")
+        
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        
+        # Домен - вторичный ключ для стабильного порядка страниц
+        order_sql = f"{COMPETITORS_SORT_FIELDS[sort]} {order.upper()}"
+        if sort != 'domain':
+            order_sql += ", c.domain ASC"
+        
         connection = get_db_connection()
         cursor = connection.cursor()
         
-        cursor.execute("""
+        query = f"""
             SELECT 
                 c.id,
                 c.domain,
                 c.org_type,
                 c.notes,
                 COALESCE(c.is_new, FALSE) as is_new,
+                COALESCE(c.competitiveness, 0) as competitiveness,
                 c.last_seen_at,
                 c.created_at,
-                c.updated_at,
-                (
-                    SELECT COUNT(DISTINCT sa.keyword_id)
-                    FROM serp_competitor_appearances sca2
-                    JOIN serp_analysis_history sa ON sca2.serp_analysis_id = sa.id
-                    WHERE sca2.competitor_id = c.id
-                    AND sa.id IN (
-                        SELECT MAX(id) 
-                        FROM serp_analysis_history 
-                        GROUP BY keyword_id
-                    )
-                ) as competitiveness
+                c.updated_at
             FROM competitor_schools c
-            ORDER BY competitiveness DESC, c.domain ASC
-        """)
+            {where_sql}
+            ORDER BY {order_sql}
+        """
+        
+        if paginate:
+            cursor.execute(f"SELECT COUNT(*) as total FROM competitor_schools c {where_sql}", params)
+            total = cursor.fetchone()['total']
+            cursor.execute(query + " LIMIT %s OFFSET %s", params + [per_page, (page - 1) * per_page])
+        else:
+            cursor.execute(query, params)
         
         competitors = cursor.fetchall()
         
-        print(f"✅ Loaded {len(competitors)} competitors")
+        if not paginate:
+            total = len(competitors)
+        
+        print(f"✅ Loaded {len(competitors)} of {total} competitors")
         
         # Преобразуем данные
         for comp in competitors:
@@ -65,14 +128,20 @@ def get_competitors():
                 comp['updated_at'] = comp['updated_at'].isoformat()
             # Преобразуем is_new в boolean
             comp['is_new'] = bool(comp.get('is_new', 0))
-            print(f"  - {comp['domain']}: is_new={comp['is_new']}, competitiveness={comp.get('competitiveness', 0)}")
         
         cursor.close()
         
-        return jsonify({
+        result = {
             'success': True,
-            'competitors': competitors
-        })
+            'competitors': competitors,
+            'total': total
+        }
+        if paginate:
+            result['page'] = page
+            result['per_page'] = per_page
+            result['pages'] = (total + per_page - 1) // per_page
+        
+        return jsonify(result)
         
     except Exception as e:
         print(f"❌ Error getting competitors: {str(e)}")
@@ -120,6 +189,7 @@ def add_competitor():
         """, (domain, org_type, notes))
         
         connection.commit()
+        invalidate_school_domains()
         new_id = cursor.lastrowid
         cursor.close()
         
@@ -174,6 +244,7 @@ def update_competitor():
             """, (value, competitor_id))
         
         connection.commit()
+        invalidate_school_domains()
         cursor.close()
         
         return jsonify({
@@ -211,6 +282,7 @@ def delete_competitors():
         cursor.execute(query, ids)
         
         connection.commit()
+        invalidate_school_domains()
         deleted_count = cursor.rowcount
         cursor.close()
         
@@ -267,40 +339,18 @@ def get_competitor_stats():
 @competitors_bp.route('/update-competitiveness', methods=['POST'])
 def update_competitiveness():
     """
-    Пересчёт конкурентности для всех конкурентов
-    Вызывается после выполнения SERP-анализа
+    Полный пересчёт конкурентности для всех конкурентов
+    При SERP-анализе конкурентность обновляется инкрементально,
+    пересчёт нужен для сверки
     """
     connection = None
     try:
         connection = get_db_connection()
-        cursor = connection.cursor()
         
         # Пересчитываем конкурентность для всех доменов
-        cursor.execute("""
-            UPDATE competitor_schools c
-            SET competitiveness = (
-                SELECT COUNT(DISTINCT sa.keyword_id)
-                FROM serp_competitor_appearances sca
-                JOIN serp_analysis_history sa ON sca.serp_analysis_id = sa.id
-                WHERE sca.competitor_id = c.id
-                AND sa.id IN (
-                    SELECT MAX(id) 
-                    FROM serp_analysis_history 
-                    GROUP BY keyword_id
-                )
-            ),
-            last_seen_at = (
-                SELECT MAX(sa.analysis_date)
-                FROM serp_competitor_appearances sca
-                JOIN serp_analysis_history sa ON sca.serp_analysis_id = sa.id
-                WHERE sca.competitor_id = c.id
-            ),
-            updated_at = NOW()
-        """)
+        updated_count = update_competitors_competitiveness(connection)
         
         connection.commit()
-        updated_count = cursor.rowcount
-        cursor.close()
         
         return jsonify({
             'success': True,
@@ -336,6 +386,7 @@ def accept_competitors_changes():
         """)
         
         connection.commit()
+        invalidate_school_domains()
         updated_count = cursor.rowcount
         cursor.close()
         
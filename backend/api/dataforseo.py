@@ -1,133 +1,134 @@
 # api/dataforseo.py - ПОЛНОСТЬЮ ПЕРЕРАБОТАННАЯ ВЕРСИЯ
-import sys
 import json
 import time
 import uuid
 from typing import Dict
 from flask import Blueprint, request, jsonify, Response, stream_with_context
 from config import Config
-import pymysql
+from services.db_pool import get_connection
 from datetime import datetime
-from services.dataforseo_client import get_dataforseo_client, DataForSeoClient
-from utils.serp_competitors_helper import save_serp_competitors
-from api.keywords import get_random_batch_color
+from services.dataforseo_client import get_dataforseo_client, get_pool_stats, DataForSeoClient
+from utils.serp_competitors_helper import save_serp_competitors, lock_keyword_for_analysis
+from utils.serp_context import SerpAnalysisContext, load_school_domains
+from services.payload_store import store_payload, resolve_payload, payload_sql
+from utils.streaming import get_stream_format, stream_query_response, stream_text_response
+from services.job_queue import job_handler, enqueue_job, requeue_job, get_job_progress, job_event, JobCancelled
+from services.progress_bus import progress_bus
+from services.progress_store import TERMINAL_EVENT_TYPES
+from api.keywords import get_random_batch_color, invalidate_campaigns_cache
+from utils.logging_setup import get_logger, trace, job_log_context
 
 dataforseo_bp = Blueprint('dataforseo', __name__)
 
-# Глобальное хранилище прогресса задач
-SERP_PROGRESS = {}
+logger = get_logger('dataforseo')
 
-# Принудительный flush для логов
 def log_print(*args, **kwargs):
-    print(*args, **kwargs)
-    sys.stdout.flush()
+    """
+    Информационная запись в лог модуля (бывший print + flush); пустые
+    строки-разделители пропускаются. Ошибки и предупреждения - напрямую
+    logger.error / logger.warning / logger.exception, подробности горячих
+    циклов - trace().
+    """
+    message = ' '.join(str(arg) for arg in args).strip('\n')
+    if message.strip():
+        logger.info(message)
 
 def get_db_connection():
-    """Создаёт прямое подключение к БД"""
-    return pymysql.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD,
-        database=Config.DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
-    )
+    """Соединение из общего пула (close() возвращает его в пул)"""
+    return get_connection()
 
-def update_progress(task_id: str, current: int, total: int, keyword: str = '', status: str = 'processing'):
-    """Обновляет прогресс задачи"""
-    SERP_PROGRESS[task_id] = {
-        'current': current,
-        'total': total,
-        'keyword': keyword,
-        'status': status,
-        'timestamp': time.time()
-    }
-    log_print(f"📊 Progress updated: {current}/{total} - {keyword}")
+def sse_event(event: dict, event_id: int = None) -> str:
+    """Сообщение SSE (с id - для возобновления через Last-Event-ID)"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{prefix}data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
 
-def get_progress(task_id: str) -> Dict:
-    """Получает прогресс задачи"""
-    return SERP_PROGRESS.get(task_id, {
-        'current': 0,
-        'total': 0,
-        'keyword': '',
-        'status': 'not_found'
-    })
+def sync_progress_from_db(task_id: str):
+    """
+    Публикует в шину состояние задачи из background_jobs, если шина его ещё не знает
+    (задача выполняется другим процессом). Возвращает строку задачи или None.
+    """
+    job = get_job_progress(task_id)
+    if not job:
+        return None
+    
+    event = job_event(job)
+    last = progress_bus.last_event(task_id)
+    state = (event['type'], event.get('current'), event.get('total'), event.get('keyword'))
+    if last is None or state != (last[1]['type'], last[1].get('current'), last[1].get('total'), last[1].get('keyword')):
+        progress_bus.publish(task_id, event)
+    return job
 
-def cleanup_progress(task_id: str):
-    """Очищает прогресс задачи"""
-    if task_id in SERP_PROGRESS:
-        del SERP_PROGRESS[task_id]
-        log_print(f"🧹 Progress cleaned up for task {task_id}")
-        
 @dataforseo_bp.route('/apply-serp-sse', methods=['GET'])
 def apply_serp_sse():
-    """SSE endpoint для получения прогресса SERP анализа"""
+    """
+    SSE endpoint для получения прогресса SERP анализа
+    
+    События приходят из services/progress_bus.py сразу после публикации
+    исполнителем задачи. Ограничения по времени нет: соединение живёт до
+    завершения задачи, heartbeat-комментарии не дают прокси его закрыть.
+    После обрыва браузер переподключается с Last-Event-ID и получает
+    пропущенные события.
+    """
     task_id = request.args.get('task_id')
     
     if not task_id:
         return jsonify({'error': 'task_id required'}), 400
     
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+    
     def generate():
         """Генератор событий SSE"""
-        log_print(f"🔄 SSE stream started for task {task_id}")
+        log_print(f"🔄 SSE stream started for task {task_id} (last_event_id={last_event_id})")
         
         # Ждем появления задачи (макс 5 сек)
+        # Состояние из БД нужно и общей шине: задача могла ещё не опубликовать ни одного события
         wait_time = 0
-        while task_id not in SERP_PROGRESS and wait_time < 5:
-            time.sleep(0.1)
-            wait_time += 0.1
-        
-        if task_id not in SERP_PROGRESS:
-            yield f"data: {json.dumps({'type': 'error', 'message': 'Task not found'})}\n\n"
+        job = sync_progress_from_db(task_id)
+        while not job and wait_time < 5:
+            time.sleep(0.5)
+            wait_time += 0.5
+            job = sync_progress_from_db(task_id)
+        
+        if not job:
+            yield sse_event({'type': 'error', 'message': 'Task not found'})
             return
         
-        # Отправляем события прогресса
-        last_current = -1
-        max_wait = 300  # 5 минут максимум
-        start_time = time.time()
+        # Интервал переподключения браузера после обрыва (мс)
+        yield "retry: 3000\n\n"
+        
+        last_id = last_event_id
+        if not last_id:
+            # Новое подключение: только текущее состояние, без истории событий
+            last = progress_bus.last_event(task_id)
+            if last:
+                last_id = last[0] - 1
+        
+        last_sync = last_sent = time.monotonic()
+        wait_timeout = min(Config.SSE_HEARTBEAT_INTERVAL, Config.SSE_DB_SYNC_INTERVAL)
         
         while True:
-            if time.time() - start_time > max_wait:
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Timeout'})}\n\n"
-                break
+            for event_id, event in progress_bus.wait(task_id, last_id, wait_timeout):
+                last_id = event_id
+                last_sent = time.monotonic()
+                yield sse_event(event, event_id)
+                if event['type'] in TERMINAL_EVENT_TYPES:
+                    log_print(f"🔚 SSE stream ended for task {task_id}")
+                    return
             
-            progress = get_progress(task_id)
+            # Пока события идут из шины (или она общая для процессов), БД не трогаем
+            now = time.monotonic()
+            if not progress_bus.shared and now - max(last_sync, last_sent) >= Config.SSE_DB_SYNC_INTERVAL:
+                last_sync = now
+                if not sync_progress_from_db(task_id):
+                    yield sse_event({'type': 'error', 'message': 'Task not found'})
+                    return
             
-            # Отправляем только если прогресс изменился
-            if progress['current'] != last_current:
-                last_current = progress['current']
-                
-                if progress['status'] == 'processing':
-                    event_data = {
-                        'type': 'progress',
-                        'current': progress['current'],
-                        'total': progress['total'],
-                        'keyword': progress['keyword']
-                    }
-                    yield f"data: {json.dumps(event_data)}\n\n"
-                    
-                elif progress['status'] == 'complete':
-                    event_data = {
-                        'type': 'complete',
-                        'message': progress.get('message', 'Completed'),
-                        'result': progress.get('result', {})
-                    }
-                    yield f"data: {json.dumps(event_data)}\n\n"
-                    cleanup_progress(task_id)
-                    break
-                    
-                elif progress['status'] == 'error':
-                    event_data = {
-                        'type': 'error',
-                        'message': progress.get('error', 'Unknown error')
-                    }
-                    yield f"data: {json.dumps(event_data)}\n\n"
-                    cleanup_progress(task_id)
-                    break
-            
-            time.sleep(0.5)  # Проверяем каждые 0.5 секунды
-        
-        log_print(f"🔚 SSE stream ended for task {task_id}")
+            if now - last_sent >= Config.SSE_HEARTBEAT_INTERVAL:
+                last_sent = now
+                yield ": ping\n\n"
     
     return Response(
         stream_with_context(generate()),
@@ -155,7 +156,7 @@ def test_endpoint():
             'timestamp': str(datetime.utcnow())
         })
     except Exception as e:
-        log_print(f"❌ Test endpoint error: {e}")
+        logger.error(f"❌ Test endpoint error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @dataforseo_bp.route('/get-keywords-simple', methods=['POST'])
@@ -183,24 +184,167 @@ def get_keywords_simple():
             }
         })
     except Exception as e:
-        log_print(f"❌ Simple test error: {e}")
+        logger.error(f"❌ Simple test error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@dataforseo_bp.route('/get-keywords', methods=['POST'])
-def get_new_keywords():
-    """Получение новой выдачи ключевых слов через DataForSeo"""
-    connection = None
+# Колонки метрик, которые обновляются у существующих ключевых слов
+KEYWORD_METRIC_COLUMNS = (
+    'avg_monthly_searches', 'competition', 'competition_percent',
+    'min_top_of_page_bid', 'max_top_of_page_bid', 'three_month_change',
+    'yearly_change', 'max_cpc'
+)
+
+def keyword_metrics(kw_data: dict, default_cpc) -> tuple:
+    """Значения KEYWORD_METRIC_COLUMNS из ответа DataForSeo"""
+    return (
+        kw_data.get('avg_monthly_searches', 0),
+        kw_data.get('competition', 'Неизвестно'),
+        kw_data.get('competition_percent', 0),
+        kw_data.get('min_top_of_page_bid', 0),
+        kw_data.get('max_top_of_page_bid', 0),
+        kw_data.get('three_month_change'),
+        kw_data.get('yearly_change'),
+        kw_data.get('cpc', default_cpc)
+    )
+
+def ingest_keywords(cursor, campaign_id, ad_group_id, keywords_data, batch_color, exclude_trash_duplicates=True):
+    """
+    Пакетное добавление ключевых слов из DataForSeo в группу
     
-    log_print("=" * 50)
-    log_print("🚀 GET-KEYWORDS ENDPOINT ВЫЗВАН!")
-    log_print("=" * 50)
+    Существующие слова группы загружаются одним запросом, дальше каждое
+    слово раскладывается в один из трёх пакетов:
+    - новое -> INSERT (is_new, batch_color)
+    - существующее -> обновление метрик
+    - в корзине при exclude_trash_duplicates=False -> восстановление
+    
+    Returns:
+        (added, updated, restored, errors)
+    """
+    # Сравнение без учёта регистра - как в collation utf8mb4_unicode_ci
+    cursor.execute("""
+        SELECT id, keyword, status, max_cpc 
+        FROM keywords 
+        WHERE ad_group_id = %s 
+        ORDER BY id
+    """, (ad_group_id,))
+    
+    existing_by_keyword = {}
+    for row in cursor.fetchall():
+        key = row['keyword'].lower()
+        current = existing_by_keyword.get(key)
+        if current is None:
+            existing_by_keyword[key] = row
+        elif not exclude_trash_duplicates and current['status'] == 'Removed' and row['status'] != 'Removed':
+            # Активная запись важнее дубля из корзины
+            existing_by_keyword[key] = row
+    
+    new_rows = {}
+    update_rows = {}
+    restore_rows = {}
+    updated_count = 0
+    
+    for kw_data in keywords_data:
+        keyword_text = kw_data['keyword']
+        key = keyword_text.lower()
+        existing = existing_by_keyword.get(key)
+        
+        if existing is None:
+            if key in new_rows:
+                # Повтор в ответе API - обновляет только что добавленное слово
+                updated_count += 1
+            new_rows[key] = (
+                campaign_id, ad_group_id, keyword_text, 'Phrase', 'Enabled',
+                *keyword_metrics(kw_data, 3.61),
+                'Информационный',  # Значение по умолчанию, будет определено через SERP
+                True,  # is_new
+                batch_color,
+                False,  # has_ads - по умолчанию
+                False,  # has_school_sites - по умолчанию
+                False,  # has_google_maps - по умолчанию
+                False   # has_our_site - по умолчанию
+            )
+        elif existing['status'] == 'Removed' and not exclude_trash_duplicates:
+            if existing['id'] in restore_rows:
+                # Повтор в ответе API - слово уже восстановлено
+                updated_count += 1
+            # Восстанавливаем слово из корзины
+            restore_rows[existing['id']] = (
+                existing['id'], campaign_id, ad_group_id, existing['keyword'],
+                *keyword_metrics(kw_data, existing['max_cpc']),
+                batch_color
+            )
+        else:
+            update_rows[existing['id']] = (
+                existing['id'], campaign_id, ad_group_id, existing['keyword'],
+                *keyword_metrics(kw_data, existing['max_cpc'])
+            )
+            updated_count += 1
+    
+    errors = []
+    added_count = 0
+    restored_count = 0
+    metric_columns = ', '.join(KEYWORD_METRIC_COLUMNS)
+    metric_placeholders = ', '.join(['%s'] * len(KEYWORD_METRIC_COLUMNS))
+    metric_updates = ', '.join(f'{col} = VALUES({col})' for col in KEYWORD_METRIC_COLUMNS)
+    
+    if new_rows:
+        try:
+            cursor.executemany(f"""
+                INSERT INTO keywords (
+                    campaign_id, ad_group_id, keyword, criterion_type, status,
+                    {metric_columns}, intent_type, is_new, batch_color,
+                    has_ads, has_school_sites, has_google_maps, has_our_site
+                ) VALUES (%s, %s, %s, %s, %s, {metric_placeholders}, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = id
+            """, list(new_rows.values()))
+            # Слово, добавленное параллельным запросом, отсекает уникальный индекс
+            added_count = cursor.rowcount
+        except Exception as e:
+            errors.append(f"Error adding {len(new_rows)} keywords: {str(e)}")
+    
+    # Обновления по первичному ключу: строка всегда существует, поэтому
+    # INSERT ... ON DUPLICATE KEY UPDATE работает как пакетный UPDATE
+    if update_rows:
+        try:
+            cursor.executemany(f"""
+                INSERT INTO keywords (id, campaign_id, ad_group_id, keyword, {metric_columns})
+                VALUES (%s, %s, %s, %s, {metric_placeholders})
+                ON DUPLICATE KEY UPDATE {metric_updates}, updated_at = NOW()
+            """, list(update_rows.values()))
+        except Exception as e:
+            errors.append(f"Error updating {len(update_rows)} keywords: {str(e)}")
+            updated_count = 0
+    
+    if restore_rows:
+        try:
+            cursor.executemany(f"""
+                INSERT INTO keywords (id, campaign_id, ad_group_id, keyword, {metric_columns}, batch_color)
+                VALUES (%s, %s, %s, %s, {metric_placeholders}, %s)
+                ON DUPLICATE KEY UPDATE 
+                    {metric_updates},
+                    status = 'Enabled',
+                    is_new = TRUE,
+                    batch_color = VALUES(batch_color),
+                    updated_at = NOW()
+            """, list(restore_rows.values()))
+            restored_count = len(restore_rows)
+        except Exception as e:
+            errors.append(f"Error restoring {len(restore_rows)} keywords: {str(e)}")
+    
+    log_print(f"💾 Ключевые слова: добавлено={added_count}, обновлено={updated_count}, восстановлено={restored_count}")
+    return added_count, updated_count, restored_count, errors
+
+def fetch_new_keywords(data: dict):
+    """
+    Получение выдачи ключевых слов через DataForSeo и запись в группу
+    Используется /get-keywords и фоновой задачей keyword_fetch.
+    
+    Returns:
+        (результат, HTTP статус)
+    """
+    connection = None
     
     try:
-        # Получаем данные запроса
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'No data in request'}), 400
-        
         seed_keywords = data.get('seed_keywords', [])
         ad_group_id = data.get('ad_group_id')
         
@@ -222,7 +366,7 @@ def get_new_keywords():
         log_print(f"🗑️  Exclude trash duplicates: {exclude_trash_duplicates}")
         
         if not seed_keywords:
-            return jsonify({'success': False, 'error': 'No seed keywords provided'}), 400
+            return {'success': False, 'error': 'No seed keywords provided'}, 400
         
         # Подключаемся к БД
         connection = get_db_connection()
@@ -233,7 +377,7 @@ def get_new_keywords():
         ad_group = cursor.fetchone()
         
         if not ad_group:
-            return jsonify({'success': False, 'error': 'Ad group not found'}), 404
+            return {'success': False, 'error': 'Ad group not found'}, 404
         
         campaign_id = ad_group['campaign_id']
         
@@ -254,182 +398,52 @@ def get_new_keywords():
             
             # Проверяем ответ
             if not response.get('tasks'):
-                return jsonify({
+                return {
                     'success': False,
                     'error': 'No data received from DataForSeo'
-                }), 500
+                }, 500
             
             task = response['tasks'][0]
             if task.get('status_code') != 20000:
                 error_msg = task.get('status_message', 'Unknown error')
-                return jsonify({
+                return {
                     'success': False,
                     'error': f"DataForSeo error: {error_msg}"
-                }), 500
+                }, 500
             
             request_cost = task.get('cost', 0.05)
             log_print(f"💰 Стоимость запроса: ${request_cost}")
             
         except ValueError as e:
-            return jsonify({
+            return {
                 'success': False,
                 'error': f'DataForSeo API не настроен: {str(e)}'
-            }), 400
+            }, 400
         except Exception as e:
-            return jsonify({
+            return {
                 'success': False,
                 'error': f'DataForSeo API error: {str(e)}'
-            }), 500
+            }, 500
         
         # Парсим ответ
         try:
             keywords_data = dataforseo_client.parse_keywords_response(response, limit=limit)
             log_print(f"📈 Получено ключевых слов: {len(keywords_data)}")
         except Exception as e:
-            log_print(f"❌ Ошибка парсинга: {str(e)}")
+            logger.error(f"❌ Ошибка парсинга: {str(e)}")
             keywords_data = []
         
         # Генерируем цвет для новой партии
-        batch_color = get_random_batch_color()
-        
-        # Добавляем ключевые слова в БД
-        added_count = 0
-        updated_count = 0
-        restored_count = 0
-        errors = []
+        batch_color = get_random_batch_color(cursor)
         
-        for kw_data in keywords_data:
-            try:
-                keyword_text = kw_data['keyword']
-                
-                # ✅ ИЗМЕНЕНО: Проверяем существование с учётом exclude_trash_duplicates
-                if exclude_trash_duplicates:
-                    # Учитываем ВСЕ записи (включая Removed) как дубли
-                    cursor.execute(
-                        "SELECT * FROM keywords WHERE ad_group_id = %s AND keyword = %s",
-                        (ad_group_id, keyword_text)
-                    )
-                else:
-                    # Учитываем только активные (не Removed) как дубли
-                    cursor.execute(
-                        "SELECT * FROM keywords WHERE ad_group_id = %s AND keyword = %s AND status != 'Removed'",
-                        (ad_group_id, keyword_text)
-                    )
-                
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # ✅ ДОБАВЛЕНО: Логика восстановления из корзины
-                    if existing['status'] == 'Removed' and not exclude_trash_duplicates:
-                        # Восстанавливаем слово из корзины
-                        update_query = """
-                            UPDATE keywords SET 
-                                status = 'Enabled',
-                                is_new = TRUE,
-                                batch_color = %s,
-                                avg_monthly_searches = %s,
-                                competition = %s,
-                                competition_percent = %s,
-                                min_top_of_page_bid = %s,
-                                max_top_of_page_bid = %s,
-                                three_month_change = %s,
-                                yearly_change = %s,
-                                max_cpc = %s,
-                                updated_at = NOW()
-                            WHERE id = %s
-                        """
-                        
-                        update_data = (
-                            batch_color,
-                            kw_data.get('avg_monthly_searches', 0),
-                            kw_data.get('competition', 'Неизвестно'),
-                            kw_data.get('competition_percent', 0),
-                            kw_data.get('min_top_of_page_bid', 0),
-                            kw_data.get('max_top_of_page_bid', 0),
-                            kw_data.get('three_month_change'),
-                            kw_data.get('yearly_change'),
-                            kw_data.get('cpc', existing['max_cpc']),
-                            existing['id']
-                        )
-                        
-                        cursor.execute(update_query, update_data)
-                        restored_count += 1
-                        log_print(f"  ✅ Восстановлено из корзины: {keyword_text}")
-                    else:
-                        # Обновляем существующее (только основные данные)
-                        update_query = """
-                            UPDATE keywords SET 
-                                avg_monthly_searches = %s,
-                                competition = %s,
-                                competition_percent = %s,
-                                min_top_of_page_bid = %s,
-                                max_top_of_page_bid = %s,
-                                three_month_change = %s,
-                                yearly_change = %s,
-                                max_cpc = %s,
-                                updated_at = NOW()
-                            WHERE id = %s
-                        """
-                        
-                        update_data = (
-                            kw_data.get('avg_monthly_searches', 0),
-                            kw_data.get('competition', 'Неизвестно'),
-                            kw_data.get('competition_percent', 0),
-                            kw_data.get('min_top_of_page_bid', 0),
-                            kw_data.get('max_top_of_page_bid', 0),
-                            kw_data.get('three_month_change'),
-                            kw_data.get('yearly_change'),
-                            kw_data.get('cpc', existing['max_cpc']),
-                            existing['id']
-                        )
-                        
-                        cursor.execute(update_query, update_data)
-                        updated_count += 1
-                        log_print(f"  🔄 Обновлено: {keyword_text}")
-                else:
-                    # Создаем новое
-                    insert_query = """
-                        INSERT INTO keywords (
-                            campaign_id, ad_group_id, keyword, criterion_type, status,
-                            avg_monthly_searches, competition, competition_percent,
-                            min_top_of_page_bid, max_top_of_page_bid, three_month_change,
-                            yearly_change, max_cpc, intent_type, is_new, batch_color,
-                            has_ads, has_school_sites, has_google_maps, has_our_site
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    
-                    insert_data = (
-                        campaign_id,
-                        ad_group_id,
-                        keyword_text,
-                        'Phrase',
-                        'Enabled',
-                        kw_data.get('avg_monthly_searches', 0),
-                        kw_data.get('competition', 'Неизвестно'),
-                        kw_data.get('competition_percent', 0),
-                        kw_data.get('min_top_of_page_bid', 0),
-                        kw_data.get('max_top_of_page_bid', 0),
-                        kw_data.get('three_month_change'),
-                        kw_data.get('yearly_change'),
-                        kw_data.get('cpc', 3.61),
-                        'Информационный',  # Значение по умолчанию, будет определено через SERP
-                        True,  # is_new
-                        batch_color,  # batch_color
-                        False,  # has_ads - по умолчанию
-                        False,  # has_school_sites - по умолчанию
-                        False,  # has_google_maps - по умолчанию
-                        False   # has_our_site - по умолчанию
-                    )
-                    
-                    cursor.execute(insert_query, insert_data)
-                    added_count += 1
-                    log_print(f"  ➕ Добавлено новое: {keyword_text}")
-                    
-            except Exception as e:
-                errors.append(f"Error processing '{kw_data.get('keyword', 'unknown')}': {str(e)}")
+        # Добавляем ключевые слова в БД пакетно
+        added_count, updated_count, restored_count, errors = ingest_keywords(
+            cursor, campaign_id, ad_group_id, keywords_data, batch_color, exclude_trash_duplicates
+        )
         
         # Сохраняем в БД
         connection.commit()
+        invalidate_campaigns_cache()
         
         # ✅ ИЗМЕНЕНО: Добавлен restored_count в статистику
         message_parts = [f'Обработано {len(keywords_data)} ключевых слов']
@@ -459,17 +473,68 @@ def get_new_keywords():
         
         log_print(f"✅ Завершено: добавлено={added_count}, обновлено={updated_count}, восстановлено={restored_count}")
         
-        return jsonify(result)
+        return result, 200
         
     except Exception as e:
         if connection:
             connection.rollback()
         log_print(f"💥 Неожиданная ошибка: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return {'success': False, 'error': str(e)}, 500
     finally:
         if connection:
             connection.close()
 
+@job_handler('keyword_fetch')
+def run_keyword_fetch_job(job):
+    """Фоновый сбор ключевых слов (/get-keywords с background: true)"""
+    job.progress(0, 1, ', '.join(job.payload.get('seed_keywords', [])[:3]))
+    with job_log_context(job.id):
+        result, status = fetch_new_keywords(job.payload)
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', f'HTTP {status}'))
+    job.progress(1, 1, '')
+    return result
+
+@dataforseo_bp.route('/get-keywords', methods=['POST'])
+def get_new_keywords():
+    """
+    Получение новой выдачи ключевых слов через DataForSeo
+    background: true - выполнить фоновой задачей (прогресс и результат через apply-serp-sse / /api/jobs)
+    """
+    log_print("=" * 50)
+    log_print("🚀 GET-KEYWORDS ENDPOINT ВЫЗВАН!")
+    log_print("=" * 50)
+    
+    # Получаем данные запроса
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'No data in request'}), 400
+    
+    if data.get('background'):
+        if not data.get('seed_keywords'):
+            return jsonify({'success': False, 'error': 'No seed keywords provided'}), 400
+        try:
+            task_id = enqueue_job(
+                'keyword_fetch',
+                data,
+                job_id=data.get('task_id'),
+                priority=int(data.get('priority', 0)),
+                total=1,
+                max_attempts=1
+            )
+        except Exception as e:
+            logger.error(f"❌ Не удалось поставить задачу keyword_fetch: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+        return jsonify({
+            'success': True,
+            'task_id': task_id,
+            'message': 'Сбор ключевых слов запущен',
+            'use_sse': True
+        }), 202
+    
+    result, status = fetch_new_keywords(data)
+    return jsonify(result), status
+
 @dataforseo_bp.route('/apply-serp', methods=['POST'])
 def apply_serp_analysis():
     """Применение SERP анализа с поддержкой прогресса через SSE"""
@@ -484,6 +549,7 @@ def apply_serp_analysis():
         log_print(f"🚀 SERP Analysis started: task_id={task_id}")
         log_print(f"   Keywords: {len(keyword_ids)}")
         log_print(f"   Skip analyzed: {skip_analyzed}")  # ✅ ДОБАВЛЕНО
+        log_print(f"   Mode: {data.get('mode', 'live')}")
         log_print(f"{'='*50}")
         
         if not keyword_ids:
@@ -526,28 +592,28 @@ def apply_serp_analysis():
         connection.close()  # ✅ ДОБАВЛЕНО: Закрываем connection
         
         # ИЗМЕНЕНО: Для 1 слова - синхронно, для 2+ - Task-версия
-        if len(keyword_ids) == 1:
+        # mode='standard' - стандартная очередь DataForSeo (task_post), всегда в фоне
+        mode = data.get('mode', 'live')
+        if len(keyword_ids) == 1 and mode != 'standard':
             try:
-                result = process_serp_sync(task_id, keyword_ids, data)
+                with job_log_context(task_id, trace=data.get('trace', False)):
+                    result = process_serp_sync(task_id, keyword_ids, data)
                 return jsonify(result), 200
             except Exception as e:
-                log_print(f"❌ Live analysis error: {str(e)}")
+                logger.error(f"❌ Live analysis error: {str(e)}")
                 return jsonify({
                     'success': False,
                     'error': f'SERP analysis failed: {str(e)}'
                 }), 500
         else:
-            # Task-версия для 2+ слов
-            import threading
-            
-            update_progress(task_id, 0, len(keyword_ids), '', 'processing')
-            
-            thread = threading.Thread(
-                target=process_serp_async,
-                args=(task_id, keyword_ids, data)
+            # Task-версия для 2+ слов: задача в очереди background_jobs
+            enqueue_job(
+                'serp_analysis',
+                {'keyword_ids': keyword_ids, 'params': data},
+                job_id=task_id,
+                priority=int(data.get('priority', 0)),
+                total=len(keyword_ids)
             )
-            thread.daemon = True
-            thread.start()
             
             return jsonify({
                 'success': True,
@@ -557,19 +623,138 @@ def apply_serp_analysis():
             }), 200
             
     except Exception as e:
-        log_print(f"❌ Error in apply_serp_analysis: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error in apply_serp_analysis: {str(e)}")
         
         return jsonify({
             'success': False, 
             'error': str(e)
         }), 500
             
-def process_serp_sync(task_id: str, keyword_ids: list, params: dict) -> dict:
+def get_serp_concurrency(params: dict) -> int:
+    """Количество параллельных запросов к SERP API (из запроса или настроек)"""
+    try:
+        concurrency = int(params.get('concurrency') or Config.SERP_CONCURRENCY)
+    except (TypeError, ValueError):
+        concurrency = Config.SERP_CONCURRENCY
+    return max(1, min(concurrency, Config.SERP_MAX_CONCURRENCY))
+
+def fetch_serp_ordered(dataforseo_client, keywords_data: list, serp_params: dict, concurrency: int):
+    """
+    Параллельно выполняет SERP запросы и отдаёт результаты в исходном порядке.
+    
+    Одновременно в работе не больше 2 × concurrency запросов, поэтому
+    в памяти не копятся ответы по всем словам сразу.
+    
+    Yields:
+        (kw, serp_response, error) - error содержит исключение запроса, если оно было
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import contextvars
+    
+    def fetch(kw):
+        return dataforseo_client.get_serp(keyword=kw['keyword'], **serp_params)
+    
+    def submit(kw):
+        # Контекст логирования (job_id, trace) переносим в поток запроса
+        return executor.submit(contextvars.copy_context().run, fetch, kw)
+    
+    window = concurrency * 2
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='serp-fetch')
+    futures = {}
+    try:
+        for idx, kw in enumerate(keywords_data[:window]):
+            futures[idx] = submit(kw)
+        
+        for idx, kw in enumerate(keywords_data):
+            future = futures.pop(idx)
+            
+            next_idx = idx + window
+            if next_idx < len(keywords_data):
+                futures[next_idx] = submit(keywords_data[next_idx])
+            
+            try:
+                yield kw, future.result(), None
+            except Exception as e:
+                yield kw, None, e
+    finally:
+        # Ещё не начатые запросы отменяем (cancel_futures у shutdown - только с Python 3.9)
+        for future in futures.values():
+            future.cancel()
+        executor.shutdown(wait=True)
+
+def build_serp_params(params: dict) -> dict:
+    """Параметры SERP запроса из тела запроса apply-serp"""
+    return {
+        'location_code': params.get('location_code', 2804),
+        'language_code': params.get('language_code', 'ru'),
+        'device': params.get('device', 'desktop'),
+        'os': params.get('os', 'windows'),
+        'depth': params.get('depth', 20),
+        'calculate_rectangles': params.get('calculate_rectangles', False),
+        'browser_screen_width': params.get('browser_screen_width', 1920),
+        'browser_screen_height': params.get('browser_screen_height', 1080),
+        'se_domain': params.get('se_domain', 'google.com.ua')
+    }
+
+def new_serp_summary() -> dict:
+    """Пустая сводка результатов SERP анализа"""
+    return {
+        'with_ads': 0,
+        'with_maps': 0,
+        'with_our_site': 0,
+        'with_school_sites': 0,
+        'commercial_intent': 0
+    }
+
+def accumulate_serp_summary(results_summary: dict, serp_data: dict):
+    """Добавляет результат анализа одного слова в сводку"""
+    if serp_data['has_ads']:
+        results_summary['with_ads'] += 1
+    if serp_data['has_google_maps']:
+        results_summary['with_maps'] += 1
+    if serp_data['has_our_site']:
+        results_summary['with_our_site'] += 1
+    if serp_data['has_school_sites']:
+        results_summary['with_school_sites'] += 1
+    if serp_data['intent_type'] == 'Коммерческий':
+        results_summary['commercial_intent'] += 1
+
+def apply_serp_data_to_keyword(cursor, keyword_id: int, serp_data: dict):
+    """Записывает результаты SERP анализа (с позициями) в keywords"""
+    cursor.execute("""
+        UPDATE keywords 
+        SET 
+            has_ads = %s,
+            has_school_sites = %s,
+            has_google_maps = %s,
+            has_our_site = %s,
+            intent_type = %s,
+            our_organic_position = %s,
+            our_actual_position = %s,
+            last_serp_check = NOW(),
+            updated_at = NOW()
+        WHERE id = %s
+    """, (
+        serp_data['has_ads'],
+        serp_data['has_school_sites'],
+        serp_data['has_google_maps'],
+        serp_data['has_our_site'],
+        serp_data['intent_type'],
+        serp_data.get('our_organic_position'),
+        serp_data.get('our_actual_position'),
+        keyword_id
+    ))
+
+def process_serp_sync(task_id: str, keyword_ids: list, params: dict, job=None) -> dict:
     """
     Синхронная обработка SERP с обновлением прогресса
     ИСПРАВЛЕНО: Добавлено сохранение our_organic_position и our_actual_position
+    
+    Запросы к API выполняются параллельно (params['concurrency']),
+    разбор ответов и запись в БД - последовательно в порядке слов.
+    
+    job - фоновая задача (services/job_queue.py): после каждого слова
+    коммит и checkpoint, при повторном запуске уже обработанные слова пропускаются.
     """
     connection = None
     cursor = None
@@ -578,18 +763,27 @@ def process_serp_sync(task_id: str, keyword_ids: list, params: dict) -> dict:
         connection = get_db_connection()
         cursor = connection.cursor()
         
-        # Получаем данные ключевых слов
+        # Получаем данные ключевых слов (по id - порядок для checkpoint)
         placeholders = ','.join(['%s'] * len(keyword_ids))
         cursor.execute(f"""
             SELECT k.id, k.keyword, k.campaign_id 
             FROM keywords k
             WHERE k.id IN ({placeholders})
+            ORDER BY k.id
         """, keyword_ids)
         keywords_data = cursor.fetchall()
         
         if not keywords_data:
             return {'success': False, 'error': 'Keywords not found'}
         
+        total = len(keywords_data)
+        checkpoint = job.checkpoint if job else {}
+        last_keyword_id = checkpoint.get('last_keyword_id')
+        if last_keyword_id is not None:
+            keywords_data = [kw for kw in keywords_data if kw['id'] > last_keyword_id]
+            log_print(f"⏩ Продолжение задачи {task_id}: осталось {len(keywords_data)} из {total}")
+        done_before = total - len(keywords_data)
+        
         # Получаем клиент DataForSeo
         try:
             dataforseo_client = get_dataforseo_client()
@@ -597,42 +791,36 @@ def process_serp_sync(task_id: str, keyword_ids: list, params: dict) -> dict:
             return {'success': False, 'error': f'DataForSeo API не настроен: {str(e)}'}
         
         # Параметры SERP запроса
-        serp_params = {
-            'location_code': params.get('location_code', 2804),
-            'language_code': params.get('language_code', 'ru'),
-            'device': params.get('device', 'desktop'),
-            'os': params.get('os', 'windows'),
-            'depth': params.get('depth', 20),
-            'calculate_rectangles': params.get('calculate_rectangles', False),
-            'browser_screen_width': params.get('browser_screen_width', 1920),
-            'browser_screen_height': params.get('browser_screen_height', 1080),
-            'se_domain': params.get('se_domain', 'google.com.ua')
-        }
+        serp_params = build_serp_params(params)
         
-        updated_count = 0
-        errors = []
-        total_cost = 0.0
-        results_summary = {
-            'with_ads': 0,
-            'with_maps': 0,
-            'with_our_site': 0,
-            'with_school_sites': 0,
-            'commercial_intent': 0
-        }
+        updated_count = checkpoint.get('updated', 0)
+        errors = checkpoint.get('errors', [])
+        total_cost = checkpoint.get('cost', 0.0)
+        results_summary = checkpoint.get('summary') or new_serp_summary()
+        
+        def report_progress(current, keyword):
+            if job:
+                job.progress(done_before + current, total, keyword)
+        
+        concurrency = get_serp_concurrency(params)
+        log_print(f"⚡ Параллельных SERP запросов: {concurrency}")
+        
+        # Домены кампаний и школ загружаются один раз на задачу
+        serp_context = SerpAnalysisContext(connection)
         
         # Обрабатываем ключевые слова с обновлением прогресса
-        for idx, kw in enumerate(keywords_data):
+        serp_results = fetch_serp_ordered(dataforseo_client, keywords_data, serp_params, concurrency)
+        for idx, (kw, serp_response, fetch_error) in enumerate(serp_results):
+            # Обновляем прогресс ПЕРЕД обработкой каждого слова
+            # (вне try: отмена задачи не должна считаться ошибкой слова)
+            report_progress(idx, kw['keyword'])
+            
             try:
-                log_print(f"\n🔍 Анализ [{idx+1}/{len(keywords_data)}]: {kw['keyword']}")
-                
-                # Обновляем прогресс ПЕРЕД обработкой каждого слова
-                update_progress(task_id, idx, len(keywords_data), kw['keyword'], 'processing')
+                log_print(f"\n🔍 Анализ [{done_before+idx+1}/{total}]: {kw['keyword']}")
                 
-                # Выполняем SERP запрос
-                serp_response = dataforseo_client.get_serp(
-                    keyword=kw['keyword'],
-                    **serp_params
-                )
+                # Ошибка SERP запроса (выполнялся в пуле потоков)
+                if fetch_error is not None:
+                    raise fetch_error
                 
                 # Парсим результаты (используем исправленную parse_serp_response)
                 serp_data = parse_serp_response(
@@ -641,34 +829,13 @@ def process_serp_sync(task_id: str, keyword_ids: list, params: dict) -> dict:
                     connection,
                     keyword_id=kw['id'],
                     keyword_text=kw['keyword'],
-                    serp_params=serp_params
+                    serp_params=serp_params,
+                    context=serp_context
                 )
                 
                 if serp_data:
                     # ИСПРАВЛЕНО: Обновляем данные С ПОЗИЦИЯМИ
-                    cursor.execute("""
-                        UPDATE keywords 
-                        SET 
-                            has_ads = %s,
-                            has_school_sites = %s,
-                            has_google_maps = %s,
-                            has_our_site = %s,
-                            intent_type = %s,
-                            our_organic_position = %s,
-                            our_actual_position = %s,
-                            last_serp_check = NOW(),
-                            updated_at = NOW()
-                        WHERE id = %s
-                    """, (
-                        serp_data['has_ads'],
-                        serp_data['has_school_sites'],
-                        serp_data['has_google_maps'],
-                        serp_data['has_our_site'],
-                        serp_data['intent_type'],
-                        serp_data.get('our_organic_position'),  # НОВОЕ
-                        serp_data.get('our_actual_position'),   # НОВОЕ
-                        kw['id']
-                    ))
+                    apply_serp_data_to_keyword(cursor, kw['id'], serp_data)
                     
                     updated_count += 1
                     
@@ -678,16 +845,7 @@ def process_serp_sync(task_id: str, keyword_ids: list, params: dict) -> dict:
                         log_print(f"   📍 Позиции: органическая={serp_data.get('our_organic_position')}, фактическая={serp_data.get('our_actual_position')}")
                     
                     # Обновляем статистику
-                    if serp_data['has_ads']:
-                        results_summary['with_ads'] += 1
-                    if serp_data['has_google_maps']:
-                        results_summary['with_maps'] += 1
-                    if serp_data['has_our_site']:
-                        results_summary['with_our_site'] += 1
-                    if serp_data['has_school_sites']:
-                        results_summary['with_school_sites'] += 1
-                    if serp_data['intent_type'] == 'Коммерческий':
-                        results_summary['commercial_intent'] += 1
+                    accumulate_serp_summary(results_summary, serp_data)
                     
                     # Считаем стоимость
                     if serp_response.get('tasks'):
@@ -697,219 +855,471 @@ def process_serp_sync(task_id: str, keyword_ids: list, params: dict) -> dict:
                 else:
                     error_msg = f"Нет данных для '{kw['keyword']}'"
                     errors.append(error_msg)
-                    log_print(f"   ⚠️ {error_msg}")
-                
-                # Обновляем прогресс ПОСЛЕ обработки
-                update_progress(task_id, idx + 1, len(keywords_data), kw['keyword'], 'processing')
+                    logger.warning(f"   ⚠️ {error_msg}")
                 
             except Exception as e:
                 error_msg = f"Ошибка для '{kw['keyword']}': {str(e)}"
-                log_print(f"   ❌ {error_msg}")
+                logger.exception(f"   ❌ {error_msg}")
                 errors.append(error_msg)
-                import traceback
-                traceback.print_exc()
-                
-                # Всё равно обновляем прогресс при ошибке
-                update_progress(task_id, idx + 1, len(keywords_data), kw['keyword'], 'processing')
+            
+            if job:
+                # Слово записано - при сбое задача продолжится со следующего
+                connection.commit()
+                job.save_checkpoint({
+                    'last_keyword_id': kw['id'],
+                    'updated': updated_count,
+                    'errors': errors[:10],
+                    'cost': total_cost,
+                    'summary': results_summary
+                })
+            
+            # Обновляем прогресс ПОСЛЕ обработки (и при ошибке)
+            report_progress(idx + 1, kw['keyword'])
         
         # Сохраняем изменения
         connection.commit()
         
         # Формируем итоговое сообщение
-        message = f'SERP анализ завершен! Обработано: {updated_count} из {len(keywords_data)} слов'
+        message = f'SERP анализ завершен! Обработано: {updated_count} из {total} слов'
+        
+        log_print(f"\n📊 Результаты:")
+        log_print(f"   Обработано: {updated_count}/{total}")
+        log_print(f"   Ошибок: {len(errors)}")
+        log_print(f"   Стоимость: ${total_cost:.4f}")
+        log_print(f"   С рекламой: {results_summary['with_ads']}")
+        log_print(f"   С картами: {results_summary['with_maps']}")
+        log_print(f"   С нашим сайтом: {results_summary['with_our_site']}")
+        log_print(f"   С сайтами школ: {results_summary['with_school_sites']}")
+        log_print(f"   Коммерческий интент: {results_summary['commercial_intent']}")
+        
+        return {
+            'success': True,
+            'message': message,
+            'updated': updated_count,
+            'total': total,
+            'errors': errors[:10] if errors else [],
+            'cost': round(total_cost, 4),
+            'summary': results_summary
+        }
+        
+    except Exception as e:
+        if connection:
+            try:
+                connection.rollback()
+            except:
+                pass
+        logger.exception(f"❌ Error in process_serp_sync: {str(e)}")
+        raise
+        
+    finally:
+        if cursor:
+            try:
+                cursor.close()
+            except:
+                pass
+        if connection:
+            try:
+                connection.close()
+            except:
+                pass
+            
+@job_handler('serp_analysis')
+def run_serp_analysis_job(job):
+    """Фоновый SERP анализ (2+ слов или mode=standard) - задача очереди background_jobs"""
+    keyword_ids = job.payload.get('keyword_ids', [])
+    params = job.payload.get('params', {})
+    # trace: true - подробный разбор каждого элемента выдачи в логе этой задачи
+    with job_log_context(job.id, trace=params.get('trace', False)):
+        log_print(f"🔄 SERP job {job.id} started (attempt {job.attempts})")
+        
+        if params.get('mode') == 'standard':
+            result = process_serp_batch(job.id, keyword_ids, params, job=job)
+        else:
+            result = process_serp_sync(job.id, keyword_ids, params, job=job)
+    
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', 'SERP analysis failed'))
+    
+    log_print(f"✅ SERP job {job.id} completed")
+    return result
+        
+
+# Максимум задач в одном запросе task_post
+SERP_TASK_POST_LIMIT = 100
+
+# Коды DataForSeo: задача создана / ещё выполняется
+TASK_CREATED_CODE = 20100
+TASK_NOT_READY_CODES = (40601, 40602)
+
+def process_serp_batch(task_id: str, keyword_ids: list, params: dict, job=None) -> dict:
+    """
+    SERP анализ через стандартную очередь DataForSeo (task_post + tasks_ready).
+    
+    Задачи сохраняются в serp_pending_tasks, поэтому незавершённый сбор
+    результатов продолжается после перезапуска процесса: checkpoint
+    {'posted': True} - задачи уже созданы, остаётся только собрать результаты.
+    """
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        
+        try:
+            dataforseo_client = get_dataforseo_client()
+        except ValueError as e:
+            return {'success': False, 'error': f'DataForSeo API не настроен: {str(e)}'}
+        
+        checkpoint = job.checkpoint if job else {}
+        if checkpoint.get('posted'):
+            log_print(f"🔄 Продолжение сбора результатов batch-задачи {task_id}")
+            result = _process_serp_batch(task_id, connection, dataforseo_client, check_all_first=True, job=job)
+            result['errors'] = (checkpoint.get('errors', []) + result['errors'])[:10]
+            result['cost'] = round(checkpoint.get('cost', 0.0), 4)
+            return result
+        
+        placeholders = ','.join(['%s'] * len(keyword_ids))
+        cursor.execute(f"""
+            SELECT k.id, k.keyword, k.campaign_id 
+            FROM keywords k
+            WHERE k.id IN ({placeholders})
+        """, keyword_ids)
+        keywords_data = cursor.fetchall()
+        
+        if not keywords_data:
+            return {'success': False, 'error': 'Keywords not found'}
+        
+        serp_params = build_serp_params(params)
+        post_result = _post_serp_tasks(task_id, keywords_data, serp_params, connection, dataforseo_client)
+        if job:
+            job.save_checkpoint({'posted': True, 'cost': post_result['cost'], 'errors': post_result['errors'][:10]})
+        
+        result = _process_serp_batch(task_id, connection, dataforseo_client, job=job)
+        
+        result['errors'] = (post_result['errors'] + result['errors'])[:10]
+        result['cost'] = round(post_result['cost'], 4)
+        return result
+    
+    except JobCancelled:
+        # Отменённую задачу не возобновляем - её задачи DataForSeo больше не собираем
+        if cursor and job and not job.lost:
+            try:
+                connection.rollback()
+                cursor.execute("""
+                    UPDATE serp_pending_tasks
+                    SET status = 'cancelled', completed_at = NOW()
+                    WHERE job_id = %s AND status = 'pending'
+                """, (task_id,))
+                connection.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось отметить задачи {task_id} отменёнными: {e}")
+        raise
+        
+    except Exception as e:
+        if connection:
+            try:
+                connection.rollback()
+            except:
+                pass
+        logger.exception(f"❌ Error in process_serp_batch: {str(e)}")
+        raise
+        
+    finally:
+        if cursor:
+            try:
+                cursor.close()
+            except:
+                pass
+        if connection:
+            try:
+                connection.close()
+            except:
+                pass
+
+def _post_serp_tasks(job_id: str, keywords_data: list, serp_params: dict, connection, dataforseo_client) -> dict:
+    """Создаёт задачи через task_post пачками по 100 и сохраняет их ID в БД"""
+    log_print(f"🚀 Batch SERP для {len(keywords_data)} ключевых слов")
+    
+    cursor = connection.cursor()
+    posted_count = 0
+    total_cost = 0.0
+    errors = []
+    serp_params_json = json.dumps(serp_params, ensure_ascii=False)
+    
+    try:
+        # Повторный запуск после сбоя посреди task_post - уже созданные задачи не дублируем
+        cursor.execute("SELECT keyword_id FROM serp_pending_tasks WHERE job_id = %s", (job_id,))
+        already_posted = {row['keyword_id'] for row in cursor.fetchall()}
+        if already_posted:
+            keywords_data = [kw for kw in keywords_data if kw['id'] not in already_posted]
+            log_print(f"⏩ Уже создано задач: {len(already_posted)}, осталось: {len(keywords_data)}")
+        
+        for i in range(0, len(keywords_data), SERP_TASK_POST_LIMIT):
+            batch = keywords_data[i:i + SERP_TASK_POST_LIMIT]
+            keywords_by_tag = {str(kw['id']): kw for kw in batch}
+            
+            # Тег = keyword_id, по нему сопоставляем задачи со словами
+            tasks = [{"keyword": kw['keyword'], "tag": str(kw['id']), **serp_params} for kw in batch]
+            response = dataforseo_client.post_serp_tasks(tasks)
+            
+            rows = []
+            for task in response.get('tasks') or []:
+                kw = keywords_by_tag.get(str((task.get('data') or {}).get('tag', '')))
+                if not kw:
+                    continue
+                
+                if task.get('status_code') != TASK_CREATED_CODE or not task.get('id'):
+                    errors.append(f"Ошибка создания задачи для '{kw['keyword']}': {task.get('status_message')}")
+                    continue
+                
+                task_cost = task.get('cost', 0) or 0
+                total_cost += task_cost
+                rows.append((
+                    task['id'], job_id, kw['id'], kw['keyword'],
+                    kw['campaign_id'], serp_params_json, task_cost
+                ))
+            
+            if rows:
+                cursor.executemany("""
+                    INSERT INTO serp_pending_tasks (
+                        task_id, job_id, keyword_id, keyword_text,
+                        campaign_id, serp_params, cost, status, created_at
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending', NOW())
+                """, rows)
+                connection.commit()
+            
+            posted_count += len(rows)
+            log_print(f"📋 Создано {posted_count} задач")
+    finally:
+        cursor.close()
+    
+    return {'posted': posted_count, 'cost': total_cost, 'errors': errors}
+
+def fetch_task_results(dataforseo_client, task_ids: list, concurrency: int):
+    """
+    Параллельно получает результаты готовых задач (task_get).
+    
+    Yields:
+        (task_id, result, error) в порядке готовности
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='serp-task-get') as executor:
+        futures = {executor.submit(dataforseo_client.get_task_result, tid): tid for tid in task_ids}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+def _process_serp_batch(job_id: str, connection, dataforseo_client, check_all_first: bool = False, job=None) -> dict:
+    """
+    Собирает результаты задач job_id из serp_pending_tasks.
+    
+    Готовые задачи определяются через tasks_ready (один запрос на весь аккаунт),
+    их результаты загружаются параллельно, а разбор и запись в БД идут
+    последовательно. Каждая обработанная задача сразу отмечается в БД.
+    
+    Args:
+        check_all_first: сначала запросить task_get для всех задач - нужно при
+            возобновлении, т.к. tasks_ready не возвращает уже забранные задачи
+        job: фоновая задача - прогресс и проверка отмены
+    """
+    cursor = connection.cursor()
+    
+    try:
+        cursor.execute("""
+            SELECT task_id, keyword_id, keyword_text, campaign_id, serp_params, status
+            FROM serp_pending_tasks
+            WHERE job_id = %s
+        """, (job_id,))
+        job_tasks = cursor.fetchall()
+        
+        pending = {t['task_id']: t for t in job_tasks if t['status'] == 'pending'}
+        total = len(job_tasks)
+        processed = total - len(pending)
+        
+        updated_count = 0
+        errors = []
+        results_summary = new_serp_summary()
+        concurrency = get_serp_concurrency({})
+        serp_context = SerpAnalysisContext(connection)
+        start_time = time.time()
+        
+        def report_progress(keyword=''):
+            if job:
+                job.progress(processed, total, keyword)
+        
+        report_progress()
+        
+        while pending and time.time() - start_time < Config.SERP_BATCH_MAX_WAIT:
+            if check_all_first:
+                ready_ids = list(pending)
+                check_all_first = False
+            else:
+                ready_ids = [tid for tid in dataforseo_client.get_tasks_ready() if tid in pending]
+            
+            if not ready_ids:
+                log_print(f"⏳ Прогресс: {processed}/{total}, ожидаем готовые задачи...")
+                time.sleep(Config.SERP_BATCH_POLL_INTERVAL)
+                if job:
+                    job.check_cancelled()
+                continue
+            
+            for task_id, result, fetch_error in fetch_task_results(dataforseo_client, ready_ids, concurrency):
+                info = pending[task_id]
+                
+                if fetch_error is not None:
+                    # Оставляем задачу в очереди - повторим на следующей итерации
+                    logger.warning(f"⚠️ Ошибка task_get для '{info['keyword_text']}': {fetch_error}")
+                    continue
+                
+                task = (result.get('tasks') or [{}])[0]
+                if task.get('status_code') in TASK_NOT_READY_CODES:
+                    continue
+                
+                serp_params = info['serp_params']
+                if isinstance(serp_params, str):
+                    serp_params = json.loads(serp_params)
+                
+                status = 'done'
+                error_msg = None
+                try:
+                    serp_data = parse_serp_response(
+                        result,
+                        info['campaign_id'],
+                        connection,
+                        keyword_id=info['keyword_id'],
+                        keyword_text=info['keyword_text'],
+                        serp_params=serp_params,
+                        context=serp_context
+                    )
+                    
+                    if serp_data:
+                        apply_serp_data_to_keyword(cursor, info['keyword_id'], serp_data)
+                        accumulate_serp_summary(results_summary, serp_data)
+                        updated_count += 1
+                    else:
+                        status = 'error'
+                        error_msg = task.get('status_message') or f"Нет данных для '{info['keyword_text']}'"
+                except Exception as e:
+                    status = 'error'
+                    error_msg = f"Ошибка для '{info['keyword_text']}': {str(e)}"
+                
+                if error_msg:
+                    errors.append(error_msg)
+                    logger.warning(f"   ⚠️ {error_msg}")
+                
+                cursor.execute("""
+                    UPDATE serp_pending_tasks
+                    SET status = %s, error = %s, completed_at = NOW()
+                    WHERE task_id = %s
+                """, (status, error_msg, task_id))
+                connection.commit()
+                
+                del pending[task_id]
+                processed += 1
+                report_progress(info['keyword_text'])
         
-        log_print(f"\n📊 Результаты:")
-        log_print(f"   Обработано: {updated_count}/{len(keywords_data)}")
-        log_print(f"   Ошибок: {len(errors)}")
-        log_print(f"   Стоимость: ${total_cost:.4f}")
-        log_print(f"   С рекламой: {results_summary['with_ads']}")
-        log_print(f"   С картами: {results_summary['with_maps']}")
-        log_print(f"   С нашим сайтом: {results_summary['with_our_site']}")
-        log_print(f"   С сайтами школ: {results_summary['with_school_sites']}")
-        log_print(f"   Коммерческий интент: {results_summary['commercial_intent']}")
+        message = f'Batch SERP завершен! Обработано: {updated_count} из {total} слов'
+        if pending:
+            message += f'. В очереди DataForSeo осталось {len(pending)} задач - они будут собраны позже'
         
         return {
             'success': True,
             'message': message,
             'updated': updated_count,
-            'total': len(keywords_data),
-            'errors': errors[:10] if errors else [],
-            'cost': round(total_cost, 4),
-            'summary': results_summary
+            'total': total,
+            'pending': len(pending),
+            'errors': errors[:10],
+            'summary': results_summary,
+            'method': 'standard_queue'
         }
-        
-    except Exception as e:
-        if connection:
-            try:
-                connection.rollback()
-            except:
-                pass
-        log_print(f"❌ Error in process_serp_sync: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise
-        
     finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection:
-            try:
-                connection.close()
-            except:
-                pass
-            
-def process_serp_async(task_id: str, keyword_ids: list, params: dict):
-    """Асинхронная обработка SERP для больших объемов (2+ слов)"""
-    try:
-        log_print(f"🔄 Async SERP processing started for task {task_id}")
-        
-        # Вызываем синхронную функцию в отдельном потоке
-        result = process_serp_sync(task_id, keyword_ids, params)
-        
-        # Обновляем финальный статус
-        SERP_PROGRESS[task_id].update({
-            'status': 'complete',
-            'result': result,
-            'message': result.get('message', 'Completed')
-        })
-        
-        log_print(f"✅ Async SERP processing completed for task {task_id}")
-        
-    except Exception as e:
-        log_print(f"❌ Async SERP error for task {task_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        
-        SERP_PROGRESS[task_id].update({
-            'status': 'error',
-            'error': str(e),
-            'message': f'Error: {str(e)}'
-        })
-        
+        cursor.close()
 
-def _process_serp_batch(keywords_data, serp_params, connection, dataforseo_client):
-    """Обработка SERP через task_post для больших объемов"""
-    
-    log_print(f"🚀 Batch SERP для {len(keywords_data)} ключевых слов")
-    
-    # Шаг 1: Создаем задачи через task_post
-    task_ids = []
-    batch_size = 100  # Максимум задач в одном запросе
-    
-    for i in range(0, len(keywords_data), batch_size):
-        batch = keywords_data[i:i+batch_size]
-        
-        # Подготавливаем данные для batch запроса
-        tasks = []
-        for kw in batch:
-            task_data = {
-                "keyword": kw['keyword'],
-                "tag": f"keyword_id_{kw['id']}",  # Тег для идентификации
-                **serp_params
-            }
-            tasks.append(task_data)
-        
-        # Отправляем batch запрос
-        response = dataforseo_client.post_serp_tasks(tasks)
-        
-        if response.get('tasks'):
-            for task in response['tasks']:
-                if task.get('id'):
-                    task_ids.append({
-                        'task_id': task['id'],
-                        'keyword_id': int(task.get('data', {}).get('tag', '').replace('keyword_id_', '')),
-                        'keyword': next((kw['keyword'] for kw in batch if str(kw['id']) in task.get('data', {}).get('tag', '')), '')
-                    })
-        
-        log_print(f"📋 Создано {len(task_ids)} задач")
-    
-    # Шаг 2: Ждем выполнения задач
-    import time
-    max_wait = 120  # Максимум 2 минуты ожидания
-    start_time = time.time()
-    completed_tasks = []
+def resume_serp_batches() -> list:
+    """
+    Возвращает в очередь фоновых задач незавершённые задачи стандартной очереди
+    DataForSeo, которые сейчас никто не собирает (задача завершилась по
+    SERP_BATCH_MAX_WAIT или её запись удалена). Вызывается при старте
+    приложения и через /serp-batch/resume.
     
-    while len(completed_tasks) < len(task_ids) and time.time() - start_time < max_wait:
-        time.sleep(2)  # Проверяем каждые 2 секунды
-        
-        # Проверяем статус задач
-        ready_tasks = dataforseo_client.get_tasks_ready()
-        
-        for task_info in task_ids:
-            if task_info['task_id'] not in [t['task_id'] for t in completed_tasks]:
-                # Проверяем готовность конкретной задачи
-                if task_info['task_id'] in ready_tasks:
-                    completed_tasks.append(task_info)
-                    log_print(f"✅ Задача готова: {task_info['keyword'][:30]}...")
-        
-        # Отправляем прогресс на frontend через SSE или WebSocket
-        progress_percent = (len(completed_tasks) / len(task_ids)) * 100
-        log_print(f"⏳ Прогресс: {len(completed_tasks)}/{len(task_ids)} ({progress_percent:.0f}%)")
+    Отменённые задачи и задачи, исчерпавшие max_attempts, не возобновляются:
+    их оставшиеся задачи DataForSeo помечаются cancelled.
     
-    # Шаг 3: Получаем результаты
-    updated_count = 0
-    errors = []
-    total_cost = 0
+    Returns:
+        список возобновлённых job_id
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE serp_pending_tasks t
+            JOIN background_jobs j ON j.id = t.job_id
+            SET t.status = 'cancelled', t.completed_at = NOW()
+            WHERE t.status = 'pending'
+            AND j.status IN ('complete', 'error', 'cancelled')
+            AND (j.cancel_requested = 1 OR j.attempts >= j.max_attempts)
+        """)
+        if cursor.rowcount:
+            log_print(f"⏹️ Задачи DataForSeo отменённых batch SERP помечены cancelled: {cursor.rowcount}")
+        cursor.execute("""
+            SELECT DISTINCT t.job_id
+            FROM serp_pending_tasks t
+            LEFT JOIN background_jobs j ON j.id = t.job_id
+            WHERE t.status = 'pending'
+            AND (j.id IS NULL OR (
+                j.status IN ('complete', 'error')
+                AND j.cancel_requested = 0 AND j.attempts < j.max_attempts
+            ))
+        """)
+        job_ids = [row['job_id'] for row in cursor.fetchall()]
+        connection.commit()
+        cursor.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось проверить незавершённые batch SERP задачи: {e}")
+        return []
+    finally:
+        if connection:
+            connection.close()
     
-    for task_info in completed_tasks:
+    resumed = []
+    for job_id in job_ids:
         try:
-            # Получаем результат задачи
-            result = dataforseo_client.get_task_result(task_info['task_id'])
-            
-            # Парсим и обновляем БД
-            serp_data = parse_serp_response(
-                result,
-                keywords_data[0]['campaign_id'],
-                connection,
-                keyword_id=task_info['keyword_id'],
-                keyword_text=task_info['keyword']
-            )
-            
-            if serp_data:
-                cursor = connection.cursor()
-                cursor.execute("""
-                    UPDATE keywords 
-                    SET 
-                        has_ads = %s,
-                        has_school_sites = %s,
-                        has_google_maps = %s,
-                        has_our_site = %s,
-                        intent_type = %s,
-                        last_serp_check = NOW(),
-                        updated_at = NOW()
-                    WHERE id = %s
-                """, (
-                    serp_data['has_ads'],
-                    serp_data['has_school_sites'],
-                    serp_data['has_google_maps'],
-                    serp_data['has_our_site'],
-                    serp_data['intent_type'],
-                    task_info['keyword_id']
-                ))
-                cursor.close()
-                updated_count += 1
-                
-                # Считаем стоимость
-                if result.get('cost'):
-                    total_cost += result['cost']
-                    
+            # Свой checkpoint задачи сохраняется; если записи нет - задачи
+            # DataForSeo уже созданы, остаётся только собрать результаты
+            if requeue_job(job_id):
+                resumed.append(job_id)
+            elif get_job_progress(job_id) is None:
+                enqueue_job(
+                    'serp_analysis',
+                    {'keyword_ids': [], 'params': {'mode': 'standard'}},
+                    job_id=job_id,
+                    checkpoint={'posted': True}
+                )
+                resumed.append(job_id)
         except Exception as e:
-            errors.append(f"Ошибка для '{task_info['keyword']}': {str(e)}")
+            logger.warning(f"⚠️ Не удалось возобновить batch SERP {job_id}: {e}")
     
-    connection.commit()
-    
-    return jsonify({
-        'success': True,
-        'message': f'Batch SERP завершен! Обработано: {updated_count} из {len(keywords_data)} слов',
-        'updated': updated_count,
-        'total': len(keywords_data),
-        'errors': errors[:10] if errors else [],
-        'cost': round(total_cost, 4),
-        'method': 'batch_task_post'
-    })
+    if resumed:
+        log_print(f"🔁 Возобновлено batch SERP задач: {len(resumed)}")
+    return resumed
+
+@dataforseo_bp.route('/serp-batch/resume', methods=['POST'])
+def resume_serp_batch_endpoint():
+    """Возобновление сбора результатов незавершённых batch SERP задач"""
+    try:
+        resumed = resume_serp_batches()
+        return jsonify({
+            'success': True,
+            'resumed': resumed,
+            'message': f'Возобновлено задач: {len(resumed)}'
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 def _process_serp_live(keywords_data, serp_params, connection, dataforseo_client):
     connection = None
@@ -1047,14 +1457,12 @@ def _process_serp_live(keywords_data, serp_params, connection, dataforseo_client
                 else:
                     error_msg = f"Нет данных для '{kw['keyword']}'"
                     errors.append(error_msg)
-                    log_print(f"   ⚠️ {error_msg}")
+                    logger.warning(f"   ⚠️ {error_msg}")
                     
             except Exception as e:
                 error_msg = f"Ошибка для '{kw['keyword']}': {str(e)}"
                 errors.append(error_msg)
-                log_print(f"   ❌ {error_msg}")
-                import traceback
-                traceback.print_exc()
+                logger.exception(f"   ❌ {error_msg}")
         
         connection.commit()
         cursor.close()
@@ -1080,15 +1488,99 @@ def _process_serp_live(keywords_data, serp_params, connection, dataforseo_client
     except Exception as e:
         if connection:
             connection.rollback()
-        log_print(f"❌ Error in apply_serp_analysis: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error in apply_serp_analysis: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
         
     finally:
         if connection:
             connection.close()
             
+# Колонки serp_logs для списков: без raw_response и parsed_items
+# (raw_response - сотни КБ на запись, отдаётся только через /serp-logs/<id>/raw)
+SERP_LOG_SUMMARY_COLUMNS = (
+    'id', 'keyword_id', 'keyword_text', 'created_at', 'location_code', 'language_code',
+    'device', 'os', 'depth', 'browser_screen_width', 'browser_screen_height',
+    'total_items', 'organic_count', 'paid_count', 'maps_count', 'has_ads', 'has_maps',
+    'has_our_site', 'has_school_sites', 'school_percentage', 'intent_type', 'cost',
+    'analysis_result'
+)
+
+def serp_log_columns(include_parsed_items=False, alias=''):
+    """Список колонок для SELECT по serp_logs (parsed_items распаковывается из хранилища)"""
+    prefix = f"{alias}." if alias else ''
+    columns = [f"{prefix}{column}" for column in SERP_LOG_SUMMARY_COLUMNS]
+    if include_parsed_items:
+        columns.append(f"{payload_sql('parsed_items', alias)} AS parsed_items")
+    return ', '.join(columns)
+
+def format_serp_log(log):
+    """Преобразует строку serp_logs в формат фронтенда (None при ошибке разбора)"""
+    try:
+        # Парсим JSON поля
+        analysis_result = {}
+        organic_results = []
+        paid_results = []
+        
+        # Сначала пробуем получить из analysis_result (новый формат)
+        if log.get('analysis_result'):
+            try:
+                analysis_result = json.loads(log['analysis_result']) if isinstance(log['analysis_result'], str) else log['analysis_result']
+            except:
+                analysis_result = {}
+        
+        # Парсим parsed_items (есть только при include=parsed_items)
+        parsed_items = None
+        if log.get('parsed_items'):
+            try:
+                parsed_items = json.loads(log['parsed_items']) if isinstance(log['parsed_items'], str) else log['parsed_items']
+                organic_results = parsed_items.get('organic', [])
+                paid_results = parsed_items.get('paid', [])
+            except:
+                pass
+        
+        # Если analysis_result пустой, берём из старых полей
+        if not analysis_result:
+            analysis_result = {
+                'has_ads': log.get('has_ads', False),
+                'has_google_maps': log.get('has_maps', False),
+                'has_our_site': log.get('has_our_site', False),
+                'has_school_sites': log.get('has_school_sites', False),
+                'our_organic_position': None,
+                'our_actual_position': None,
+                'school_percentage': log.get('school_percentage', 0),
+                'intent_type': log.get('intent_type', 'Информационный'),
+                'total_organic': log.get('organic_count', 0),
+                'paid_count': log.get('paid_count', 0),
+                'maps_count': log.get('maps_count', 0)
+            }
+        
+        formatted_log = {
+            'id': log['id'],
+            'keyword_id': log.get('keyword_id'),
+            'keyword_text': log.get('keyword_text', ''),
+            'created_at': log['created_at'].isoformat() if log.get('created_at') else None,
+            'location_code': log.get('location_code'),
+            'language_code': log.get('language_code'),
+            'device': log.get('device'),
+            'os': log.get('os'),
+            'depth': log.get('depth'),
+            'browser_screen_width': log.get('browser_screen_width'),
+            'browser_screen_height': log.get('browser_screen_height'),
+            'cost': float(log.get('cost', 0)),
+            'analysis_result': analysis_result
+        }
+        
+        if 'parsed_items' in log:
+            formatted_log['organic_results'] = organic_results
+            formatted_log['paid_results'] = paid_results
+            formatted_log['parsed_items'] = parsed_items
+        
+        return formatted_log
+        
+    except Exception as e:
+        logger.exception(f"⚠️ Error formatting log {log.get('id')}: {str(e)}")
+        return None
+
 @dataforseo_bp.route('/serp-logs', methods=['GET'])
 def get_serp_logs():
     """
@@ -1100,6 +1592,10 @@ def get_serp_logs():
     - keyword_ids: список keyword_id через запятую (для фильтрации нескольких слов)
     - ad_group_id: фильтр по группе объявлений (НОВОЕ)
     - latest_only: если true, возвращает только последний лог для каждого keyword_id
+    - include: parsed_items - добавить разобранную выдачу (organic_results / paid_results)
+      raw_response в список не попадает никогда: см. /serp-logs/<id>/raw
+    - format: ndjson / stream - потоковая выдача серверным курсором
+      (для ad_group_id без limit результат может быть очень большим)
     """
     connection = None
     try:
@@ -1109,162 +1605,98 @@ def get_serp_logs():
         keyword_ids_str = request.args.get('keyword_ids', None, type=str)
         ad_group_id = request.args.get('ad_group_id', None, type=int)  # НОВОЕ
         latest_only = request.args.get('latest_only', 'false', type=str).lower() == 'true'
+        include = {part.strip() for part in request.args.get('include', '', type=str).split(',') if part.strip()}
+        include_parsed_items = 'parsed_items' in include
+        stream_format = get_stream_format(request.args)
+        columns = serp_log_columns(include_parsed_items)
         
         log_print(f"📊 get_serp_logs called: limit={limit}, keyword_id={keyword_id}, keyword_ids={keyword_ids_str}, ad_group_id={ad_group_id}, latest_only={latest_only}")
         
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        # НОВОЕ: если передан ad_group_id, получаем все keyword_id для этой группы
-        if ad_group_id and not keyword_ids_str:
-            cursor.execute("""
+        # Фильтр по набору слов: явный список или все активные слова группы
+        keywords_filter = None
+        keywords_params = []
+        if keyword_ids_str:
+            keyword_ids_list = [int(kid.strip()) for kid in keyword_ids_str.split(',') if kid.strip()]
+            keywords_filter = f"keyword_id IN ({','.join(['%s'] * len(keyword_ids_list))})"
+            keywords_params = keyword_ids_list
+        elif ad_group_id:
+            keywords_filter = """keyword_id IN (
                 SELECT id FROM keywords 
                 WHERE ad_group_id = %s 
                 AND status != 'Removed'
-            """, (ad_group_id,))
-            keywords_in_group = cursor.fetchall()
-            
-            if keywords_in_group:
-                keyword_ids_list = [kw['id'] for kw in keywords_in_group]
-                keyword_ids_str = ','.join(map(str, keyword_ids_list))
-                log_print(f"📋 Found {len(keyword_ids_list)} keywords in ad_group {ad_group_id}")
-            else:
-                log_print(f"⚠️ No keywords found for ad_group {ad_group_id}")
-                return jsonify({
-                    'success': True,
-                    'count': 0,
-                    'logs': [],
-                    'filters_applied': {'ad_group_id': ad_group_id}
-                })
+            )"""
+            keywords_params = [ad_group_id]
         
         # Формируем SQL запрос
-        if latest_only and keyword_ids_str:
+        if latest_only and keywords_filter:
             # Получаем только последние логи для указанных слов
-            keyword_ids_list = [int(kid.strip()) for kid in keyword_ids_str.split(',') if kid.strip()]
-            
-            # Убираем лимит для ad_group_id фильтрации
-            placeholders = ','.join(['%s'] * len(keyword_ids_list))
             query = f"""
-                SELECT sl.* FROM serp_logs sl
+                SELECT {serp_log_columns(include_parsed_items, 'sl')} FROM serp_logs sl
                 INNER JOIN (
                     SELECT keyword_id, MAX(id) as max_id
                     FROM serp_logs
-                    WHERE keyword_id IN ({placeholders})
+                    WHERE {keywords_filter}
                     GROUP BY keyword_id
                 ) latest ON sl.id = latest.max_id
                 ORDER BY sl.created_at DESC
             """
-            cursor.execute(query, tuple(keyword_ids_list))
-            
-        elif keyword_ids_str:
-            # Все логи для указанных слов - БЕЗ ЛИМИТА если это ad_group_id
-            keyword_ids_list = [int(kid.strip()) for kid in keyword_ids_str.split(',') if kid.strip()]
-            placeholders = ','.join(['%s'] * len(keyword_ids_list))
+            params = keywords_params
             
-            if ad_group_id:
-                # Для ad_group не ограничиваем
-                query = f"""
-                    SELECT * FROM serp_logs 
-                    WHERE keyword_id IN ({placeholders})
-                    ORDER BY created_at DESC
-                """
-                cursor.execute(query, tuple(keyword_ids_list))
-            else:
-                # Для обычной фильтрации оставляем лимит
-                query = f"""
-                    SELECT * FROM serp_logs 
-                    WHERE keyword_id IN ({placeholders})
-                    ORDER BY created_at DESC 
-                    LIMIT %s
-                """
-                cursor.execute(query, tuple(keyword_ids_list + [limit]))
+        elif keywords_filter:
+            query = f"""
+                SELECT {columns} FROM serp_logs 
+                WHERE {keywords_filter}
+                ORDER BY created_at DESC
+            """
+            params = list(keywords_params)
+            if not ad_group_id:
+                # Для обычной фильтрации оставляем лимит (для ad_group не ограничиваем)
+                query += " LIMIT %s"
+                params.append(limit)
             
         elif keyword_id:
             # Все логи для одного слова
-            cursor.execute("""
-                SELECT * FROM serp_logs 
+            query = f"""
+                SELECT {columns} FROM serp_logs 
                 WHERE keyword_id = %s 
                 ORDER BY created_at DESC 
                 LIMIT %s
-            """, (keyword_id, limit))
+            """
+            params = [keyword_id, limit]
             
         else:
             # Все последние логи
-            cursor.execute("""
-                SELECT * FROM serp_logs 
+            query = f"""
+                SELECT {columns} FROM serp_logs 
                 ORDER BY created_at DESC 
                 LIMIT %s
-            """, (limit,))
+            """
+            params = [limit]
+        
+        filters_applied = {
+            'keyword_id': keyword_id,
+            'keyword_ids': keyword_ids_str,
+            'ad_group_id': ad_group_id,  # НОВОЕ
+            'latest_only': latest_only,
+            'include': sorted(include)
+        }
+        
+        if stream_format:
+            return stream_query_response(
+                query, params, format_serp_log, stream_format,
+                envelope={'success': True, 'filters_applied': filters_applied},
+                items_key='logs'
+            )
+        
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute(query, params)
         
         logs = cursor.fetchall()
         log_print(f"📋 Found {len(logs)} logs in DB")
         
-        # ... остальной код форматирования логов остается без изменений ...
-        
         # Форматируем логи для фронтенда
-        formatted_logs = []
-        for log in logs:
-            try:
-                # Парсим JSON поля
-                analysis_result = {}
-                organic_results = []
-                paid_results = []
-                
-                # Сначала пробуем получить из analysis_result (новый формат)
-                if log.get('analysis_result'):
-                    try:
-                        analysis_result = json.loads(log['analysis_result']) if isinstance(log['analysis_result'], str) else log['analysis_result']
-                    except:
-                        analysis_result = {}
-                
-                # Парсим parsed_items
-                if log.get('parsed_items'):
-                    try:
-                        parsed_items = json.loads(log['parsed_items']) if isinstance(log['parsed_items'], str) else log['parsed_items']
-                        organic_results = parsed_items.get('organic', [])
-                        paid_results = parsed_items.get('paid', [])
-                    except:
-                        pass
-                
-                # Если analysis_result пустой, берём из старых полей
-                if not analysis_result:
-                    analysis_result = {
-                        'has_ads': log.get('has_ads', False),
-                        'has_google_maps': log.get('has_maps', False),
-                        'has_our_site': log.get('has_our_site', False),
-                        'has_school_sites': log.get('has_school_sites', False),
-                        'our_organic_position': None,
-                        'our_actual_position': None,
-                        'school_percentage': log.get('school_percentage', 0),
-                        'intent_type': log.get('intent_type', 'Информационный'),
-                        'total_organic': log.get('organic_count', 0),
-                        'paid_count': log.get('paid_count', 0),
-                        'maps_count': log.get('maps_count', 0)
-                    }
-                
-                formatted_log = {
-                    'id': log['id'],
-                    'keyword_id': log.get('keyword_id'),
-                    'keyword_text': log.get('keyword_text', ''),
-                    'created_at': log['created_at'].isoformat() if log.get('created_at') else None,
-                    'location_code': log.get('location_code'),
-                    'language_code': log.get('language_code'),
-                    'device': log.get('device'),
-                    'cost': float(log.get('cost', 0)),
-                    'analysis_result': analysis_result,
-                    'organic_results': organic_results,
-                    'paid_results': paid_results,
-                    'raw_response': log.get('raw_response'),
-                    'parsed_items': log.get('parsed_items')
-                }
-                
-                formatted_logs.append(formatted_log)
-                
-            except Exception as e:
-                log_print(f"⚠️ Error formatting log {log.get('id')}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                continue
+        formatted_logs = [item for item in map(format_serp_log, logs) if item is not None]
         
         cursor.close()
         
@@ -1274,18 +1706,11 @@ def get_serp_logs():
             'success': True,
             'count': len(formatted_logs),
             'logs': formatted_logs,
-            'filters_applied': {
-                'keyword_id': keyword_id,
-                'keyword_ids': keyword_ids_str,
-                'ad_group_id': ad_group_id,  # НОВОЕ
-                'latest_only': latest_only
-            }
+            'filters_applied': filters_applied
         })
         
     except Exception as e:
-        log_print(f"❌ Error getting SERP logs: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error getting SERP logs: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         if connection:
@@ -1323,7 +1748,10 @@ def recalculate_school_percentages():
         for log_id in log_ids:
             try:
                 # Получаем лог
-                cursor.execute("SELECT * FROM serp_logs WHERE id = %s", (log_id,))
+                cursor.execute(f"""
+                    SELECT id, {payload_sql('parsed_items')} AS parsed_items, has_ads, has_maps, analysis_result 
+                    FROM serp_logs WHERE id = %s
+                """, (log_id,))
                 log = cursor.fetchone()
                 
                 if not log:
@@ -1417,7 +1845,7 @@ def recalculate_school_percentages():
             except Exception as e:
                 error_msg = f"Error processing log {log_id}: {str(e)}"
                 errors.append(error_msg)
-                log_print(f"❌ {error_msg}")
+                logger.error(f"❌ {error_msg}")
         
         connection.commit()
         cursor.close()
@@ -1434,9 +1862,7 @@ def recalculate_school_percentages():
     except Exception as e:
         if connection:
             connection.rollback()
-        log_print(f"❌ Error in recalculate_school_percentages: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error in recalculate_school_percentages: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
         
     finally:
@@ -1445,18 +1871,23 @@ def recalculate_school_percentages():
 
 @dataforseo_bp.route('/serp-logs/<int:log_id>', methods=['GET'])
 def get_serp_log_details(log_id):
-    """Получение детальной информации о конкретном SERP анализе"""
+    """
+    Получение детальной информации о конкретном SERP анализе
+    report - разбор анализа, log - запись в формате списка /serp-logs с parsed_items
+    """
     connection = None
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
         
-        cursor.execute("SELECT * FROM serp_logs WHERE id = %s", (log_id,))
+        cursor.execute(f"SELECT {serp_log_columns()}, parsed_items, parsed_items_hash FROM serp_logs WHERE id = %s", (log_id,))
         log = cursor.fetchone()
         
         if not log:
             return jsonify({'success': False, 'error': 'Log not found'}), 404
         
+        log['parsed_items'] = resolve_payload(cursor, log, 'parsed_items')
+        
         # Детальный разбор
         parsed_items = {}
         if log.get('parsed_items'):
@@ -1499,11 +1930,46 @@ def get_serp_log_details(log_id):
         
         return jsonify({
             'success': True,
-            'report': detailed_report
+            'report': detailed_report,
+            'log': format_serp_log(log)
         })
         
     except Exception as e:
-        log_print(f"❌ Error getting SERP log details: {str(e)}")
+        logger.error(f"❌ Error getting SERP log details: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
+@dataforseo_bp.route('/serp-logs/<int:log_id>/raw', methods=['GET'])
+def get_serp_log_raw(log_id):
+    """
+    Полный ответ DataForSeo (raw_response) одного анализа
+    Отдаётся как есть, кусками и со сжатием gzip, если клиент его принимает
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        
+        cursor.execute("SELECT raw_response, raw_response_hash FROM serp_logs WHERE id = %s", (log_id,))
+        log = cursor.fetchone()
+        
+        if not log:
+            return jsonify({'success': False, 'error': 'Log not found'}), 404
+        
+        raw_response = resolve_payload(cursor, log, 'raw_response')
+        cursor.close()
+        if not raw_response:
+            return jsonify({'success': False, 'error': 'No raw_response'}), 404
+        
+        if not isinstance(raw_response, (str, bytes)):
+            raw_response = json.dumps(raw_response, ensure_ascii=False)
+        
+        return stream_text_response(raw_response, 'gzip' in request.accept_encodings)
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting SERP log raw response: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         if connection:
@@ -1586,7 +2052,7 @@ def check_serp_cost():
             })
             
     except Exception as e:
-        log_print(f"❌ Error checking SERP cost: {str(e)}")
+        logger.error(f"❌ Error checking SERP cost: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @dataforseo_bp.route('/check-balance', methods=['GET'])
@@ -1620,6 +2086,17 @@ def check_balance():
             'error': str(e)
         }), 500
         
+@dataforseo_bp.route('/pool-stats', methods=['GET'])
+def pool_stats():
+    """Статистика пула HTTP-соединений к DataForSeo (новые / переиспользованные)"""
+    try:
+        return jsonify({
+            'success': True,
+            'pool': get_pool_stats()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+        
 @dataforseo_bp.route('/debug-serp/<int:log_id>', methods=['GET'])
 def debug_serp_log(log_id):
     """DEBUG: Полный дамп raw_response для диагностики"""
@@ -1628,13 +2105,13 @@ def debug_serp_log(log_id):
         connection = get_db_connection()
         cursor = connection.cursor()
         
-        cursor.execute("SELECT raw_response FROM serp_logs WHERE id = %s", (log_id,))
+        cursor.execute("SELECT raw_response, raw_response_hash FROM serp_logs WHERE id = %s", (log_id,))
         log = cursor.fetchone()
         
         if not log:
             return jsonify({'success': False, 'error': 'Log not found'}), 404
         
-        raw_response = log.get('raw_response')
+        raw_response = resolve_payload(cursor, log, 'raw_response')
         
         if not raw_response:
             return jsonify({'success': False, 'error': 'No raw_response'}), 404
@@ -1675,42 +2152,76 @@ def debug_serp_log(log_id):
         })
         
     except Exception as e:
-        log_print(f"❌ Debug error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Debug error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         if connection:
             connection.close()
 
+def references_response(etag: str, build_payload):
+    """
+    Ответ справочника с ETag и Cache-Control. Если у клиента та же версия
+    (If-None-Match) - 304 без сборки тела.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={Config.REFERENCES_HTTP_MAX_AGE}'
+    return response
+
 @dataforseo_bp.route('/locations', methods=['GET'])
 def get_locations():
-    """Получение списка доступных локаций из БД"""
+    """Получение списка доступных локаций из БД (кэш справочников, ETag по версии данных)"""
     try:
         from models.references import ReferencesModel
         
         country = request.args.get('country')
         
-        # Получаем только локации с флагом display='L'
-        locations = ReferencesModel.get_locations(
-            display_only=True, 
-            country_iso_code=country if country else None
-        )
+        def build_payload():
+            # Получаем только локации с флагом display='L'
+            locations = ReferencesModel.get_locations(
+                display_only=True, 
+                country_iso_code=country if country else None
+            )
+            
+            # Форматируем для совместимости с фронтендом
+            formatted_locations = []
+            for loc in locations:
+                formatted_locations.append({
+                    'code': loc['location_code'],
+                    'name': loc['location_name'],
+                    'country': loc['country_iso_code'],
+                    'type': loc['location_type']
+                })
+            
+            return {
+                'success': True,
+                'popular': formatted_locations,
+                'all': formatted_locations
+            }
         
-        # Форматируем для совместимости с фронтендом
-        formatted_locations = []
-        for loc in locations:
-            formatted_locations.append({
-                'code': loc['location_code'],
-                'name': loc['location_name'],
-                'country': loc['country_iso_code'],
-                'type': loc['location_type']
-            })
+        etag = f"locations-{ReferencesModel.get_version()}-{(country or 'all').upper()}"
+        return references_response(etag, build_payload)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@dataforseo_bp.route('/references/refresh', methods=['POST'])
+def refresh_references():
+    """Сброс кэша справочников после изменения таблиц languages/locations"""
+    try:
+        from models.references import ReferencesModel
+        
+        ReferencesModel.invalidate_cache()
+        languages = ReferencesModel.get_languages(display_only=False)
+        locations = ReferencesModel.get_locations(display_only=False)
         
         return jsonify({
             'success': True,
-            'popular': formatted_locations,
-            'all': formatted_locations
+            'version': ReferencesModel.get_version(),
+            'languages': len(languages),
+            'locations': len(locations)
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1820,9 +2331,7 @@ def test_serp_single():
         })
         
     except Exception as e:
-        log_print(f"❌ Test SERP error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Test SERP error: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -1830,18 +2339,21 @@ def test_serp_single():
 
 @dataforseo_bp.route('/languages', methods=['GET'])
 def get_languages():
-    """Получение списка доступных языков из БД"""
+    """Получение списка доступных языков из БД (кэш справочников, ETag по версии данных)"""
     try:
         from models.references import ReferencesModel
         
-        # Получаем только языки с флагом display='L'
-        languages = ReferencesModel.get_languages(display_only=True)
+        def build_payload():
+            # Получаем только языки с флагом display='L'
+            languages = ReferencesModel.get_languages(display_only=True)
+            
+            return {
+                'success': True,
+                'main': languages,
+                'all': languages
+            }
         
-        return jsonify({
-            'success': True,
-            'main': languages,
-            'all': languages
-        })
+        return references_response(f"languages-{ReferencesModel.get_version()}", build_payload)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1851,30 +2363,34 @@ def parse_serp_response(
     connection, 
     keyword_id: int = None, 
     keyword_text: str = None,
-    serp_params: Dict = None
+    serp_params: Dict = None,
+    context: SerpAnalysisContext = None
 ) -> Dict:
     """
     Парсинг SERP ответа с детальным логированием и автоматическим добавлением конкурентов
+    
+    context - справочные данные задачи (домены кампаний, школы); если не передан,
+    загружаются для этого вызова
     """
     try:
         if not serp_response.get('tasks'):
-            log_print("❌ No tasks in SERP response")
+            logger.error("❌ No tasks in SERP response")
             return None
         
         task = serp_response['tasks'][0]
         if task.get('status_code') != 20000:
-            log_print(f"❌ SERP API error: {task.get('status_message')}")
+            logger.error(f"❌ SERP API error: {task.get('status_message')}")
             return None
         
         if not task.get('result') or len(task['result']) == 0:
-            log_print("❌ No result in SERP response")
+            logger.error("❌ No result in SERP response")
             return None
         
         result = task['result'][0]
         items = result.get('items', [])
         
         if not items:
-            log_print("⚠️ No items in SERP response")
+            logger.warning("⚠️ No items in SERP response")
             return None
         
         log_print(f"\n🔍 АНАЛИЗ SERP ДЛЯ: {keyword_text}")
@@ -1904,9 +2420,11 @@ def parse_serp_response(
         from collections import Counter
         type_counter = Counter()
         
-        # Получаем домен нашего сайта
-        our_domain = get_campaign_domain(campaign_id, connection)
-        school_domains = get_school_domains(connection)
+        # Получаем домен нашего сайта и набор школ из контекста задачи
+        if context is None:
+            context = SerpAnalysisContext(connection)
+        our_domain = context.campaign_domain(campaign_id)
+        school_domains = context.school_domains()
         
         log_print(f"📌 Наш домен: {our_domain or 'НЕ УКАЗАН'}")
         log_print(f"\n{'=' * 70}")
@@ -1927,7 +2445,7 @@ def parse_serp_response(
             url = (item.get('url', '') or '').lower()
             title = item.get('title') or ''
             
-            log_print(f"#{idx+1:2d} | Type: {item_type:20s} | rank_abs: {rank_absolute:3d} | rank_group: {rank_group:3d}")
+            trace(f"#{idx+1:2d} | Type: {item_type:20s} | rank_abs: {rank_absolute:3d} | rank_group: {rank_group:3d}")
             
             # РЕКЛАМНЫЕ БЛОКИ
             if item_type in ['paid', 'shopping', 'google_flights', 'google_hotels', 'ads', 'ad']:
@@ -1941,8 +2459,8 @@ def parse_serp_response(
                     'url': url,
                     'ad_type': item_type
                 })
-                log_print(f"     💰 [РЕКЛАМА type={item_type}] Domain: {clean_domain}")
-                log_print(f"     Title: {title[:60]}")
+                trace(f"     💰 [РЕКЛАМА type={item_type}] Domain: {clean_domain}")
+                trace(f"     Title: {title[:60]}")
             
             # GOOGLE MAPS / LOCAL PACK
             elif item_type in ['local_pack', 'map', 'maps', 'google_maps']:
@@ -1964,8 +2482,8 @@ def parse_serp_response(
                                 'type': 'maps'
                             })
                 
-                log_print(f"     🗺️ [КАРТЫ] Type: {item_type}")
-                log_print(f"     📍 Мест в блоке: {len(item.get('items', []))}")
+                trace(f"     🗺️ [КАРТЫ] Type: {item_type}")
+                trace(f"     📍 Мест в блоке: {len(item.get('items', []))}")
             
             # ОРГАНИЧЕСКИЕ РЕЗУЛЬТАТЫ
             elif item_type == 'organic':
@@ -1986,8 +2504,8 @@ def parse_serp_response(
                 
                 organic_results.append(organic_item)
                 
-                log_print(f"     🌐 [ОРГАНИКА #{organic_position_counter}] Domain: {clean_domain}")
-                log_print(f"     Title: {title[:60]}")
+                trace(f"     🌐 [ОРГАНИКА #{organic_position_counter}] Domain: {clean_domain}")
+                trace(f"     Title: {title[:60]}")
                 
                 # Проверка нашего сайта
                 if our_domain:
@@ -1996,38 +2514,37 @@ def parse_serp_response(
                     
                     if clean_our_domain == clean_domain:
                         is_our_site = True
-                        log_print(f"        ✅ ТОЧНОЕ СОВПАДЕНИЕ ДОМЕНА")
+                        trace(f"        ✅ ТОЧНОЕ СОВПАДЕНИЕ ДОМЕНА")
                     elif clean_our_domain in url:
                         is_our_site = True
-                        log_print(f"        ✅ ДОМЕН НАЙДЕН В URL")
+                        trace(f"        ✅ ДОМЕН НАЙДЕН В URL")
                     elif clean_domain.endswith('.' + clean_our_domain) or clean_our_domain.endswith('.' + clean_domain):
                         is_our_site = True
-                        log_print(f"        ✅ SUBDOMAIN MATCH")
+                        trace(f"        ✅ SUBDOMAIN MATCH")
                     
                     if is_our_site:
                         has_our_site = True
                         if our_organic_position is None:
                             our_organic_position = organic_position_counter
                             our_actual_position = rank_absolute
-                            log_print(f"        🎯 ЭТО НАШ САЙТ!")
-                            log_print(f"        📍 Органическая позиция: {our_organic_position}")
-                            log_print(f"        📍 Фактическая позиция: {our_actual_position}")
+                            trace(f"        🎯 ЭТО НАШ САЙТ!")
+                            trace(f"        📍 Органическая позиция: {our_organic_position}")
+                            trace(f"        📍 Фактическая позиция: {our_actual_position}")
                 
                 # Проверка сайтов школ
                 if clean_domain in school_domains:
                     school_sites_count += 1
                     has_school_sites = True
-                    log_print(f"        🏫 САЙТ ШКОЛЫ-КОНКУРЕНТА: {clean_domain}")
+                    trace(f"        🏫 САЙТ ШКОЛЫ-КОНКУРЕНТА: {clean_domain}")
                 else:
-                    log_print(f"        ℹ️ НЕ ШКОЛА: {clean_domain}")
+                    trace(f"        ℹ️ НЕ ШКОЛА: {clean_domain}")
             
             # ВСЕ ОСТАЛЬНЫЕ ТИПЫ
             else:
-                log_print(f"     ℹ️ [{item_type.upper()}]")
+                trace(f"     ℹ️ [{item_type.upper()}]")
                 if title:
-                    log_print(f"     Title: {title[:60]}")
+                    trace(f"     Title: {title[:60]}")
             
-            log_print()
         
         # Определяем интент
         # Вычисляем процент школ
@@ -2100,13 +2617,16 @@ def parse_serp_response(
                     request_params = serp_params
                 
                 # DEBUG
-                log_print(f"\n🔍 DEBUG request_params:")
-                log_print(f"   location_code: {request_params.get('location_code')}")
-                log_print(f"   language_code: {request_params.get('language_code')}")
-                log_print(f"   device: {request_params.get('device')}")
-                log_print(f"   os: {request_params.get('os')}")
-                log_print(f"   depth: {request_params.get('depth')}")
-                log_print()
+                trace("🔍 DEBUG request_params:")
+                trace(f"   location_code: {request_params.get('location_code')}")
+                trace(f"   language_code: {request_params.get('language_code')}")
+                trace(f"   device: {request_params.get('device')}")
+                trace(f"   os: {request_params.get('os')}")
+                trace(f"   depth: {request_params.get('depth')}")
+                
+                # Сырой ответ и разобранная выдача - в сжатое хранилище (по hash)
+                raw_response_hash = store_payload(cursor, serp_response)
+                parsed_items_hash = store_payload(cursor, parsed_items_json)
                 
                 # 1. Сохраняем в старую таблицу serp_logs (для совместимости)
                 insert_query = """
@@ -2115,7 +2635,7 @@ def parse_serp_response(
                         device, os, depth, total_items, organic_count, paid_count,
                         maps_count, shopping_count, has_ads, has_maps,
                         has_our_site, has_school_sites, intent_type,
-                        school_percentage, cost, raw_response, parsed_items,
+                        school_percentage, cost, raw_response_hash, parsed_items_hash,
                         analysis_result, browser_screen_width, browser_screen_height
                     ) VALUES (
                         %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
@@ -2143,8 +2663,8 @@ def parse_serp_response(
                     intent_type,
                     school_percentage,
                     task.get('cost', 0),
-                    json.dumps(serp_response, ensure_ascii=False),
-                    parsed_items_json,
+                    raw_response_hash,
+                    parsed_items_hash,
                     analysis_result_json,
                     request_params.get('browser_screen_width', 1920),
                     request_params.get('browser_screen_height', 1080)
@@ -2155,12 +2675,14 @@ def parse_serp_response(
                 log_print(f"💾 Сохранено в serp_logs, ID: {serp_log_id}")
                 
                 # 2. Сохраняем в новую таблицу serp_analysis_history
+                #    (анализы одного слова - по очереди, см. update_competitiveness_for_analysis)
+                lock_keyword_for_analysis(connection, keyword_id)
                 cursor.execute("""
                     INSERT INTO serp_analysis_history (
                         keyword_id, keyword_text, campaign_id,
                         analysis_date, has_ads, has_maps, has_our_site, has_school_sites,
                         intent_type, organic_count, paid_count, maps_count, 
-                        school_percentage, cost, parsed_items, analysis_result
+                        school_percentage, cost, parsed_items_hash, analysis_result
                     ) VALUES (
                         %s, %s, %s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
                     )
@@ -2178,7 +2700,7 @@ def parse_serp_response(
                     len(maps_results),
                     school_percentage,
                     task.get('cost', 0),
-                    parsed_items_json,
+                    parsed_items_hash,
                     analysis_result_json
                 ))
                 
@@ -2186,26 +2708,18 @@ def parse_serp_response(
                 log_print(f"💾 Сохранено в serp_analysis_history, ID: {serp_analysis_id}")
                 
                 # 3. АВТОМАТИЧЕСКИ ДОБАВЛЯЕМ КОНКУРЕНТОВ
+                #    Конкурентность поддерживается дельтами, поэтому анализ без
+                #    конкурентов не сохраняем: ошибка откатывает всю запись
                 log_print(f"\n🔄 Добавление конкурентов в БД...")
-                
-                # Импортируем helper (если ещё не импортирован)
-                try:
-                    from utils.serp_competitors_helper import save_serp_competitors
-                    
-                    # Сохраняем конкурентов
-                    save_serp_competitors(
-                        connection=connection,
-                        serp_analysis_id=serp_analysis_id,
-                        organic_results=organic_results,
-                        paid_results=paid_results,
-                        maps_results=maps_results,
-                        campaign_id=campaign_id
-                    )
-                    
-                except ImportError:
-                    log_print("⚠️ Модуль serp_competitors_helper не найден. Конкуренты не будут добавлены автоматически.")
-                except Exception as e:
-                    log_print(f"⚠️ Ошибка при добавлении конкурентов: {e}")
+                save_serp_competitors(
+                    connection=connection,
+                    serp_analysis_id=serp_analysis_id,
+                    organic_results=organic_results,
+                    paid_results=paid_results,
+                    maps_results=maps_results,
+                    campaign_id=campaign_id,
+                    context=context
+                )
                 
                 connection.commit()
                 cursor.close()
@@ -2213,10 +2727,19 @@ def parse_serp_response(
                 log_print(f"✅ Все данные SERP-анализа сохранены\n")
                 
             except Exception as e:
-                log_print(f"❌ Ошибка сохранения в БД: {str(e)}")
-                import traceback
-                traceback.print_exc()
-        
+                logger.exception(f"❌ Ошибка сохранения в БД: {str(e)}")
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+                # Анализ не сохранён - вызывающий код должен засчитать ошибку,
+                # а не обновлять ключевое слово и закрывать задачу
+                return None
+
         # Возвращаем результат
         return {
             'has_ads': has_ads,
@@ -2235,9 +2758,7 @@ def parse_serp_response(
         }
         
     except Exception as e:
-        log_print(f"❌ Error parsing SERP: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error parsing SERP: {str(e)}")
         return None
         
 def save_serp_analysis_to_db(connection, keyword_id, keyword_text, campaign_id, serp_data, 
@@ -2279,13 +2800,16 @@ def save_serp_analysis_to_db(connection, keyword_id, keyword_text, campaign_id,
             'stats': serp_data.get('stats', {})
         }, ensure_ascii=False)
         
-        # Сохраняем запись о SERP-анализе
+        parsed_items_hash = store_payload(cursor, parsed_items_json)
+        
+        # Сохраняем запись о SERP-анализе (анализы одного слова - по очереди)
+        lock_keyword_for_analysis(connection, keyword_id)
         cursor.execute("""
             INSERT INTO serp_analysis_history (
                 keyword_id, keyword_text, campaign_id,
                 analysis_date, has_ads, has_maps, has_our_site, has_school_sites,
                 intent_type, organic_count, paid_count, maps_count, 
-                school_percentage, cost, parsed_items, analysis_result
+                school_percentage, cost, parsed_items_hash, analysis_result
             ) VALUES (
                 %s, %s, %s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
             )
@@ -2303,7 +2827,7 @@ def save_serp_analysis_to_db(connection, keyword_id, keyword_text, campaign_id,
             len(maps_results),
             serp_data.get('stats', {}).get('school_percentage', 0),
             cost,
-            parsed_items_json,
+            parsed_items_hash,
             analysis_result_json
         ))
         
@@ -2324,10 +2848,8 @@ def save_serp_analysis_to_db(connection, keyword_id, keyword_text, campaign_id,
         connection.commit()
         
     except Exception as e:
-        log_print(f"   ❌ Ошибка сохранения SERP-анализа: {e}")
+        logger.exception(f"   ❌ Ошибка сохранения SERP-анализа: {e}")
         connection.rollback()
-        import traceback
-        traceback.print_exc()
     finally:
         cursor.close()
         
@@ -2356,7 +2878,7 @@ def get_campaign_domain(campaign_id: int, connection) -> str:
         return None
         
     except Exception as e:
-        log_print(f"❌ Error getting campaign domain: {e}")
+        logger.error(f"❌ Error getting campaign domain: {e}")
         return None
 
 def get_school_domains(connection) -> set:
@@ -2365,27 +2887,7 @@ def get_school_domains(connection) -> set:
     ТОЛЬКО обработанные школы (is_new=FALSE и org_type='Школа')
     """
     try:
-        cursor = connection.cursor()
-        # ✅ ИСПРАВЛЕНО: только обработанные школы (is_new=FALSE) с типом "Школа"
-        cursor.execute("""
-            SELECT domain 
-            FROM competitor_schools 
-            WHERE is_new = FALSE 
-            AND org_type = 'Школа'
-        """)
-        
-        results = cursor.fetchall()
-        cursor.close()
-        
-        # Создаем set доменов для быстрой проверки
-        domains = set()
-        for row in results:
-            if row['domain']:
-                domain = row['domain'].lower()
-                # Убираем www. если есть
-                if domain.startswith('www.'):
-                    domain = domain[4:]
-                domains.add(domain)
+        domains = load_school_domains(connection)
         
         log_print(f"📋 Загружено ОБРАБОТАННЫХ школ (org_type='Школа', is_new=FALSE): {len(domains)}")
         if domains:
@@ -2394,7 +2896,5 @@ def get_school_domains(connection) -> set:
         return domains
         
     except Exception as e:
-        log_print(f"⚠️ Error getting school domains: {e}")
-        import traceback
-        traceback.print_exc()
-        return set()
\ No newline at end of file
+        logger.exception(f"⚠️ Error getting school domains: {e}")
+        return set()
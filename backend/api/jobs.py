@@ -0,0 +1,84 @@
+# backend/api/jobs.py
+from flask import Blueprint, request, jsonify
+from services.job_queue import get_job, list_jobs, cancel_job, JOB_ACTIVE_STATUSES, JOB_FINISHED_STATUSES
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def format_job(job: dict) -> dict:
+    """Задача для ответа API (без payload/checkpoint)"""
+    return {
+        'id': job['id'],
+        'job_type': job['job_type'],
+        'status': job['status'],
+        'priority': job['priority'],
+        'progress': {
+            'current': job['progress_current'],
+            'total': job['progress_total'],
+            'keyword': job['progress_keyword']
+        },
+        'result': job.get('result'),
+        'error': job['error'],
+        'attempts': job['attempts'],
+        'cancel_requested': bool(job['cancel_requested']),
+        'worker_id': job['worker_id'],
+        'created_at': job['created_at'].isoformat() if job['created_at'] else None,
+        'started_at': job['started_at'].isoformat() if job['started_at'] else None,
+        'finished_at': job['finished_at'].isoformat() if job['finished_at'] else None
+    }
+
+
+@jobs_bp.route('', methods=['GET'])
+def get_jobs():
+    """Список последних фоновых задач (?status=queued|running|complete|error|cancelled)"""
+    status = request.args.get('status')
+    if status and status not in JOB_ACTIVE_STATUSES + JOB_FINISHED_STATUSES:
+        return jsonify({'success': False, 'error': f'Unknown status: {status}'}), 400
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+
+    try:
+        jobs = list_jobs(status, limit)
+        return jsonify({
+            'success': True,
+            'jobs': [format_job(job) for job in jobs],
+            'count': len(jobs)
+        })
+    except Exception as e:
+        print(f"❌ Ошибка получения задач: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job_details(job_id):
+    """Состояние фоновой задачи"""
+    try:
+        job = get_job(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': format_job(job)})
+    except Exception as e:
+        print(f"❌ Ошибка получения задачи {job_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+def cancel_job_endpoint(job_id):
+    """Отмена фоновой задачи: ожидающая - сразу, выполняющаяся - при следующем heartbeat"""
+    try:
+        status = cancel_job(job_id)
+        if status is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        if status in JOB_FINISHED_STATUSES and status != 'cancelled':
+            return jsonify({'success': False, 'error': f'Job already finished: {status}', 'status': status}), 409
+        return jsonify({
+            'success': True,
+            'status': status,
+            'message': 'Задача отменена' if status == 'cancelled' else 'Отмена запрошена'
+        })
+    except Exception as e:
+        print(f"❌ Ошибка отмены задачи {job_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -2,21 +2,19 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 from config import Config
-import pymysql
+from services.db_pool import get_connection
+from utils.ttl_cache import TTLCache
+from utils.keyword_tombstones import record_keyword_tombstones
+from utils.streaming import get_stream_format, stream_query_response
 import random
+import json
+import base64
 
 keywords_bp = Blueprint('keywords', __name__)
 
 def get_db_connection():
-    """Создаёт прямое подключение к БД"""
-    return pymysql.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD,
-        database=Config.DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
-    )
+    """Соединение из общего пула (close() возвращает его в пул)"""
+    return get_connection()
     
 # Палитра цветов (такая же как на frontend)
 BATCH_COLORS = [
@@ -24,13 +22,23 @@ BATCH_COLORS = [
     '#e1fffe', '#fff2e6', '#f0e6ff', '#e6f3ff', '#ffe6f2', '#e6ffe6'
 ]
 
-def get_random_batch_color():
+# Кэш дерева кампаний для сайдбара (GET /campaigns)
+campaigns_cache = TTLCache(Config.CAMPAIGNS_CACHE_TTL)
+
+def invalidate_campaigns_cache():
+    """Сбрасывает кэш дерева кампаний после изменений ключевых слов, групп или кампаний"""
+    campaigns_cache.invalidate()
+
+@keywords_bp.after_request
+def invalidate_campaigns_cache_after_write(response):
+    """Любой изменяющий запрос blueprint'а сбрасывает кэш кампаний"""
+    if request.method != 'GET':
+        invalidate_campaigns_cache()
+    return response
+
+def get_random_batch_color(cursor):
     """Получить рандомный цвет для новой партии, избегая уже использованных"""
-    connection = None
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
         # Получаем уже использованные цвета для активных новых записей
         cursor.execute("""
             SELECT DISTINCT batch_color 
@@ -40,7 +48,6 @@ def get_random_batch_color():
             AND batch_color != ''
         """)
         used_colors = {row['batch_color'] for row in cursor.fetchall()}
-        cursor.close()
         
         # Находим неиспользованные цвета
         available_colors = [c for c in BATCH_COLORS if c not in used_colors]
@@ -57,9 +64,33 @@ def get_random_batch_color():
     except Exception as e:
         print(f"❌ Error getting unique color: {e}")
         return random.choice(BATCH_COLORS)
-    finally:
-        if connection:
-            connection.close()
+    
+def insert_new_keywords(cursor, campaign_id, ad_group_id, keywords, batch_color):
+    """
+    Добавляет ключевые слова в группу, пропуская дубли
+    
+    Дубли отсекает уникальный индекс uq_keywords_ad_group_keyword:
+    для них ON DUPLICATE KEY UPDATE id = id ничего не меняет и даёт 0 в rowcount.
+    
+    Returns:
+        (added, skipped)
+    """
+    if not keywords:
+        return 0, 0
+    
+    cursor.executemany("""
+        INSERT INTO keywords (
+            campaign_id, ad_group_id, keyword, criterion_type, 
+            status, max_cpc, is_new, batch_color
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = id
+    """, [
+        (campaign_id, ad_group_id, keyword, 'Phrase', 'Enabled', 3.61, True, batch_color)
+        for keyword in keywords
+    ])
+    
+    added = cursor.rowcount
+    return added, len(keywords) - added
     
 @keywords_bp.route('/accept-changes', methods=['POST'])
 def accept_changes():
@@ -115,6 +146,7 @@ def reject_changes():
         cursor = connection.cursor()
         
         # Удаляем все новые ключевые слова для данной группы
+        record_keyword_tombstones(cursor, "ad_group_id = %s AND is_new = TRUE", (ad_group_id,))
         cursor.execute("""
             DELETE FROM keywords 
             WHERE ad_group_id = %s AND is_new = TRUE
@@ -140,48 +172,55 @@ def reject_changes():
             
 @keywords_bp.route('/campaigns', methods=['GET'])
 def get_campaigns():
-    """Получение списка кампаний с группами объявлений"""
+    """
+    Получение списка кампаний с группами объявлений
+    
+    Собирается тремя запросами (кампании, группы, агрегаты новых слов по группам)
+    и кэшируется на CAMPAIGNS_CACHE_TTL секунд. ETag позволяет клиенту
+    получить 304 без тела, если дерево не изменилось.
+    """
     connection = None
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        # Получаем кампании
-        cursor.execute("SELECT id, name, status FROM campaigns ORDER BY id")
-        campaigns = cursor.fetchall()
+        campaigns_data = campaigns_cache.get('campaigns')
         
-        campaigns_data = []
-        for campaign in campaigns:
-            # Получаем группы объявлений для каждой кампании
+        if campaigns_data is None:
+            connection = get_db_connection()
+            cursor = connection.cursor()
+            
+            # Получаем кампании
+            cursor.execute("SELECT id, name, status FROM campaigns ORDER BY id")
+            campaigns = cursor.fetchall()
+            
+            # Все группы объявлений
             cursor.execute("""
-                SELECT id, name, status 
+                SELECT id, campaign_id, name, status 
                 FROM ad_groups 
-                WHERE campaign_id = %s 
                 ORDER BY id
-            """, (campaign['id'],))
+            """)
             ad_groups = cursor.fetchall()
             
-            # Для каждой группы считаем новые изменения
-            ad_groups_with_stats = []
+            # Новые изменения и цвета партий по всем группам сразу
+            # (индекс idx_keywords_ad_group_new)
+            cursor.execute("""
+                SELECT 
+                    ad_group_id,
+                    COUNT(*) as new_changes,
+                    GROUP_CONCAT(DISTINCT batch_color) as batch_colors
+                FROM keywords 
+                WHERE is_new = TRUE
+                GROUP BY ad_group_id
+            """)
+            new_stats = {row['ad_group_id']: row for row in cursor.fetchall()}
+            
+            cursor.close()
+            
+            ad_groups_by_campaign = {}
             for ag in ad_groups:
-                cursor.execute("""
-                    SELECT COUNT(*) as new_changes 
-                    FROM keywords 
-                    WHERE ad_group_id = %s AND is_new = TRUE
-                """, (ag['id'],))
-                new_changes = cursor.fetchone()['new_changes']
+                stats = new_stats.get(ag['id'])
+                new_changes = stats['new_changes'] if stats else 0
+                colors = stats['batch_colors'].split(',') if stats and stats['batch_colors'] is not None else []
                 
-                # Получаем уникальные цвета партий
-                cursor.execute("""
-                    SELECT DISTINCT batch_color 
-                    FROM keywords 
-                    WHERE ad_group_id = %s 
-                    AND is_new = TRUE 
-                    AND batch_color IS NOT NULL
-                """, (ag['id'],))
-                colors = [row['batch_color'] for row in cursor.fetchall()]
-                
-                ad_groups_with_stats.append({
+                ad_groups_by_campaign.setdefault(ag['campaign_id'], []).append({
                     'id': ag['id'],
                     'name': ag['name'],
                     'status': ag['status'],
@@ -190,19 +229,24 @@ def get_campaigns():
                     'hasChanges': new_changes > 0
                 })
             
-            campaigns_data.append({
-                'id': campaign['id'],
-                'name': campaign['name'],
-                'status': campaign['status'],
-                'adGroups': ad_groups_with_stats
-            })
-        
-        cursor.close()
+            campaigns_data = [
+                {
+                    'id': campaign['id'],
+                    'name': campaign['name'],
+                    'status': campaign['status'],
+                    'adGroups': ad_groups_by_campaign.get(campaign['id'], [])
+                }
+                for campaign in campaigns
+            ]
+            campaigns_cache.set('campaigns', campaigns_data)
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': campaigns_data
         })
+        response.add_etag()
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
         
     except Exception as e:
         print(f"Error in get_campaigns: {str(e)}")
@@ -215,91 +259,293 @@ def get_campaigns():
         if connection:
             connection.close()
 
+def _to_float(value):
+    return float(value) if value else None
+
+def _to_bool(value):
+    return bool(value) if value is not None else False
+
+def _to_iso(value):
+    return value.isoformat() if value else None
+
+# Поля списка ключевых слов и их преобразование для frontend
+# (как fields в Keyword.to_dict - клиент может запросить подмножество)
+KEYWORD_LIST_FIELDS = {
+    'id': None,
+    'keyword': None,
+    'criterion_type': None,
+    'max_cpc': _to_float,
+    'max_cpm': _to_float,
+    'status': None,
+    'comment': None,
+    'has_ads': _to_bool,
+    'has_school_sites': _to_bool,
+    'has_google_maps': _to_bool,
+    'has_our_site': _to_bool,
+    'intent_type': None,
+    'recommendation': None,
+    'avg_monthly_searches': None,
+    'three_month_change': _to_float,
+    'yearly_change': _to_float,
+    'competition': None,
+    'competition_percent': _to_float,
+    'min_top_of_page_bid': _to_float,
+    'max_top_of_page_bid': _to_float,
+    'is_new': _to_bool,
+    'batch_color': None,
+    'our_organic_position': None,
+    'our_actual_position': None,
+    'last_serp_check': _to_iso
+}
+
+# Сортировка: выражение без NULL, чтобы курсор (значение, id) был однозначным
+KEYWORD_SORT_EXPRESSIONS = {
+    'id': 'id',
+    'keyword': 'keyword',
+    'avg_monthly_searches': 'COALESCE(avg_monthly_searches, -1)',
+    'max_cpc': 'COALESCE(max_cpc, -1)',
+    'competition_percent': 'COALESCE(competition_percent, -1)',
+    'intent_type': "COALESCE(intent_type, '')",
+    'status': 'status',
+    'our_organic_position': 'COALESCE(our_organic_position, 2147483647)',
+    'last_serp_check': "COALESCE(last_serp_check, '1000-01-01')",
+    'created_at': "COALESCE(created_at, '1000-01-01')"
+}
+
+KEYWORDS_MAX_LIMIT = 1000
+
+def encode_keywords_cursor(sort_value, row_id):
+    """Непрозрачный курсор из значения сортировки и id последней строки"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat(sep=' ')
+    elif sort_value is not None and not isinstance(sort_value, (int, str)):
+        sort_value = str(sort_value)
+    raw = json.dumps([sort_value, row_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_keywords_cursor(cursor_token):
+    raw = base64.urlsafe_b64decode(cursor_token.encode()).decode()
+    sort_value, row_id = json.loads(raw)
+    return sort_value, int(row_id)
+
+def format_keyword_row(row, fields):
+    """Преобразует строку БД в dict для frontend"""
+    result = {}
+    for field in fields:
+        convert = KEYWORD_LIST_FIELDS[field]
+        value = row.get(field)
+        result[field] = convert(value) if convert else value
+    return result
+
+def build_keywords_filters(ad_group_id, args):
+    """WHERE и параметры списка ключевых слов из query параметров"""
+    where = ["ad_group_id = %s"]
+    params = [ad_group_id]
+    
+    status = args.get('status')
+    if status:
+        if status not in ('Enabled', 'Paused'):
+            raise ValueError(f'Недопустимый статус: {status}')
+        where.append("status = %s")
+        params.append(status)
+    else:
+        where.append("status != 'Removed'")
+    
+    intent_type = args.get('intent_type')
+    if intent_type:
+        where.append("intent_type = %s")
+        params.append(intent_type)
+    
+    min_searches = args.get('min_searches', type=int)
+    if min_searches is not None:
+        where.append("avg_monthly_searches >= %s")
+        params.append(min_searches)
+    
+    max_searches = args.get('max_searches', type=int)
+    if max_searches is not None:
+        where.append("avg_monthly_searches <= %s")
+        params.append(max_searches)
+    
+    is_new = args.get('is_new')
+    if is_new:
+        where.append("is_new = %s")
+        params.append(is_new.lower() in ('1', 'true', 'yes'))
+    
+    search = args.get('search', '').strip()
+    if search:
+        where.append("keyword LIKE %s")
+        params.append(f"%{search}%")
+    
+    return where, params
+
+def parse_keyword_fields(args):
+    """Список полей из параметра fields (id включается всегда)"""
+    fields_param = args.get('fields')
+    if not fields_param:
+        return list(KEYWORD_LIST_FIELDS)
+    
+    fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in KEYWORD_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+def fetch_keyword_stats(cursor, ad_group_id):
+    """Статистика группы в SQL (дубли - без учёта регистра, как в collation)"""
+    cursor.execute("""
+        SELECT 
+            COUNT(*) as total,
+            COALESCE(SUM(intent_type = 'Коммерческий'), 0) as commercial,
+            COUNT(*) - COUNT(DISTINCT keyword) as duplicates,
+            COALESCE(SUM(is_new = TRUE), 0) as new_changes
+        FROM keywords
+        WHERE ad_group_id = %s AND status != 'Removed'
+    """, (ad_group_id,))
+    row = cursor.fetchone()
+    return {
+        'total': row['total'],
+        'commercial': int(row['commercial']),
+        'duplicates': row['duplicates'],
+        'newChanges': int(row['new_changes'])
+    }
+
+SYNC_TOKEN_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def fetch_sync_token(cursor):
+    """
+    Токен синхронизации: время БД (часы сервера БД, а не приложения) минус
+    KEYWORD_SYNC_SAFETY_MARGIN. updated_at ставится в момент UPDATE, а виден
+    после коммита: строка из ещё не закоммиченной транзакции может получить
+    updated_at раньше NOW(). С запасом такие строки придут в следующем /changes.
+    """
+    cursor.execute("SELECT NOW() - INTERVAL %s SECOND as now", (Config.KEYWORD_SYNC_SAFETY_MARGIN,))
+    return cursor.fetchone()['now'].strftime(SYNC_TOKEN_FORMAT)
+
 @keywords_bp.route('/list/<int:ad_group_id>', methods=['GET'])
 def get_keywords(ad_group_id):
-    """Получение списка ключевых слов для группы объявлений"""
+    """
+    Получение списка ключевых слов для группы объявлений
+    
+    Query параметры (все необязательные):
+    - limit, cursor - постраничная выдача по курсору (без limit - весь список)
+    - sort, order - сортировка (см. KEYWORD_SORT_EXPRESSIONS), asc / desc
+    - fields - список полей через запятую (см. KEYWORD_LIST_FIELDS)
+    - status, intent_type, min_searches, max_searches, is_new, search - фильтры
+    - format - ndjson / stream: потоковая выдача (utils/streaming.py)
+    
+    Статистика (stats) считается в SQL по всей группе без учёта фильтров.
+    """
     print(f"\n=== get_keywords called for ad_group_id: {ad_group_id} ===")
     
     connection = None
     try:
+        args = request.args
+        
+        try:
+            fields = parse_keyword_fields(args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        sort = args.get('sort', 'id')
+        if sort not in KEYWORD_SORT_EXPRESSIONS:
+            return jsonify({'success': False, 'error': f'Недопустимое поле сортировки: {sort}'}), 400
+        order = args.get('order', 'asc').lower()
+        if order not in ('asc', 'desc'):
+            return jsonify({'success': False, 'error': f'Недопустимый порядок сортировки: {order}'}), 400
+        
+        limit = args.get('limit', type=int)
+        if limit is not None:
+            limit = min(max(limit, 1), KEYWORDS_MAX_LIMIT)
+        
+        try:
+            where, params = build_keywords_filters(ad_group_id, args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        sort_expr = KEYWORD_SORT_EXPRESSIONS[sort]
+        comparison = '>' if order == 'asc' else '<'
+        filter_where = list(where)
+        filter_params = list(params)
+        
+        cursor_token = args.get('cursor')
+        if cursor_token:
+            try:
+                last_value, last_id = decode_keywords_cursor(cursor_token)
+            except Exception:
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+            where.append(f"({sort_expr} {comparison} %s OR ({sort_expr} = %s AND id {comparison} %s))")
+            params.extend([last_value, last_value, last_id])
+        
         connection = get_db_connection()
         cursor = connection.cursor()
         
-        # ОБНОВЛЕНО: добавлено поле batch_color в запрос
-        query = """
-            SELECT 
-                id, keyword, criterion_type, max_cpc, max_cpm, status,
-                comment, has_ads, has_school_sites, has_google_maps,
-                has_our_site, intent_type, recommendation,
-                avg_monthly_searches, three_month_change, yearly_change,
-                competition, competition_percent, min_top_of_page_bid,
-                max_top_of_page_bid, is_new, batch_color,
-                our_organic_position, our_actual_position, last_serp_check
+        # Токен для последующих запросов /changes - время БД до чтения
+        sync_token = fetch_sync_token(cursor)
+        
+        query = f"""
+            SELECT {', '.join(fields)}, {sort_expr} as sort_key
             FROM keywords 
-            WHERE ad_group_id = %s 
-            AND status != 'Removed'
+            WHERE {' AND '.join(where)}
+            ORDER BY {sort_expr} {order.upper()}, id {order.upper()}
         """
-        
-        cursor.execute(query, (ad_group_id,))
-        keywords = cursor.fetchall()
-        
-        print(f"Found {len(keywords)} keywords for ad_group_id {ad_group_id}")
-        
-        # Преобразуем данные для frontend
-        keywords_data = []
-        for row in keywords:
-            keyword_dict = {
-                'id': row['id'],
-                'keyword': row['keyword'],
-                'criterion_type': row['criterion_type'],
-                'max_cpc': float(row['max_cpc']) if row['max_cpc'] else None,
-                'max_cpm': float(row['max_cpm']) if row['max_cpm'] else None,
-                'status': row['status'],
-                'comment': row['comment'],
-                'has_ads': bool(row['has_ads']),
-                'has_school_sites': bool(row['has_school_sites']),
-                'has_google_maps': bool(row['has_google_maps']),
-                'has_our_site': bool(row['has_our_site']),
-                'intent_type': row['intent_type'],
-                'recommendation': row['recommendation'],
-                'avg_monthly_searches': row['avg_monthly_searches'],
-                'three_month_change': float(row['three_month_change']) if row['three_month_change'] else None,
-                'yearly_change': float(row['yearly_change']) if row['yearly_change'] else None,
-                'competition': row['competition'],
-                'competition_percent': float(row['competition_percent']) if row['competition_percent'] else None,
-                'min_top_of_page_bid': float(row['min_top_of_page_bid']) if row['min_top_of_page_bid'] else None,
-                'max_top_of_page_bid': float(row['max_top_of_page_bid']) if row['max_top_of_page_bid'] else None,
-                'is_new': bool(row.get('is_new', False)),
-                'batch_color': row.get('batch_color'),
-                'our_organic_position': row.get('our_organic_position'),
-                'our_actual_position': row.get('our_actual_position'),
-                'last_serp_check': row['last_serp_check'].isoformat() if row.get('last_serp_check') else None
+        stream_format = get_stream_format(args)
+        if stream_format:
+            # Потоковая выдача: строки идут клиенту по мере чтения серверным курсором,
+            # limit применяется как обычный LIMIT без курсора следующей страницы
+            if limit is not None:
+                query += " LIMIT %s"
+                params.append(limit)
+            envelope = {
+                'success': True,
+                'stats': fetch_keyword_stats(cursor, ad_group_id),
+                'sync_token': sync_token
             }
-            keywords_data.append(keyword_dict)
+            cursor.close()
+            print(f"Streaming keywords for ad_group_id {ad_group_id} ({stream_format})")
+            return stream_query_response(
+                query, params, lambda row: format_keyword_row(row, fields), stream_format, envelope
+            )
         
-        # ИСПРАВЛЕНО: Статистика считает дубли только среди активных (не removed) ключевых слов
-        total_count = len(keywords_data)
-        commercial_count = sum(1 for k in keywords_data if k.get('intent_type') == 'Коммерческий')
+        if limit is not None:
+            # Лишняя строка показывает, есть ли следующая страница
+            query += " LIMIT %s"
+            params.append(limit + 1)
         
-        # Дубли считаем только среди не удаленных слов
-        keyword_texts = [k['keyword'].lower() for k in keywords_data if k.get('status') != 'Removed']
-        duplicates_count = len(keyword_texts) - len(set(keyword_texts))
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
         
-        new_changes_count = sum(1 for k in keywords_data if k.get('is_new', False))
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
         
-        cursor.close()
+        keywords_data = [format_keyword_row(row, fields) for row in rows]
+        
+        stats = fetch_keyword_stats(cursor, ad_group_id)
+        new_changes_count = stats['newChanges']
         
         result = {
             'success': True,
             'data': keywords_data,
-            'stats': {
-                'total': total_count,
-                'commercial': commercial_count,
-                'duplicates': duplicates_count,
-                'newChanges': new_changes_count
-            }
+            'stats': stats,
+            'sync_token': sync_token
         }
         
+        if limit is not None:
+            cursor.execute(
+                f"SELECT COUNT(*) as total FROM keywords WHERE {' AND '.join(filter_where)}",
+                filter_params
+            )
+            result['pagination'] = {
+                'limit': limit,
+                'total': cursor.fetchone()['total'],
+                'has_more': has_more,
+                'next_cursor': encode_keywords_cursor(rows[-1]['sort_key'], rows[-1]['id']) if has_more else None
+            }
+        
+        cursor.close()
+        
         print(f"Returning {len(keywords_data)} keywords successfully (новых: {new_changes_count})")
         return jsonify(result)
         
@@ -323,6 +569,97 @@ def get_keywords(ad_group_id):
         if connection:
             connection.close()
 
+@keywords_bp.route('/changes/<int:ad_group_id>', methods=['GET'])
+def get_keyword_changes(ad_group_id):
+    """
+    Delta-синхронизация таблицы ключевых слов
+    
+    Query параметры:
+    - since - sync_token из предыдущего ответа /list или /changes
+    - fields - как в /list
+    
+    Возвращает изменённые и добавленные строки (по updated_at), id удалённых
+    (мягко - status = 'Removed', и окончательно - по keyword_tombstones),
+    свежую статистику и новый sync_token. Токен отстаёт от текущего времени
+    на KEYWORD_SYNC_SAFETY_MARGIN, а граница сравнивается через >=, поэтому
+    строки за последние секунды придут повторно - клиент применяет изменения
+    идемпотентно (заменяет строку по id).
+    
+    Если since нет или он старше срока хранения следов, возвращается
+    reset: true и полный список - клиент заменяет таблицу целиком.
+    """
+    connection = None
+    try:
+        try:
+            fields = parse_keyword_fields(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        since = None
+        since_param = request.args.get('since')
+        if since_param:
+            try:
+                since = datetime.strptime(since_param, SYNC_TOKEN_FORMAT)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid since token'}), 400
+        
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        
+        sync_token = fetch_sync_token(cursor)
+        now = datetime.strptime(sync_token, SYNC_TOKEN_FORMAT)
+        
+        reset = since is None or since < now - timedelta(days=Config.KEYWORD_TOMBSTONE_RETENTION_DAYS)
+        
+        select_fields = fields if 'status' in fields else fields + ['status']
+        if reset:
+            cursor.execute(f"""
+                SELECT {', '.join(select_fields)}
+                FROM keywords 
+                WHERE ad_group_id = %s AND status != 'Removed'
+                ORDER BY id
+            """, (ad_group_id,))
+        else:
+            cursor.execute(f"""
+                SELECT {', '.join(select_fields)}
+                FROM keywords 
+                WHERE ad_group_id = %s AND updated_at >= %s
+                ORDER BY id
+            """, (ad_group_id, since))
+        rows = cursor.fetchall()
+        
+        changed = [format_keyword_row(row, fields) for row in rows if row['status'] != 'Removed']
+        removed = [row['id'] for row in rows if row['status'] == 'Removed']
+        
+        if not reset:
+            cursor.execute("""
+                SELECT DISTINCT keyword_id 
+                FROM keyword_tombstones 
+                WHERE ad_group_id = %s AND deleted_at >= %s
+            """, (ad_group_id, since))
+            removed.extend(row['keyword_id'] for row in cursor.fetchall())
+        
+        stats = fetch_keyword_stats(cursor, ad_group_id)
+        cursor.close()
+        
+        print(f"🔄 Changes for ad_group {ad_group_id} since {since_param}: changed={len(changed)}, removed={len(removed)}, reset={reset}")
+        
+        return jsonify({
+            'success': True,
+            'reset': reset,
+            'changed': changed,
+            'removed': removed,
+            'stats': stats,
+            'sync_token': sync_token
+        })
+        
+    except Exception as e:
+        print(f"Error in get_keyword_changes: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
 @keywords_bp.route('/bulk-action', methods=['POST'])
 def bulk_action():
     """Массовые действия над ключевыми словами"""
@@ -488,38 +825,21 @@ def paste_keywords():
         campaign_id = result['campaign_id']
         
         # ДОБАВЛЕНО: генерируем один цвет для всей партии
-        batch_color = get_random_batch_color()
+        batch_color = get_random_batch_color(cursor)
         
         added_count = 0
         skipped_count = 0
         
         if paste_type == 'keywords':
             # Простое копирование ключевых слов
-            for keyword_text in paste_data:
-                keyword_text = keyword_text.strip()
-                if not keyword_text:
-                    continue
-                    
-                cursor.execute(
-                    "SELECT id FROM keywords WHERE ad_group_id = %s AND keyword = %s",
-                    (ad_group_id, keyword_text)
-                )
-                if not cursor.fetchone():
-                    # ОБНОВЛЕНО: добавлено поле batch_color
-                    cursor.execute("""
-                        INSERT INTO keywords (
-                            campaign_id, ad_group_id, keyword, criterion_type, 
-                            status, max_cpc, is_new, batch_color
-                        ) VALUES (%s, %s, %s, 'Phrase', 'Enabled', 3.61, TRUE, %s)
-                    """, (campaign_id, ad_group_id, keyword_text, batch_color))
-                    added_count += 1
-                    print(f"Added keyword: {keyword_text}")
-                else:
-                    skipped_count += 1
-                    print(f"Skipped duplicate: {keyword_text}")
-                    
+            keywords = [k.strip() for k in paste_data if k.strip()]
+            added_count, skipped_count = insert_new_keywords(
+                cursor, campaign_id, ad_group_id, keywords, batch_color
+            )
+        
         elif paste_type == 'full_data':
             # Вставка полных данных
+            full_rows = []
             for data_string in paste_data:
                 try:
                     data_string = data_string.strip()
@@ -553,16 +873,6 @@ def paste_keywords():
                         print(f"Empty keyword, skipping")
                         continue
                     
-                    # Проверяем что такого ключевого слова нет
-                    cursor.execute(
-                        "SELECT id FROM keywords WHERE ad_group_id = %s AND keyword = %s",
-                        (ad_group_id, keyword_text)
-                    )
-                    if cursor.fetchone():
-                        print(f"Keyword already exists: {keyword_text}")
-                        skipped_count += 1
-                        continue
-                    
                     def convert_value(val):
                         if val == 'None' or val == '':
                             return None
@@ -583,17 +893,7 @@ def paste_keywords():
                     while len(all_fields) < 23:
                         all_fields.append('None')
                     
-                    # ОБНОВЛЕНО: добавлено поле batch_color
-                    cursor.execute("""
-                        INSERT INTO keywords (
-                            campaign_id, ad_group_id, keyword, criterion_type, max_cpc, max_cpm,
-                            status, comment, has_ads, has_school_sites, has_google_maps, has_our_site,
-                            intent_type, recommendation, avg_monthly_searches, three_month_change, 
-                            yearly_change, competition, competition_percent, min_top_of_page_bid, 
-                            max_top_of_page_bid, ad_impression_share, organic_average_position, 
-                            organic_impression_share, labels, is_new, batch_color
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
+                    full_rows.append((
                         campaign_id,
                         ad_group_id,
                         keyword_text,
@@ -622,15 +922,45 @@ def paste_keywords():
                         True,  # is_new = TRUE
                         batch_color  # ДОБАВЛЕНО: цвет партии
                     ))
-                    added_count += 1
-                    print(f"Added full data for keyword: {keyword_text}")
                     
                 except Exception as e:
                     print(f"Error parsing data: {str(e)}")
                     import traceback
                     traceback.print_exc()
                     continue
-        
+            
+            # Дубли пропускает уникальный индекс (ad_group_id, keyword)
+            insert_query = """
+                INSERT INTO keywords (
+                    campaign_id, ad_group_id, keyword, criterion_type, max_cpc, max_cpm,
+                    status, comment, has_ads, has_school_sites, has_google_maps, has_our_site,
+                    intent_type, recommendation, avg_monthly_searches, three_month_change, 
+                    yearly_change, competition, competition_percent, min_top_of_page_bid, 
+                    max_top_of_page_bid, ad_impression_share, organic_average_position, 
+                    organic_impression_share, labels, is_new, batch_color
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = id
+            """
+            if full_rows:
+                try:
+                    cursor.executemany(insert_query, full_rows)
+                    added_count = cursor.rowcount
+                except Exception as e:
+                    # executemany отправляет строки частями, и части до ошибки уже
+                    # записаны - откатываем их (других изменений в транзакции нет)
+                    # и пробуем по одной строке, чтобы некорректные данные одной
+                    # строки не блокировали остальные
+                    print(f"Batch insert failed, retrying row by row: {str(e)}")
+                    connection.rollback()
+                    added_count = 0
+                    for row in full_rows:
+                        try:
+                            cursor.execute(insert_query, row)
+                            added_count += cursor.rowcount
+                        except Exception as row_error:
+                            print(f"Error inserting keyword {row[2]}: {str(row_error)}")
+                skipped_count = len(full_rows) - added_count
+
         connection.commit()
         cursor.close()
         
@@ -680,29 +1010,11 @@ def add_keywords():
         keywords = [k.strip() for k in keywords_text.replace('\n', ',').split(',') if k.strip()]
         
         # ДОБАВЛЕНО: генерируем один цвет для всей партии
-        batch_color = get_random_batch_color()
-        
-        added_count = 0
-        skipped_count = 0
+        batch_color = get_random_batch_color(cursor)
         
-        for keyword in keywords:
-            # Проверяем существование
-            cursor.execute(
-                "SELECT id FROM keywords WHERE ad_group_id = %s AND keyword = %s",
-                (ad_group_id, keyword)
-            )
-            
-            if not cursor.fetchone():
-                # ОБНОВЛЕНО: добавлено поле batch_color
-                cursor.execute("""
-                    INSERT INTO keywords (
-                        campaign_id, ad_group_id, keyword, criterion_type, 
-                        status, max_cpc, is_new, batch_color
-                    ) VALUES (%s, %s, %s, 'Phrase', 'Enabled', 3.61, TRUE, %s)
-                """, (campaign_id, ad_group_id, keyword, batch_color))
-                added_count += 1
-            else:
-                skipped_count += 1
+        added_count, skipped_count = insert_new_keywords(
+            cursor, campaign_id, ad_group_id, keywords, batch_color
+        )
         
         connection.commit()
         cursor.close()
@@ -888,6 +1200,7 @@ def delete_permanently():
         
         # Удаляем ключевые слова навсегда
         placeholders = ','.join(['%s'] * len(keyword_ids))
+        record_keyword_tombstones(cursor, f"id IN ({placeholders}) AND status = 'Removed'", keyword_ids)
         cursor.execute(
             f"DELETE FROM keywords WHERE id IN ({placeholders}) AND status = 'Removed'",
             keyword_ids
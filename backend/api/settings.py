@@ -2,7 +2,7 @@
 from flask import Blueprint, request, jsonify
 from urllib.parse import urlparse
 from services.config_manager import config_manager
-from config import Config
+from services.db_pool import get_connection, get_last_reconfigure
 import pymysql
 import os
 import sys
@@ -42,40 +42,36 @@ def save_settings():
         data = request.json
         print(f"📝 Сохранение настроек: {list(data.keys())}")
         
-        # Загружаем существующие настройки
-        current_settings = config_manager.load_settings()
+        # Объединяем с текущими настройками и сохраняем (атомарно, кэш обновляется сразу)
+        changed = config_manager.update_settings(data)
+        if changed is None:
+            return jsonify({'success': False, 'error': 'Ошибка сохранения файла'}), 500
         
-        # Проверяем, изменились ли настройки БД
-        db_settings_changed = False
+        # Новые настройки БД применены подпиской db_pool на config_manager
+        # (новый пул подменяет старый без перезапуска процесса)
         db_keys = ['db_host', 'db_port', 'db_name', 'db_user', 'db_password']
-        
-        for key in db_keys:
-            if key in data and data[key] != current_settings.get(key):
-                db_settings_changed = True
-                print(f"🔄 Изменена настройка БД: {key}")
-                break
-        
-        # Обновляем настройки
-        current_settings.update(data)
-        
-        # Сохраняем
-        if config_manager.save_settings(current_settings):
-            if db_settings_changed:
-                print("⚠️ Настройки БД изменены - будет выполнен перезапуск")
-                return jsonify({
-                    'success': True,
-                    'message': 'Настройки сохранены.',
-                    'requires_restart': True,
-                    'restart_message': 'Настройки БД изменены. Требуется перезапуск приложения.\n\nВсе несохраненные изменения будут потеряны.\n\nПерезапустить сейчас?'
-                })
-            else:
+        if changed & set(db_keys):
+            print(f"🔄 Изменены настройки БД: {', '.join(sorted(changed & set(db_keys)))}")
+            result = get_last_reconfigure() or {}
+            if not result.get('success'):
                 return jsonify({
-                    'success': True,
-                    'message': 'Настройки сохранены успешно!',
+                    'success': False,
+                    'error': f"Настройки сохранены, но подключиться к новой БД не удалось: {result.get('error')}. "
+                             f"Приложение продолжает работать с прежней БД.",
                     'requires_restart': False
                 })
-        else:
-            return jsonify({'success': False, 'error': 'Ошибка сохранения файла'}), 500
+            return jsonify({
+                'success': True,
+                'message': f"Настройки сохранены. Подключение к БД {result.get('database')} применено без перезапуска.",
+                'requires_restart': False,
+                'db_reconfigured': True
+            })
+        
+        return jsonify({
+            'success': True,
+            'message': 'Настройки сохранены успешно!',
+            'requires_restart': False
+        })
             
     except Exception as e:
         print(f"❌ Ошибка сохранения настроек: {str(e)}")
@@ -235,14 +231,7 @@ def get_campaign_sites():
     """Получение списка кампаний и их сайтов"""
     connection = None
     try:
-        connection = pymysql.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME,
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        connection = get_connection()
         cursor = connection.cursor()
         
         # Получаем все кампании с их сайтами
@@ -289,13 +278,7 @@ def save_campaign_sites():
         data = request.json
         campaigns = data.get('campaigns', [])
         
-        connection = pymysql.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME
-        )
+        connection = get_connection()
         cursor = connection.cursor()
         
         for campaign in campaigns:
@@ -353,14 +336,7 @@ def get_campaign_site(campaign_id):
     """Получение сайта для конкретной кампании"""
     connection = None
     try:
-        connection = pymysql.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME,
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        connection = get_connection()
         cursor = connection.cursor()
         
         cursor.execute("""
@@ -390,14 +366,7 @@ def get_school_sites():
     """Получение списка сайтов школ-конкурентов"""
     connection = None
     try:
-        connection = pymysql.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME,
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        connection = get_connection()
         cursor = connection.cursor()
         
         cursor.execute("""
@@ -442,13 +411,7 @@ def save_school_site():
         if domain.startswith('www.'):
             domain = domain[4:]
         
-        connection = pymysql.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME
-        )
+        connection = get_connection()
         cursor = connection.cursor()
         
         if school_id:
@@ -488,13 +451,7 @@ def delete_school_site(school_id):
     """Удаление сайта школы"""
     connection = None
     try:
-        connection = pymysql.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME
-        )
+        connection = get_connection()
         cursor = connection.cursor()
         
         cursor.execute("DELETE FROM school_sites WHERE id = %s", (school_id,))
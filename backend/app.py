@@ -3,10 +3,12 @@ from flask import Flask, request, make_response, render_template
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
+from utils.logging_setup import setup_logging
 from sqlalchemy import text
 from datetime import datetime
 import pymysql
 import sys
+import os
 
 db = SQLAlchemy()
 
@@ -36,9 +38,31 @@ def check_and_create_database():
         print(f"❌ Database connection error: {e}")
         return False
 
+def create_sqlalchemy_connection():
+    """
+    Соединение Flask-SQLAlchemy с текущими параметрами БД из Config:
+    после смены настроек (services/db_pool.reconfigure) достаточно
+    закрыть соединения движка - новые откроются уже к новой БД
+    """
+    return pymysql.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME,
+        charset='utf8mb4',
+        connect_timeout=Config.DB_CONNECT_TIMEOUT
+    )
+
 def create_app():
+    setup_logging()
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'creator': create_sqlalchemy_connection,
+        'pool_recycle': Config.DB_POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
     
     # Initialize extensions with app
     db.init_app(app)
@@ -65,19 +89,35 @@ def create_app():
     # Import models BEFORE registering blueprints
     with app.app_context():
         # Импортируем модели
-        from models.keyword import Campaign, AdGroup, Keyword, AppSetting
-        from models.competitor import CompetitorSchool, SerpAnalysisHistory, SerpCompetitorAppearance, CampaignSite
+        from models.keyword import Campaign, AdGroup, Keyword, KeywordTombstone, AppSetting
+        from models.competitor import CompetitorSchool, SerpAnalysisHistory, SerpRawPayload, SerpDailyRollup, SerpMonthlyRollup, SerpCompetitorAppearance, CampaignSite, SerpPendingTask
+        from models.job import BackgroundJob, BackgroundJobEvent
     
     # Register blueprints
     from api.keywords import keywords_bp
     from api.dataforseo import dataforseo_bp
     from api.settings import settings_bp
     from api.competitors import competitors_bp
+    from api.jobs import jobs_bp
     
     app.register_blueprint(keywords_bp, url_prefix='/api/keywords')
     app.register_blueprint(dataforseo_bp, url_prefix='/api/dataforseo')
     app.register_blueprint(settings_bp, url_prefix='/api/settings')
     app.register_blueprint(competitors_bp, url_prefix='/api/competitors')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    
+    # Смена настроек БД без перезапуска: вслед за общим пулом (services/db_pool.py)
+    # закрываются соединения движка Flask-SQLAlchemy (health check, create_all).
+    # Движок остаётся тем же, новые соединения открывает create_sqlalchemy_connection
+    # с новыми параметрами (URL движка в логах SQLAlchemy при этом прежний)
+    from services.db_pool import on_reconfigure
+    
+    @on_reconfigure
+    def rebind_sqlalchemy_engine(params):
+        app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
     
     # Create tables within app context
     with app.app_context():
@@ -94,6 +134,14 @@ def create_app():
         except Exception as e:
             print(f"⚠️ Database initialization issue: {e}")
             
+    # Возобновляем сбор незавершённых batch SERP задач и запускаем исполнителей
+    # фоновых задач (в debug-режиме только в рабочем процессе reloader'а)
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from api.dataforseo import resume_serp_batches
+        from services.job_queue import start_embedded_workers
+        resume_serp_batches()
+        start_embedded_workers()
+            
     @app.before_request
     def handle_preflight():
         if request.method == "OPTIONS":
@@ -121,10 +169,17 @@ def create_app():
         except Exception as e:
             db_status = f"error: {str(e)[:50]}"
         
+        try:
+            from services.db_pool import get_pool_stats
+            pool_stats = get_pool_stats()
+        except Exception as e:
+            pool_stats = {'error': str(e)[:50]}
+        
         return {
             'status': 'ok',
             'database': db_status,
             'tables_count': tables_count,
+            'db_pool': pool_stats,
             'cors_origins': Config.CORS_ORIGINS
         }
     
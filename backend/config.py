@@ -2,6 +2,7 @@
 import os
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
+from services.config_manager import config_manager
 
 load_dotenv()
 
@@ -15,30 +16,11 @@ class Config:
     
     # Database - с переключателем источника настроек
     if USE_SAVED_SETTINGS:
-        # Пытаемся загрузить из файла настроек
+        # Пытаемся загрузить из файла настроек (расшифровывается один раз, см. services/config_manager.py)
         try:
-            import sys
-            import json
-            from pathlib import Path
-            from cryptography.fernet import Fernet
+            settings = config_manager.load_settings()
             
-            # Путь к файлам конфигурации
-            config_dir = Path(__file__).parent / 'config'
-            config_file = config_dir / 'app_config.enc'
-            key_file = config_dir / 'app.key'
-            
-            if config_file.exists() and key_file.exists():
-                # Читаем ключ шифрования
-                with open(key_file, 'rb') as f:
-                    key = f.read()
-                cipher = Fernet(key)
-                
-                # Читаем и расшифровываем настройки
-                with open(config_file, 'rb') as f:
-                    encrypted_data = f.read()
-                decrypted_data = cipher.decrypt(encrypted_data)
-                settings = json.loads(decrypted_data.decode())
-                
+            if settings:
                 # Используем сохраненные настройки БД
                 DB_HOST = settings.get('db_host', 'localhost')
                 DB_PORT = int(settings.get('db_port', 3306))
@@ -75,37 +57,27 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD_ENCODED}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    # DataForSeo API - полностью динамические настройки
+    @classmethod
+    def set_db_settings(cls, host: str, port: int, name: str, user: str, password: str):
+        """Новые параметры БД без перезапуска (см. services/db_pool.reconfigure)"""
+        cls.DB_HOST = host
+        cls.DB_PORT = port
+        cls.DB_NAME = name
+        cls.DB_USER = user
+        cls.DB_PASSWORD = password
+        cls.DB_PASSWORD_ENCODED = quote_plus(password) if password else ''
+        cls.SQLALCHEMY_DATABASE_URI = (
+            f'mysql+pymysql://{user}:{cls.DB_PASSWORD_ENCODED}@{host}:{port}/{name}?charset=utf8mb4'
+        )
+    
+    # DataForSeo API - полностью динамические настройки (кэш config_manager,
+    # файл перечитывается только при изменении)
     @property
     def DATAFORSEO_LOGIN(self):
         if USE_SAVED_SETTINGS:
-            try:
-                import json
-                from pathlib import Path
-                from cryptography.fernet import Fernet
-                
-                # Путь к файлам конфигурации
-                config_dir = Path(__file__).parent / 'config'
-                config_file = config_dir / 'app_config.enc'
-                key_file = config_dir / 'app.key'
-                
-                if config_file.exists() and key_file.exists():
-                    # Читаем ключ шифрования
-                    with open(key_file, 'rb') as f:
-                        key = f.read()
-                    cipher = Fernet(key)
-                    
-                    # Читаем и расшифровываем настройки
-                    with open(config_file, 'rb') as f:
-                        encrypted_data = f.read()
-                    decrypted_data = cipher.decrypt(encrypted_data)
-                    settings = json.loads(decrypted_data.decode())
-                    
-                    login = settings.get('dataforseo_login')
-                    if login:
-                        return login
-            except Exception as e:
-                print(f"⚠️ Ошибка загрузки DataForSeo login: {e}")
+            login = config_manager.get_str('dataforseo_login')
+            if login:
+                return login
         
         # Fallback - из переменных окружения
         return os.environ.get('DATAFORSEO_LOGIN', '')
@@ -113,37 +85,91 @@ class Config:
     @property
     def DATAFORSEO_PASSWORD(self):
         if USE_SAVED_SETTINGS:
-            try:
-                import json
-                from pathlib import Path
-                from cryptography.fernet import Fernet
-                
-                # Путь к файлам конфигурации
-                config_dir = Path(__file__).parent / 'config'
-                config_file = config_dir / 'app_config.enc'
-                key_file = config_dir / 'app.key'
-                
-                if config_file.exists() and key_file.exists():
-                    # Читаем ключ шифрования
-                    with open(key_file, 'rb') as f:
-                        key = f.read()
-                    cipher = Fernet(key)
-                    
-                    # Читаем и расшифровываем настройки
-                    with open(config_file, 'rb') as f:
-                        encrypted_data = f.read()
-                    decrypted_data = cipher.decrypt(encrypted_data)
-                    settings = json.loads(decrypted_data.decode())
-                    
-                    password = settings.get('dataforseo_password')
-                    if password:
-                        return password
-            except Exception as e:
-                print(f"⚠️ Ошибка загрузки DataForSeo password: {e}")
+            password = config_manager.get_str('dataforseo_password')
+            if password:
+                return password
         
         # Fallback - из переменных окружения
         return os.environ.get('DATAFORSEO_PASSWORD', '')
     
+    # DataForSeo HTTP - пул keep-alive соединений и таймауты (сек)
+    DATAFORSEO_POOL_SIZE = int(os.environ.get('DATAFORSEO_POOL_SIZE', 20))
+    DATAFORSEO_CONNECT_TIMEOUT = float(os.environ.get('DATAFORSEO_CONNECT_TIMEOUT', 10))
+    DATAFORSEO_READ_TIMEOUT = float(os.environ.get('DATAFORSEO_READ_TIMEOUT', 120))
+    # Лимит запросов в секунду на один аккаунт DataForSeo (API допускает 2000/мин)
+    DATAFORSEO_RATE_LIMIT = float(os.environ.get('DATAFORSEO_RATE_LIMIT', 30))
+    
+    # SERP анализ - количество параллельных запросов к live endpoint
+    SERP_CONCURRENCY = int(os.environ.get('SERP_CONCURRENCY', 5))
+    SERP_MAX_CONCURRENCY = int(os.environ.get('SERP_MAX_CONCURRENCY', 30))
+    
+    # SERP анализ через стандартную очередь (task_post) - интервал опроса и
+    # сколько ждать готовности в рамках одного запуска (сек)
+    SERP_BATCH_POLL_INTERVAL = float(os.environ.get('SERP_BATCH_POLL_INTERVAL', 10))
+    SERP_BATCH_MAX_WAIT = float(os.environ.get('SERP_BATCH_MAX_WAIT', 3 * 3600))
+    
+    # Как часто SERP-задача сверяет набор школ-конкурентов с БД (сек)
+    SERP_CONTEXT_RECHECK_INTERVAL = float(os.environ.get('SERP_CONTEXT_RECHECK_INTERVAL', 30))
+    
+    # Общий пул соединений MySQL (services/db_pool.py)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))
+    # Сколько ждать свободное соединение, прежде чем вернуть ошибку (сек)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    # Пересоздавать соединения старше (сек) - меньше MySQL wait_timeout
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 10))
+    # Сколько ждать возврата соединений в старый пул после смены настроек БД (сек)
+    DB_POOL_DRAIN_TIMEOUT = float(os.environ.get('DB_POOL_DRAIN_TIMEOUT', 300))
+    
+    # Время жизни кэша дерева кампаний для сайдбара (сек)
+    CAMPAIGNS_CACHE_TTL = float(os.environ.get('CAMPAIGNS_CACHE_TTL', 5))
+    
+    # Справочники языков и локаций (models/references.py): время жизни кэша
+    # в процессе и max-age для браузера (сек)
+    REFERENCES_CACHE_TTL = float(os.environ.get('REFERENCES_CACHE_TTL', 3600))
+    REFERENCES_HTTP_MAX_AGE = int(os.environ.get('REFERENCES_HTTP_MAX_AGE', 3600))
+    
+    # Сколько дней хранить следы удалённых ключевых слов для /keywords/changes
+    KEYWORD_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('KEYWORD_TOMBSTONE_RETENTION_DAYS', 30))
+    # Запас sync_token (сек): больше самой долгой пишущей транзакции по keywords
+    KEYWORD_SYNC_SAFETY_MARGIN = int(os.environ.get('KEYWORD_SYNC_SAFETY_MARGIN', 120))
+
+    # Хранение истории SERP (scripts/serp_retention.py)
+    # Через SERP_PAYLOAD_RETENTION_DAYS у анализов удаляются raw_response / parsed_items
+    # (остаётся analysis_result), через SERP_HISTORY_RETENTION_DAYS - сами записи (итоги в rollup-таблицах)
+    SERP_PAYLOAD_RETENTION_DAYS = int(os.environ.get('SERP_PAYLOAD_RETENTION_DAYS', 90))
+    SERP_HISTORY_RETENTION_DAYS = int(os.environ.get('SERP_HISTORY_RETENTION_DAYS', 365))
+    SERP_RETENTION_BATCH_SIZE = int(os.environ.get('SERP_RETENTION_BATCH_SIZE', 1000))
+
+    # Очередь фоновых задач (services/job_queue.py)
+    # Исполнители в потоках Flask-процесса (0 - только отдельный scripts/job_worker.py)
+    JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+    # Как часто исполнитель отмечается в задаче и через сколько без отметки она считается брошенной (сек)
+    JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 5))
+    JOB_STALE_TIMEOUT = int(os.environ.get('JOB_STALE_TIMEOUT', 60))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 30))
+    
+    # SSE прогресса задач: комментарий-heartbeat для прокси и как часто сверять
+    # состояние с background_jobs (задачи, выполняемые другим процессом) (сек)
+    SSE_HEARTBEAT_INTERVAL = float(os.environ.get('SSE_HEARTBEAT_INTERVAL', 15))
+    SSE_DB_SYNC_INTERVAL = float(os.environ.get('SSE_DB_SYNC_INTERVAL', 2))
+    
+    # Хранилище событий прогресса (services/progress_store.py):
+    # memory - в памяти процесса, mysql - общее для нескольких воркеров gunicorn
+    PROGRESS_STORE = os.environ.get('PROGRESS_STORE', 'memory')
+    # Сколько хранить события завершённой задачи (сек) и как часто mysql-хранилище опрашивается
+    PROGRESS_EVENT_TTL = float(os.environ.get('PROGRESS_EVENT_TTL', 600))
+    PROGRESS_POLL_INTERVAL = float(os.environ.get('PROGRESS_POLL_INTERVAL', 0.5))
+    
+    # Логирование (utils/logging_setup.py): уровень, формат 'text' / 'json'
+    # и подробная трассировка разбора SERP для всех задач (обычно - флаг trace у задачи)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    SERP_TRACE = os.environ.get('SERP_TRACE', 'False').lower() == 'true'
+    
     # Encryption key for sensitive data
     ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY') or 'generate-strong-key-for-production'
     
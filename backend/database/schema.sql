@@ -77,7 +77,9 @@ CREATE TABLE keywords (
     FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE,
     FOREIGN KEY (ad_group_id) REFERENCES ad_groups(id) ON DELETE CASCADE,
     INDEX idx_keyword (keyword),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    UNIQUE KEY uq_keywords_ad_group_keyword (ad_group_id, keyword),
+    INDEX idx_keywords_ad_group_updated (ad_group_id, updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Таблица настроек приложения
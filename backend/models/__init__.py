@@ -1,15 +1,23 @@
 # models/__init__.py
-from .keyword import Campaign, AdGroup, Keyword, AppSetting
-from .competitor import CompetitorSchool, SerpAnalysisHistory, SerpCompetitorAppearance, CampaignSite
+from .keyword import Campaign, AdGroup, Keyword, KeywordTombstone, AppSetting
+from .competitor import CompetitorSchool, SerpAnalysisHistory, SerpRawPayload, SerpDailyRollup, SerpMonthlyRollup, SerpCompetitorAppearance, CampaignSite, SerpPendingTask
+from .job import BackgroundJob, BackgroundJobEvent
 
 __all__ = [
     'Campaign',
     'AdGroup', 
     'Keyword',
+    'KeywordTombstone',
     'AppSetting',
     'CompetitorSchool',
     'SerpAnalysisHistory',
+    'SerpRawPayload',
+    'SerpDailyRollup',
+    'SerpMonthlyRollup',
     'SerpCompetitorAppearance',
     'CampaignSite',
+    'SerpPendingTask',
+    'BackgroundJob',
+    'BackgroundJobEvent',
     'ReferencesModel'
 ]
\ No newline at end of file
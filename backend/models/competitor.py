@@ -19,6 +19,11 @@ class CompetitorSchool(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('idx_competitor_competitiveness', 'competitiveness'),
+        db.Index('idx_competitor_org_type', 'org_type', 'is_new'),
+    )
+    
     def to_dict(self):
         """Преобразование в словарь для JSON"""
         return {
@@ -53,9 +58,14 @@ class SerpAnalysisHistory(db.Model):
     maps_count = db.Column(db.Integer, default=0)
     school_percentage = db.Column(db.Numeric(5, 2), default=0)
     cost = db.Column(db.Numeric(10, 4), default=0)
-    parsed_items = db.Column(db.JSON, comment='JSON с детальными данными')
+    parsed_items = db.Column(db.JSON, comment='JSON с детальными данными (старые записи)')
+    parsed_items_hash = db.Column(db.String(64), comment='parsed_items в serp_raw_payloads')
     analysis_result = db.Column(db.JSON, comment='JSON с результатами анализа')
     
+    __table_args__ = (
+        db.Index('idx_serp_analysis_history_parsed_items_hash', 'parsed_items_hash'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -74,10 +84,106 @@ class SerpAnalysisHistory(db.Model):
             'school_percentage': float(self.school_percentage) if self.school_percentage else 0,
             'cost': float(self.cost) if self.cost else 0,
             'parsed_items': self.parsed_items,
+            'parsed_items_hash': self.parsed_items_hash,
             'analysis_result': self.analysis_result
         }
 
 
+class SerpRawPayload(db.Model):
+    """Сжатые сырые данные SERP (raw_response, parsed_items), ключ - SHA-256 содержимого"""
+    __tablename__ = 'serp_raw_payloads'
+    
+    hash = db.Column(db.String(64), primary_key=True)
+    size_raw = db.Column(db.Integer, default=0, comment='Размер до сжатия, байт')
+    size_compressed = db.Column(db.Integer, default=0, comment='Размер после сжатия, байт')
+    data = db.Column(db.LargeBinary(length=2 ** 32 - 1), nullable=False, comment='Формат MySQL COMPRESS()')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'hash': self.hash,
+            'size_raw': self.size_raw,
+            'size_compressed': self.size_compressed,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class SerpDailyRollup(db.Model):
+    """Дневные итоги SERP-анализов по ключевому слову (остаются после очистки истории)"""
+    __tablename__ = 'serp_rollups_daily'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    keyword_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    analyses = db.Column(db.Integer, default=0, comment='Количество анализов за день')
+    intent_type = db.Column(db.String(50), comment='Интент последнего анализа')
+    commercial_count = db.Column(db.Integer, default=0)
+    has_ads_count = db.Column(db.Integer, default=0)
+    has_maps_count = db.Column(db.Integer, default=0)
+    avg_school_percentage = db.Column(db.Numeric(5, 2), default=0)
+    avg_organic_position = db.Column(db.Numeric(6, 2), nullable=True)
+    best_organic_position = db.Column(db.Integer, nullable=True)
+    cost = db.Column(db.Numeric(10, 4), default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('keyword_id', 'day', name='uq_serp_rollups_daily'),
+        db.Index('idx_serp_rollups_daily_day', 'day'),
+    )
+    
+    def to_dict(self):
+        return {
+            'keyword_id': self.keyword_id,
+            'day': self.day.isoformat() if self.day else None,
+            'analyses': self.analyses,
+            'intent_type': self.intent_type,
+            'commercial_count': self.commercial_count,
+            'has_ads_count': self.has_ads_count,
+            'has_maps_count': self.has_maps_count,
+            'avg_school_percentage': float(self.avg_school_percentage) if self.avg_school_percentage else 0,
+            'avg_organic_position': float(self.avg_organic_position) if self.avg_organic_position else None,
+            'best_organic_position': self.best_organic_position,
+            'cost': float(self.cost) if self.cost else 0
+        }
+
+
+class SerpMonthlyRollup(db.Model):
+    """Месячные итоги SERP-анализов по ключевому слову (собираются из дневных)"""
+    __tablename__ = 'serp_rollups_monthly'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    keyword_id = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Date, nullable=False, comment='Первое число месяца')
+    analyses = db.Column(db.Integer, default=0)
+    intent_type = db.Column(db.String(50), comment='Интент последнего анализа')
+    commercial_count = db.Column(db.Integer, default=0)
+    has_ads_count = db.Column(db.Integer, default=0)
+    has_maps_count = db.Column(db.Integer, default=0)
+    avg_school_percentage = db.Column(db.Numeric(5, 2), default=0)
+    avg_organic_position = db.Column(db.Numeric(6, 2), nullable=True)
+    best_organic_position = db.Column(db.Integer, nullable=True)
+    cost = db.Column(db.Numeric(10, 4), default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('keyword_id', 'month', name='uq_serp_rollups_monthly'),
+        db.Index('idx_serp_rollups_monthly_month', 'month'),
+    )
+    
+    def to_dict(self):
+        return {
+            'keyword_id': self.keyword_id,
+            'month': self.month.isoformat() if self.month else None,
+            'analyses': self.analyses,
+            'intent_type': self.intent_type,
+            'commercial_count': self.commercial_count,
+            'has_ads_count': self.has_ads_count,
+            'has_maps_count': self.has_maps_count,
+            'avg_school_percentage': float(self.avg_school_percentage) if self.avg_school_percentage else 0,
+            'avg_organic_position': float(self.avg_organic_position) if self.avg_organic_position else None,
+            'best_organic_position': self.best_organic_position,
+            'cost': float(self.cost) if self.cost else 0
+        }
+
+
 class SerpCompetitorAppearance(db.Model):
     """Появления конкурентов в SERP-анализах"""
     __tablename__ = 'serp_competitor_appearances'
@@ -123,4 +229,37 @@ class CampaignSite(db.Model):
             'domain': self.domain,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+class SerpPendingTask(db.Model):
+    """Задачи SERP, отправленные через task_post (стандартная очередь DataForSeo)"""
+    __tablename__ = 'serp_pending_tasks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(64), unique=True, nullable=False, comment='ID задачи DataForSeo')
+    job_id = db.Column(db.String(64), nullable=False, index=True, comment='ID задачи прогресса (task_id из apply-serp)')
+    keyword_id = db.Column(db.Integer, nullable=False)
+    keyword_text = db.Column(db.String(500), nullable=False)
+    campaign_id = db.Column(db.Integer, nullable=False)
+    serp_params = db.Column(db.JSON, comment='Параметры SERP запроса')
+    cost = db.Column(db.Numeric(10, 4), default=0)
+    status = db.Column(db.Enum('pending', 'done', 'error', 'cancelled'), default='pending', index=True)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'job_id': self.job_id,
+            'keyword_id': self.keyword_id,
+            'keyword_text': self.keyword_text,
+            'campaign_id': self.campaign_id,
+            'serp_params': self.serp_params,
+            'cost': float(self.cost) if self.cost else 0,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
@@ -0,0 +1,74 @@
+# backend/models/job.py
+from app import db
+from datetime import datetime
+
+
+class BackgroundJob(db.Model):
+    """Фоновая задача (SERP анализ, сбор ключевых слов) - см. services/job_queue.py"""
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.String(64), primary_key=True, comment='task_id, по нему работает SSE прогресса')
+    job_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(
+        db.Enum('queued', 'running', 'complete', 'error', 'cancelled'),
+        default='queued',
+        nullable=False
+    )
+    priority = db.Column(db.Integer, default=0, nullable=False, comment='Больше - раньше')
+    payload = db.Column(db.JSON, comment='Параметры задачи')
+    checkpoint = db.Column(db.JSON, comment='Состояние для продолжения после сбоя')
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    progress_current = db.Column(db.Integer, default=0)
+    progress_total = db.Column(db.Integer, default=0)
+    progress_keyword = db.Column(db.String(500), default='')
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    worker_id = db.Column(db.String(100), nullable=True, comment='host:pid:thread исполнителя')
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_background_jobs_claim', 'status', 'priority', 'created_at'),
+        db.Index('idx_background_jobs_heartbeat', 'status', 'heartbeat_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'priority': self.priority,
+            'progress': {
+                'current': self.progress_current,
+                'total': self.progress_total,
+                'keyword': self.progress_keyword
+            },
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'cancel_requested': self.cancel_requested,
+            'worker_id': self.worker_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class BackgroundJobEvent(db.Model):
+    """Событие прогресса задачи для SSE (PROGRESS_STORE=mysql, см. services/progress_store.py)"""
+    __tablename__ = 'background_job_events'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, comment='id события SSE (Last-Event-ID)')
+    job_id = db.Column(db.String(64), nullable=False)
+    event = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_background_job_events_job', 'job_id', 'id'),
+        db.Index('idx_background_job_events_created', 'created_at'),
+    )
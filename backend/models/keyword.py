@@ -28,6 +28,10 @@ class AdGroup(db.Model):
 
 class Keyword(db.Model):
     __tablename__ = 'keywords'
+    __table_args__ = (
+        db.UniqueConstraint('ad_group_id', 'keyword', name='uq_keywords_ad_group_keyword'),
+        db.Index('idx_keywords_ad_group_updated', 'ad_group_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
@@ -137,6 +141,19 @@ class Keyword(db.Model):
             return {k: all_fields[k] for k in fields if k in all_fields}
         return all_fields
 
+class KeywordTombstone(db.Model):
+    """Следы окончательно удалённых ключевых слов для delta-синхронизации (/changes)"""
+    __tablename__ = 'keyword_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    keyword_id = db.Column(db.Integer, nullable=False)
+    ad_group_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    __table_args__ = (
+        db.Index('idx_tombstones_ad_group_deleted', 'ad_group_id', 'deleted_at'),
+    )
+
 class AppSetting(db.Model):
     __tablename__ = 'app_settings'
     
@@ -1,106 +1,148 @@
 # backend/models/references.py
-import pymysql.cursors
+"""
+Справочники языков и локаций DataForSeo
+
+Таблицы languages и locations меняются очень редко, поэтому читаются
+целиком один раз и хранятся в памяти процесса (REFERENCES_CACHE_TTL сек).
+Сразу строятся индексы по language_code, location_code и country_iso_code:
+поиск по коду - обращение к словарю, без запроса к БД.
+
+После ручного изменения таблиц - ReferencesModel.invalidate_cache()
+(или POST /api/dataforseo/references/refresh).
+"""
+import hashlib
+import json
+import threading
 from config import Config
+from services.db_pool import get_connection
+from utils.ttl_cache import TTLCache
+
+DISPLAY_FLAG = 'L'
+
+_references_cache = TTLCache(Config.REFERENCES_CACHE_TTL)
+_load_lock = threading.Lock()
+
+
+class _ReferencesSnapshot:
+    """Загруженные справочники и индексы по ним (только для чтения)"""
+
+    def __init__(self, languages: list, locations: list):
+        # Строки в порядке ORDER BY name из БД; display_flag хранится отдельно,
+        # чтобы строки совпадали с прежними ответами API
+        self.languages = [row for row, _ in languages]
+        self.languages_display = [row for row, flag in languages if flag == DISPLAY_FLAG]
+        # Ключи в одном регистре - как сравнение строк в MySQL (utf8mb4_unicode_ci)
+        self.language_by_code = {str(row['language_code']).lower(): row for row in self.languages}
+
+        self.locations = [row for row, _ in locations]
+        self.locations_display = [row for row, flag in locations if flag == DISPLAY_FLAG]
+        self.location_by_code = {row['location_code']: row for row in self.locations}
+
+        self.locations_by_country = {}
+        self.locations_display_by_country = {}
+        for row, flag in locations:
+            country = (row['country_iso_code'] or '').upper()
+            self.locations_by_country.setdefault(country, []).append(row)
+            if flag == DISPLAY_FLAG:
+                self.locations_display_by_country.setdefault(country, []).append(row)
+
+        # Версия данных - для ETag ответов API
+        digest = hashlib.sha1()
+        for rows in (languages, locations):
+            digest.update(json.dumps(rows, ensure_ascii=False, default=str).encode())
+        self.version = digest.hexdigest()[:16]
 
 
 class ReferencesModel:
     """Модель для работы с языками и локациями"""
-    
+
     @staticmethod
     def get_connection():
-        """Создание подключения к БД"""
-        return pymysql.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME,
-            cursorclass=pymysql.cursors.DictCursor
-        )
-    
+        """Соединение из общего пула"""
+        return get_connection()
+
+    @staticmethod
+    def _load() -> _ReferencesSnapshot:
+        """Читает оба справочника из БД"""
+        connection = ReferencesModel.get_connection()
+        try:
+            cursor = connection.cursor()
+
+            cursor.execute("""
+                SELECT id, language_name, language_code, display_flag
+                FROM languages
+                ORDER BY language_name
+            """)
+            languages = [(row, row.pop('display_flag')) for row in cursor.fetchall()]
+
+            cursor.execute("""
+                SELECT id, location_code, location_name,
+                       location_code_parent, country_iso_code, location_type, display_flag
+                FROM locations
+                ORDER BY location_name
+            """)
+            locations = [(row, row.pop('display_flag')) for row in cursor.fetchall()]
+
+            cursor.close()
+        finally:
+            connection.close()
+
+        print(f"📚 Справочники загружены: {len(languages)} языков, {len(locations)} локаций")
+        return _ReferencesSnapshot(languages, locations)
+
+    @staticmethod
+    def _snapshot() -> _ReferencesSnapshot:
+        """Справочники из кэша; при промахе - одна загрузка на все потоки"""
+        snapshot = _references_cache.get('references')
+        if snapshot is not None:
+            return snapshot
+
+        with _load_lock:
+            snapshot = _references_cache.get('references')
+            if snapshot is None:
+                snapshot = ReferencesModel._load()
+                _references_cache.set('references', snapshot)
+        return snapshot
+
+    @staticmethod
+    def invalidate_cache():
+        """Сброс кэша - следующий запрос перечитает таблицы"""
+        _references_cache.invalidate()
+
+    @staticmethod
+    def get_version() -> str:
+        """Версия загруженных справочников (меняется вместе с данными)"""
+        return ReferencesModel._snapshot().version
+
     @staticmethod
     def get_languages(display_only=True):
         """Получение списка языков"""
-        connection = ReferencesModel.get_connection()
-        cursor = connection.cursor()
-        
-        query = "SELECT id, language_name, language_code FROM languages"
-        if display_only:
-            query += " WHERE display_flag = 'L'"
-        query += " ORDER BY language_name"
-        
-        cursor.execute(query)
-        languages = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
-        
-        return languages
-    
+        snapshot = ReferencesModel._snapshot()
+        return list(snapshot.languages_display if display_only else snapshot.languages)
+
     @staticmethod
     def get_locations(display_only=True, country_iso_code=None):
         """Получение списка локаций"""
-        connection = ReferencesModel.get_connection()
-        cursor = connection.cursor()
-        
-        query = """
-            SELECT id, location_code, location_name, 
-                   location_code_parent, country_iso_code, location_type 
-            FROM locations
-        """
-        conditions = []
-        params = []
-        
-        if display_only:
-            conditions.append("display_flag = 'L'")
-        
+        snapshot = ReferencesModel._snapshot()
+
         if country_iso_code:
-            conditions.append("country_iso_code = %s")
-            params.append(country_iso_code)
-        
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY location_name"
-        
-        cursor.execute(query, params)
-        locations = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
-        
-        return locations
-    
+            index = snapshot.locations_display_by_country if display_only else snapshot.locations_by_country
+            return list(index.get(country_iso_code.upper(), []))
+
+        return list(snapshot.locations_display if display_only else snapshot.locations)
+
     @staticmethod
     def get_language_by_code(language_code):
         """Получение языка по коду"""
-        connection = ReferencesModel.get_connection()
-        cursor = connection.cursor()
-        
-        cursor.execute(
-            "SELECT * FROM languages WHERE language_code = %s",
-            (language_code,)
-        )
-        language = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-        
-        return language
-    
+        if not language_code:
+            return None
+        return ReferencesModel._snapshot().language_by_code.get(str(language_code).lower())
+
     @staticmethod
     def get_location_by_code(location_code):
         """Получение локации по коду"""
-        connection = ReferencesModel.get_connection()
-        cursor = connection.cursor()
-        
-        cursor.execute(
-            "SELECT * FROM locations WHERE location_code = %s",
-            (location_code,)
-        )
-        location = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-        
-        return location
\ No newline at end of file
+        try:
+            location_code = int(location_code)
+        except (TypeError, ValueError):
+            return None
+        return ReferencesModel._snapshot().location_by_code.get(location_code)
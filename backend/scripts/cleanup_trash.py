@@ -12,6 +12,9 @@ from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import Config
+from utils.keyword_tombstones import record_keyword_tombstones, prune_keyword_tombstones
+from services.progress_store import prune_progress_events
+from services.job_queue import prune_finished_jobs
 import pymysql
 
 AUTO_DELETE_DAYS = 30
@@ -32,6 +35,23 @@ def cleanup_old_trash():
         
         cursor = connection.cursor()
         
+        # Старые следы удалений больше не нужны delta-синхронизации
+        pruned = prune_keyword_tombstones(cursor, Config.KEYWORD_TOMBSTONE_RETENTION_DAYS)
+        connection.commit()
+        if pruned:
+            print(f"🧹 Pruned {pruned} keyword tombstones")
+        
+        # Завершённые фоновые задачи
+        pruned_jobs = prune_finished_jobs(Config.JOB_RETENTION_DAYS)
+        if pruned_jobs:
+            print(f"🧹 Pruned {pruned_jobs} finished background jobs")
+        
+        # События прогресса нужны только SSE, пока задача выполняется
+        pruned_events = prune_progress_events(cursor, 24)
+        connection.commit()
+        if pruned_events:
+            print(f"🧹 Pruned {pruned_events} progress events")
+        
         # ✅ ДОБАВЛЕНО: Проверяем настройку автоудаления
         cursor.execute("""
             SELECT setting_value FROM app_settings 
@@ -75,6 +95,7 @@ def cleanup_old_trash():
         keyword_ids = [kw['id'] for kw in keywords_to_delete]
         placeholders = ','.join(['%s'] * len(keyword_ids))
         
+        record_keyword_tombstones(cursor, f"id IN ({placeholders}) AND status = 'Removed'", keyword_ids)
         cursor.execute(
             f"DELETE FROM keywords WHERE id IN ({placeholders}) AND status = 'Removed'",
             keyword_ids
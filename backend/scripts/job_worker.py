@@ -0,0 +1,84 @@
+# backend/scripts/job_worker.py
+"""
+Отдельный процесс-исполнитель фоновых задач (services/job_queue.py)
+
+Берёт задачи из background_jobs вместе с исполнителями Flask-процесса или
+вместо них (JOB_WORKER_THREADS=0). Можно запускать несколько экземпляров
+на разных серверах - задачи распределяются через SELECT ... FOR UPDATE SKIP LOCKED.
+По SIGTERM / Ctrl+C текущие задачи возвращаются в очередь и продолжатся с checkpoint.
+
+Запуск:
+    python3 scripts/job_worker.py                       # JOB_WORKER_THREADS потоков, все типы задач
+    python3 scripts/job_worker.py --threads 4
+    python3 scripts/job_worker.py --types serp_analysis
+"""
+
+import sys
+import os
+import argparse
+import signal
+import threading
+
+# Добавляем путь к проекту
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.logging_setup import setup_logging
+from services.job_queue import JobWorker, release_process_jobs, requeue_stale_jobs
+
+# Импорт только ради побочного эффекта: модуль регистрирует обработчики
+# задач (@job_handler), без него исполнителю нечего выполнять
+import api.dataforseo  # noqa: F401 - регистрирует обработчики задач
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Исполнитель фоновых задач')
+    parser.add_argument('--threads', type=int, default=max(Config.JOB_WORKER_THREADS, 1),
+                        help='Количество потоков-исполнителей')
+    parser.add_argument('--types', nargs='*', default=None,
+                        help='Типы задач (по умолчанию все зарегистрированные)')
+    return parser.parse_args()
+
+
+def run_workers(threads: int, job_types=None):
+    requeue_stale_jobs()
+
+    workers = [JobWorker(name=f"worker-{index}", job_types=job_types) for index in range(threads)]
+    worker_threads = [
+        threading.Thread(target=worker.run, name=f"job-worker-{index}", daemon=True)
+        for index, worker in enumerate(workers)
+    ]
+
+    stop_event = threading.Event()
+
+    def handle_stop(signum, frame):
+        print(f"\n⏹️ Получен сигнал {signum}, останавливаем исполнителей...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    for thread in worker_threads:
+        thread.start()
+    print(f"👷 Запущено исполнителей: {threads}, типы задач: {', '.join(job_types) if job_types else 'все'}")
+
+    while not stop_event.wait(1):
+        pass
+
+    # Выполняющиеся задачи не ждём: возвращаем их в очередь, их продолжит
+    # другой исполнитель с последнего checkpoint
+    for worker in workers:
+        worker.stop()
+    released = release_process_jobs()
+    print(f"👷 Исполнители остановлены, возвращено задач в очередь: {released}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    setup_logging()
+    try:
+        run_workers(args.threads, args.types)
+        sys.exit(0)
+    except Exception as e:
+        print(f"❌ Job worker failed: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,345 @@
+# backend/scripts/migrate_db.py
+"""
+Миграции схемы существующих таблиц
+db.create_all() создаёт только недостающие таблицы, поэтому новые индексы
+и колонки в уже созданных таблицах добавляются здесь.
+Каждый шаг проверяет INFORMATION_SCHEMA и безопасен при повторном запуске.
+
+Запуск: python3 scripts/migrate_db.py
+"""
+
+import sys
+import os
+
+# Добавляем путь к проекту
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.serp_competitors_helper import update_competitors_competitiveness
+from services.payload_store import store_payload
+import pymysql
+
+
+def index_exists(cursor, table, index_name):
+    """Проверка наличия индекса"""
+    cursor.execute("""
+        SELECT COUNT(*) as cnt
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+        AND INDEX_NAME = %s
+    """, (Config.DB_NAME, table, index_name))
+    return cursor.fetchone()['cnt'] > 0
+
+
+def add_index(cursor, table, index_name, columns, unique=False):
+    """Добавление индекса, если его ещё нет"""
+    if index_exists(cursor, table, index_name):
+        print(f"   ✅ {table}.{index_name} уже существует")
+        return False
+
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    print(f"   ➕ {table}: {kind} {index_name} ({columns})...")
+    cursor.execute(f"ALTER TABLE {table} ADD {kind} {index_name} ({columns})")
+    print(f"   ✅ {table}.{index_name} добавлен")
+    return True
+
+
+def migrate_competitors_indexes(cursor):
+    """Индексы для списка конкурентов (сортировка и фильтры)"""
+    add_index(cursor, 'competitor_schools', 'idx_competitor_competitiveness', 'competitiveness')
+    add_index(cursor, 'competitor_schools', 'idx_competitor_org_type', 'org_type, is_new')
+
+
+def table_exists(cursor, table):
+    """Проверка наличия таблицы"""
+    cursor.execute("""
+        SELECT COUNT(*) as cnt
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+    """, (Config.DB_NAME, table))
+    return cursor.fetchone()['cnt'] > 0
+
+
+# Таблицы, ссылающиеся на keywords.id
+KEYWORD_REFERENCES = ('serp_analysis_history', 'serp_logs', 'serp_pending_tasks')
+
+
+def migrate_keywords_unique(cursor):
+    """
+    Уникальность (ad_group_id, keyword)
+    Дубли сводятся к одной записи: остаётся активная (не Removed) с минимальным id,
+    ссылки истории SERP переносятся на неё, остальные записи удаляются.
+    """
+    if index_exists(cursor, 'keywords', 'uq_keywords_ad_group_keyword'):
+        print("   ✅ keywords.uq_keywords_ad_group_keyword уже существует")
+        return
+
+    cursor.execute("SET SESSION group_concat_max_len = 1000000")
+    cursor.execute("""
+        SELECT 
+            ad_group_id,
+            keyword,
+            COALESCE(MIN(CASE WHEN status != 'Removed' THEN id END), MIN(id)) as survivor_id,
+            GROUP_CONCAT(id ORDER BY id) as ids
+        FROM keywords
+        GROUP BY ad_group_id, keyword
+        HAVING COUNT(*) > 1
+    """)
+    groups = cursor.fetchall()
+    print(f"   📊 Групп дублей: {len(groups)}")
+
+    references = [table for table in KEYWORD_REFERENCES if table_exists(cursor, table)]
+    removed_total = 0
+
+    for group in groups:
+        survivor_id = group['survivor_id']
+        duplicate_ids = [int(i) for i in group['ids'].split(',') if int(i) != survivor_id]
+        placeholders = ', '.join(['%s'] * len(duplicate_ids))
+
+        for table in references:
+            cursor.execute(
+                f"UPDATE {table} SET keyword_id = %s WHERE keyword_id IN ({placeholders})",
+                [survivor_id] + duplicate_ids
+            )
+
+        cursor.execute(f"DELETE FROM keywords WHERE id IN ({placeholders})", duplicate_ids)
+        removed_total += cursor.rowcount
+
+    if groups:
+        print(f"   🗑️ Удалено дублей: {removed_total}")
+        # История SERP объединена - последний анализ ключей мог смениться
+        update_competitors_competitiveness(cursor.connection)
+
+    add_index(cursor, 'keywords', 'uq_keywords_ad_group_keyword', 'ad_group_id, keyword', unique=True)
+
+
+def column_exists(cursor, table, column):
+    """Проверка наличия колонки"""
+    cursor.execute("""
+        SELECT COUNT(*) as cnt
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+        AND COLUMN_NAME = %s
+    """, (Config.DB_NAME, table, column))
+    return cursor.fetchone()['cnt'] > 0
+
+
+def migrate_keywords_indexes(cursor):
+    """Индекс для агрегатов новых слов по группам (дерево кампаний)"""
+    if not column_exists(cursor, 'keywords', 'is_new'):
+        print("   ⚠️ Колонки keywords.is_new нет - индекс пропущен")
+        return
+    add_index(cursor, 'keywords', 'idx_keywords_ad_group_new', 'ad_group_id, is_new')
+
+
+def migrate_keywords_sync(cursor):
+    """
+    Delta-синхронизация (/keywords/changes) опирается на updated_at:
+    он должен обновляться при любом UPDATE и быть проиндексирован по группе
+    """
+    cursor.execute("""
+        SELECT EXTRA, COLUMN_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = 'keywords'
+        AND COLUMN_NAME = 'updated_at'
+    """, (Config.DB_NAME,))
+    column = cursor.fetchone()
+
+    if column and 'on update' not in (column['EXTRA'] or '').lower():
+        print("   ➕ keywords.updated_at: ON UPDATE CURRENT_TIMESTAMP...")
+        cursor.execute(f"""
+            ALTER TABLE keywords 
+            MODIFY updated_at {column['COLUMN_TYPE']} DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        """)
+        print("   ✅ keywords.updated_at обновляется автоматически")
+    else:
+        print("   ✅ keywords.updated_at уже обновляется автоматически")
+
+    add_index(cursor, 'keywords', 'idx_keywords_ad_group_updated', 'ad_group_id, updated_at')
+
+
+def add_column(cursor, table, column, definition):
+    """Добавление колонки, если её ещё нет"""
+    if column_exists(cursor, table, column):
+        print(f"   ✅ {table}.{column} уже существует")
+        return False
+
+    print(f"   ➕ {table}.{column} {definition}...")
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    print(f"   ✅ {table}.{column} добавлена")
+    return True
+
+
+def make_nullable(cursor, table, column):
+    """Разрешает NULL в колонке (данные переезжают в serp_raw_payloads)"""
+    cursor.execute("""
+        SELECT IS_NULLABLE, COLUMN_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+        AND COLUMN_NAME = %s
+    """, (Config.DB_NAME, table, column))
+    info = cursor.fetchone()
+    if info and info['IS_NULLABLE'] == 'NO':
+        print(f"   ➕ {table}.{column}: NULL...")
+        cursor.execute(f"ALTER TABLE {table} MODIFY {column} {info['COLUMN_TYPE']} NULL")
+
+
+# Колонки с сырыми данными SERP, которые переносятся в serp_raw_payloads
+SERP_PAYLOAD_COLUMNS = {
+    'serp_logs': ('raw_response', 'parsed_items'),
+    'serp_analysis_history': ('parsed_items',),
+}
+PAYLOAD_BATCH_SIZE = 200
+
+
+def move_payloads(cursor, table, columns):
+    """Переносит данные колонок в хранилище пачками (коммит после каждой пачки)"""
+    select_columns = ', '.join(columns)
+    has_data = ' OR '.join(f"{column} IS NOT NULL" for column in columns)
+    set_columns = ', '.join(f"{column}_hash = %s, {column} = NULL" for column in columns)
+
+    last_id = 0
+    moved = 0
+    while True:
+        cursor.execute(f"""
+            SELECT id, {select_columns}
+            FROM {table}
+            WHERE id > %s AND ({has_data})
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, PAYLOAD_BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        for row in rows:
+            params = []
+            for column in columns:
+                params.append(store_payload(cursor, row[column]))
+            params.append(row['id'])
+            cursor.execute(f"UPDATE {table} SET {set_columns} WHERE id = %s", params)
+
+        last_id = rows[-1]['id']
+        moved += len(rows)
+        cursor.connection.commit()
+        print(f"   📦 {table}: перенесено {moved}")
+
+    return moved
+
+
+def migrate_serp_payloads(cursor):
+    """
+    Сжатое хранилище raw_response / parsed_items (services/payload_store.py)
+    После переноса место в таблицах освобождает OPTIMIZE TABLE (выполнить вручную)
+    """
+    if not table_exists(cursor, 'serp_raw_payloads'):
+        print("   ⚠️ Таблицы serp_raw_payloads нет - сначала запустите приложение (db.create_all)")
+        return
+
+    for table, columns in SERP_PAYLOAD_COLUMNS.items():
+        if not table_exists(cursor, table):
+            print(f"   ⚠️ Таблицы {table} нет - пропущено")
+            continue
+
+        for column in columns:
+            add_column(cursor, table, f"{column}_hash", "VARCHAR(64) NULL")
+            add_index(cursor, table, f"idx_{table}_{column}_hash", f"{column}_hash")
+            make_nullable(cursor, table, column)
+
+        moved = move_payloads(cursor, table, columns)
+        if moved:
+            print(f"   ✅ {table}: {moved} записей в serp_raw_payloads")
+            print(f"   💡 Освободить место: OPTIMIZE TABLE {table}")
+        else:
+            print(f"   ✅ {table}: переносить нечего")
+
+
+def migrate_serp_pending_cancelled(cursor):
+    """Статус cancelled у serp_pending_tasks: задачи отменённого batch SERP не возобновляются"""
+    if not table_exists(cursor, 'serp_pending_tasks'):
+        print("   ⚠️ Таблицы serp_pending_tasks нет - пропущено")
+        return
+
+    cursor.execute("""
+        SELECT COLUMN_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = 'serp_pending_tasks'
+        AND COLUMN_NAME = 'status'
+    """, (Config.DB_NAME,))
+    column = cursor.fetchone()
+
+    if column and "'cancelled'" not in column['COLUMN_TYPE']:
+        print("   ➕ serp_pending_tasks.status: cancelled...")
+        cursor.execute("""
+            ALTER TABLE serp_pending_tasks
+            MODIFY status ENUM('pending', 'done', 'error', 'cancelled') DEFAULT 'pending'
+        """)
+        print("   ✅ serp_pending_tasks.status обновлён")
+    else:
+        print("   ✅ serp_pending_tasks.status уже содержит cancelled")
+
+
+MIGRATIONS = [
+    ('Индексы competitor_schools', migrate_competitors_indexes),
+    ('Уникальные ключевые слова в группе', migrate_keywords_unique),
+    ('Индексы keywords', migrate_keywords_indexes),
+    ('Delta-синхронизация keywords', migrate_keywords_sync),
+    ('Хранилище сырых данных SERP', migrate_serp_payloads),
+    ('Отмена batch SERP задач', migrate_serp_pending_cancelled),
+]
+
+
+def main():
+    print("=" * 70)
+    print("🔧 Миграция схемы БД")
+    print("=" * 70)
+
+    connection = None
+
+    try:
+        connection = pymysql.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+        cursor = connection.cursor()
+
+        print("\n✅ Подключение к БД успешно")
+
+        for title, migration in MIGRATIONS:
+            print(f"\n🔄 {title}")
+            migration(cursor)
+            connection.commit()
+
+        cursor.close()
+
+        print("\n" + "=" * 70)
+        print("✅ Миграция завершена")
+        print("=" * 70)
+
+    except Exception as e:
+        print(f"\n❌ Ошибка миграции: {e}")
+        if connection:
+            connection.rollback()
+        raise
+
+    finally:
+        if connection:
+            connection.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+        sys.exit(0)
+    except Exception:
+        sys.exit(1)
@@ -0,0 +1,600 @@
+# backend/scripts/serp_retention.py
+"""
+Хранение истории SERP: итоги, очистка сырых данных и старых записей
+Запускается через cron каждый день (см. setup_cron.sh)
+
+1. Дневные и месячные итоги по словам (serp_rollups_daily / serp_rollups_monthly)
+2. У анализов старше SERP_PAYLOAD_RETENTION_DAYS удаляются raw_response и parsed_items,
+   остаётся analysis_result; неиспользуемые serp_raw_payloads удаляются
+3. serp_logs старше SERP_HISTORY_RETENTION_DAYS удаляются
+   (если таблица секционирована - целыми секциями через DROP PARTITION)
+4. serp_analysis_history старше SERP_HISTORY_RETENTION_DAYS удаляются пачками вместе
+   с serp_competitor_appearances. Последний анализ каждого слова остаётся всегда:
+   по нему считается competitiveness конкурентов.
+   Секционировать эту таблицу нельзя - на неё ссылаются внешние ключи.
+5. Сверка competitiveness полным пересчётом: при анализе она меняется
+   дельтами, и любое расхождение исправляется здесь (last_seen_at при этом
+   не откатывается к оставшейся после чистки истории)
+
+Запуск:
+    python3 scripts/serp_retention.py --dry-run      # только отчёт, ничего не меняет
+    python3 scripts/serp_retention.py --days 60      # хранить сырые данные 60 дней
+    python3 scripts/serp_retention.py --partition    # один раз: секционировать serp_logs по месяцам
+"""
+
+import sys
+import os
+import argparse
+from datetime import date, datetime, timedelta
+
+# Добавляем путь к проекту
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from scripts.migrate_db import table_exists, column_exists, SERP_PAYLOAD_COLUMNS
+from utils.serp_competitors_helper import update_competitors_competitiveness
+import pymysql
+
+# Колонка даты для каждой таблицы истории
+SERP_DATE_COLUMNS = {
+    'serp_logs': 'created_at',
+    'serp_analysis_history': 'analysis_date',
+}
+
+# Сколько месяцев вперёд держать пустые секции serp_logs
+PARTITIONS_AHEAD = 2
+
+# Позиция нашего сайта из analysis_result (NULL, если сайта нет в выдаче)
+ORGANIC_POSITION_SQL = """
+    CASE WHEN JSON_TYPE(JSON_EXTRACT(analysis_result, '$.our_organic_position')) = 'INTEGER'
+    THEN CAST(JSON_EXTRACT(analysis_result, '$.our_organic_position') AS UNSIGNED) END
+"""
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def payload_hash_columns(cursor, table):
+    """Колонки *_hash таблицы (пусто, если migrate_db.py ещё не выполнялся)"""
+    if not table_exists(cursor, table):
+        return []
+    return [column for column in SERP_PAYLOAD_COLUMNS[table] if column_exists(cursor, table, f"{column}_hash")]
+
+
+# ==================== ИТОГИ ====================
+
+def rollup_daily(cursor):
+    """Пересчитывает дневные итоги начиная с последнего посчитанного дня"""
+    cursor.execute("SELECT MAX(day) as last_day FROM serp_rollups_daily")
+    since = cursor.fetchone()['last_day'] or date(1970, 1, 1)
+
+    cursor.execute(f"""
+        INSERT INTO serp_rollups_daily (
+            keyword_id, day, analyses, intent_type, commercial_count,
+            has_ads_count, has_maps_count, avg_school_percentage,
+            avg_organic_position, best_organic_position, cost
+        )
+        SELECT
+            keyword_id,
+            DATE(analysis_date) as day,
+            COUNT(*),
+            SUBSTRING_INDEX(GROUP_CONCAT(intent_type ORDER BY analysis_date DESC, id DESC SEPARATOR '|'), '|', 1),
+            SUM(intent_type = 'Коммерческий'),
+            SUM(has_ads),
+            SUM(has_maps),
+            AVG(school_percentage),
+            AVG(organic_position),
+            MIN(organic_position),
+            SUM(cost)
+        FROM (
+            SELECT *, {ORGANIC_POSITION_SQL} as organic_position
+            FROM serp_analysis_history
+            WHERE analysis_date >= %s
+        ) h
+        GROUP BY keyword_id, DATE(analysis_date)
+        ON DUPLICATE KEY UPDATE
+            analyses = VALUES(analyses),
+            intent_type = VALUES(intent_type),
+            commercial_count = VALUES(commercial_count),
+            has_ads_count = VALUES(has_ads_count),
+            has_maps_count = VALUES(has_maps_count),
+            avg_school_percentage = VALUES(avg_school_percentage),
+            avg_organic_position = VALUES(avg_organic_position),
+            best_organic_position = VALUES(best_organic_position),
+            cost = VALUES(cost)
+    """, (since,))
+    print(f"   📅 Дневные итоги с {since}: {cursor.rowcount} строк")
+
+
+def rollup_monthly(cursor):
+    """Пересчитывает месячные итоги из дневных начиная с последнего посчитанного месяца"""
+    cursor.execute("SELECT MAX(month) as last_month FROM serp_rollups_monthly")
+    since = cursor.fetchone()['last_month'] or date(1970, 1, 1)
+
+    cursor.execute("""
+        INSERT INTO serp_rollups_monthly (
+            keyword_id, month, analyses, intent_type, commercial_count,
+            has_ads_count, has_maps_count, avg_school_percentage,
+            avg_organic_position, best_organic_position, cost
+        )
+        SELECT
+            keyword_id,
+            DATE_FORMAT(day, '%%Y-%%m-01') as month,
+            SUM(analyses),
+            SUBSTRING_INDEX(GROUP_CONCAT(intent_type ORDER BY day DESC SEPARATOR '|'), '|', 1),
+            SUM(commercial_count),
+            SUM(has_ads_count),
+            SUM(has_maps_count),
+            SUM(avg_school_percentage * analyses) / SUM(analyses),
+            AVG(avg_organic_position),
+            MIN(best_organic_position),
+            SUM(cost)
+        FROM serp_rollups_daily
+        WHERE day >= %s
+        GROUP BY keyword_id, month
+        ON DUPLICATE KEY UPDATE
+            analyses = VALUES(analyses),
+            intent_type = VALUES(intent_type),
+            commercial_count = VALUES(commercial_count),
+            has_ads_count = VALUES(has_ads_count),
+            has_maps_count = VALUES(has_maps_count),
+            avg_school_percentage = VALUES(avg_school_percentage),
+            avg_organic_position = VALUES(avg_organic_position),
+            best_organic_position = VALUES(best_organic_position),
+            cost = VALUES(cost)
+    """, (since,))
+    print(f"   📅 Месячные итоги с {since}: {cursor.rowcount} строк")
+
+
+# ==================== СЕКЦИИ serp_logs ====================
+
+def get_partitions(cursor, table):
+    """Секции таблицы (пустой список, если таблица не секционирована)"""
+    cursor.execute("""
+        SELECT
+            PARTITION_NAME as name,
+            PARTITION_DESCRIPTION as bound,
+            TABLE_ROWS as row_count,
+            DATA_LENGTH + INDEX_LENGTH as bytes
+        FROM INFORMATION_SCHEMA.PARTITIONS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+        AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (Config.DB_NAME, table))
+    return cursor.fetchall()
+
+
+def month_start(day, shift=0):
+    """Первое число месяца со сдвигом на shift месяцев"""
+    month_index = day.year * 12 + day.month - 1 + shift
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_definition(month):
+    """Секция pYYYYMM для строк месяца month"""
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{month_start(month, 1)}'))"
+
+
+def expired_partitions(cursor, table, cutoff):
+    """Секции, все строки которых старше cutoff"""
+    cursor.execute("SELECT TO_DAYS(%s) as cutoff_days", (cutoff,))
+    cutoff_days = cursor.fetchone()['cutoff_days']
+    return [
+        partition for partition in get_partitions(cursor, table)
+        if partition['bound'] != 'MAXVALUE' and int(partition['bound']) <= cutoff_days
+    ]
+
+
+def ensure_future_partitions(cursor, table):
+    """Выделяет из pmax секции на текущий и PARTITIONS_AHEAD следующих месяцев"""
+    names = {partition['name'] for partition in get_partitions(cursor, table)}
+    if 'pmax' not in names:
+        return
+
+    current = month_start(date.today())
+    missing = [
+        month_start(current, shift) for shift in range(PARTITIONS_AHEAD + 1)
+        if f"p{month_start(current, shift):%Y%m}" not in names
+    ]
+    if not missing:
+        return
+
+    definitions = ', '.join(partition_definition(month) for month in missing)
+    cursor.execute(f"""
+        ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (
+            {definitions},
+            PARTITION pmax VALUES LESS THAN MAXVALUE
+        )
+    """)
+    print(f"   ➕ {table}: добавлены секции {', '.join(f'p{month:%Y%m}' for month in missing)}")
+
+
+def partition_serp_logs(cursor):
+    """
+    Одноразовое секционирование serp_logs по месяцам (RANGE по TO_DAYS(created_at))
+    MySQL не поддерживает внешние ключи в секционированных таблицах, поэтому
+    собственные внешние ключи serp_logs удаляются. Первичный ключ становится (id, created_at).
+    """
+    table = 'serp_logs'
+    if get_partitions(cursor, table):
+        print(f"   ✅ {table} уже секционирована")
+        return
+
+    cursor.execute("""
+        SELECT DISTINCT TABLE_NAME, CONSTRAINT_NAME
+        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s
+        AND REFERENCED_TABLE_NAME = %s
+    """, (Config.DB_NAME, table))
+    referencing = cursor.fetchall()
+    if referencing:
+        names = ', '.join(f"{row['TABLE_NAME']}.{row['CONSTRAINT_NAME']}" for row in referencing)
+        print(f"   ❌ На {table} ссылаются внешние ключи ({names}) - секционирование невозможно")
+        return
+
+    cursor.execute("""
+        SELECT INDEX_NAME
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+        AND NON_UNIQUE = 0
+        AND INDEX_NAME != 'PRIMARY'
+    """, (Config.DB_NAME, table))
+    if cursor.fetchall():
+        print(f"   ❌ У {table} есть уникальные индексы без created_at - секционирование невозможно")
+        return
+
+    cursor.execute("""
+        SELECT CONSTRAINT_NAME
+        FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+        AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+    """, (Config.DB_NAME, table))
+    for row in cursor.fetchall():
+        print(f"   🔓 {table}: удаление внешнего ключа {row['CONSTRAINT_NAME']}")
+        cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {row['CONSTRAINT_NAME']}")
+
+    cursor.execute(f"UPDATE {table} SET created_at = NOW() WHERE created_at IS NULL")
+    cursor.execute(f"SELECT MIN(created_at) as first_date FROM {table}")
+    first_date = cursor.fetchone()['first_date'] or datetime.now()
+
+    months = []
+    month = month_start(first_date)
+    last_month = month_start(date.today(), PARTITIONS_AHEAD)
+    while month <= last_month:
+        months.append(month)
+        month = month_start(month, 1)
+
+    definitions = ',\n            '.join(partition_definition(month) for month in months)
+
+    print(f"   🔄 {table}: {len(months)} секций с {months[0]:%Y-%m} (может занять время)...")
+    cursor.execute(f"""
+        ALTER TABLE {table}
+            MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, created_at)
+    """)
+    cursor.execute(f"""
+        ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(created_at)) (
+            {definitions},
+            PARTITION pmax VALUES LESS THAN MAXVALUE
+        )
+    """)
+    print(f"   ✅ {table} секционирована")
+
+
+# ==================== ОТЧЁТ ====================
+
+def avg_row_length(cursor, table):
+    cursor.execute("""
+        SELECT AVG_ROW_LENGTH as avg_length
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+    """, (Config.DB_NAME, table))
+    row = cursor.fetchone()
+    return int(row['avg_length'] or 0) if row else 0
+
+
+def build_report(cursor, payload_cutoff, history_cutoff):
+    """Сколько строк и байт освободит очистка (оценка по INFORMATION_SCHEMA)"""
+    report = {'sections': [], 'total_bytes': 0}
+
+    def add(title, rows, size):
+        report['sections'].append({'title': title, 'rows': int(rows or 0), 'bytes': int(size or 0)})
+        report['total_bytes'] += int(size or 0)
+
+    # Старые данные, ещё не перенесённые в serp_raw_payloads
+    for table, columns in SERP_PAYLOAD_COLUMNS.items():
+        if not table_exists(cursor, table):
+            continue
+        date_column = SERP_DATE_COLUMNS[table]
+        length_sql = ' + '.join(f"COALESCE(LENGTH({column}), 0)" for column in columns)
+        has_data = ' OR '.join(f"{column} IS NOT NULL" for column in columns)
+        cursor.execute(f"""
+            SELECT COUNT(*) as cnt, SUM({length_sql}) as bytes
+            FROM {table}
+            WHERE {date_column} < %s AND ({has_data})
+        """, (payload_cutoff,))
+        row = cursor.fetchone()
+        add(f"{table}: сырые данные в строках", row['cnt'], row['bytes'])
+
+    # Сжатые данные, на которые останутся только ссылки из старых строк
+    if table_exists(cursor, 'serp_raw_payloads'):
+        references = []
+        params = []
+        for table in SERP_PAYLOAD_COLUMNS:
+            for column in payload_hash_columns(cursor, table):
+                references.append(f"""NOT EXISTS (
+                    SELECT 1 FROM {table} r
+                    WHERE r.{column}_hash = p.hash AND r.{SERP_DATE_COLUMNS[table]} >= %s
+                )""")
+                params.append(payload_cutoff)
+        if references:
+            cursor.execute(f"""
+                SELECT COUNT(*) as cnt, SUM(p.size_compressed) as bytes
+                FROM serp_raw_payloads p
+                WHERE {' AND '.join(references)}
+            """, params)
+            row = cursor.fetchone()
+            add("serp_raw_payloads", row['cnt'], row['bytes'])
+
+    if table_exists(cursor, 'serp_logs'):
+        partitions = expired_partitions(cursor, 'serp_logs', history_cutoff)
+        if partitions:
+            add(
+                f"serp_logs: секции {', '.join(p['name'] for p in partitions)}",
+                sum(p['row_count'] or 0 for p in partitions),
+                sum(p['bytes'] or 0 for p in partitions)
+            )
+        cursor.execute("SELECT COUNT(*) as cnt FROM serp_logs WHERE created_at < %s", (history_cutoff,))
+        rows = cursor.fetchone()['cnt'] - sum(p['row_count'] or 0 for p in partitions)
+        if rows > 0:
+            add("serp_logs: строки", rows, rows * avg_row_length(cursor, 'serp_logs'))
+
+    cursor.execute("""
+        SELECT COUNT(*) as cnt
+        FROM serp_analysis_history h
+        WHERE h.analysis_date < %s
+        AND EXISTS (
+            SELECT 1 FROM serp_analysis_history n
+            WHERE n.keyword_id = h.keyword_id AND n.id > h.id
+        )
+    """, (history_cutoff,))
+    rows = cursor.fetchone()['cnt']
+    add("serp_analysis_history: строки", rows, rows * avg_row_length(cursor, 'serp_analysis_history'))
+
+    return report
+
+
+def print_report(report):
+    print("\n📊 Отчёт об очистке:")
+    for section in report['sections']:
+        print(f"   - {section['title']}: {section['rows']} строк, ~{format_bytes(section['bytes'])}")
+    print(f"   💾 Всего освободится: ~{format_bytes(report['total_bytes'])}")
+
+
+# ==================== ОЧИСТКА ====================
+
+def prune_payload_references(cursor, table, payload_cutoff, batch_size):
+    """Удаляет raw_response / parsed_items у строк старше payload_cutoff (analysis_result остаётся)"""
+    columns = payload_hash_columns(cursor, table)
+    if not columns:
+        print(f"   ⚠️ {table}: нет колонок *_hash - сначала выполните scripts/migrate_db.py")
+        return 0
+
+    date_column = SERP_DATE_COLUMNS[table]
+    set_sql = ', '.join(f"{column} = NULL, {column}_hash = NULL" for column in columns)
+    has_data = ' OR '.join(f"{column} IS NOT NULL OR {column}_hash IS NOT NULL" for column in columns)
+
+    total = 0
+    while True:
+        cursor.execute(f"""
+            UPDATE {table} SET {set_sql}
+            WHERE {date_column} < %s AND ({has_data})
+            LIMIT %s
+        """, (payload_cutoff, batch_size))
+        updated = cursor.rowcount
+        cursor.connection.commit()
+        total += updated
+        if updated < batch_size:
+            break
+
+    print(f"   🧹 {table}: сырые данные удалены у {total} строк")
+    return total
+
+
+def prune_orphan_payloads(cursor, batch_size):
+    """Удаляет serp_raw_payloads, на которые никто не ссылается"""
+    references = [
+        f"NOT EXISTS (SELECT 1 FROM {table} r WHERE r.{column}_hash = p.hash)"
+        for table in SERP_PAYLOAD_COLUMNS
+        for column in payload_hash_columns(cursor, table)
+    ]
+    if not references:
+        return 0
+
+    total = 0
+    while True:
+        # Свежие записи не трогаем: ссылка на них может быть ещё не закоммичена
+        cursor.execute(f"""
+            SELECT p.hash
+            FROM serp_raw_payloads p
+            WHERE p.created_at < NOW() - INTERVAL 1 DAY
+            AND {' AND '.join(references)}
+            LIMIT %s
+        """, (batch_size,))
+        hashes = [row['hash'] for row in cursor.fetchall()]
+        if not hashes:
+            break
+
+        placeholders = ','.join(['%s'] * len(hashes))
+        cursor.execute(f"DELETE FROM serp_raw_payloads WHERE hash IN ({placeholders})", hashes)
+        cursor.connection.commit()
+        total += len(hashes)
+
+    print(f"   🧹 serp_raw_payloads: удалено {total}")
+    return total
+
+
+def prune_serp_logs(cursor, history_cutoff, batch_size):
+    """Удаляет serp_logs старше history_cutoff: сначала целые секции, затем остаток пачками"""
+    for partition in expired_partitions(cursor, 'serp_logs', history_cutoff):
+        cursor.execute(f"ALTER TABLE serp_logs DROP PARTITION {partition['name']}")
+        print(f"   🗑️ serp_logs: секция {partition['name']} удалена (~{partition['row_count']} строк)")
+
+    total = 0
+    while True:
+        cursor.execute("""
+            DELETE FROM serp_logs
+            WHERE created_at < %s
+            ORDER BY id
+            LIMIT %s
+        """, (history_cutoff, batch_size))
+        deleted = cursor.rowcount
+        cursor.connection.commit()
+        total += deleted
+        if deleted < batch_size:
+            break
+
+    print(f"   🗑️ serp_logs: удалено строк {total}")
+    return total
+
+
+def prune_history(cursor, history_cutoff, batch_size):
+    """
+    Удаляет serp_analysis_history старше history_cutoff, кроме последнего анализа слова
+    competitiveness считается только по последним анализам, поэтому не меняется.
+    """
+    total = 0
+    while True:
+        cursor.execute("""
+            SELECT h.id
+            FROM serp_analysis_history h
+            WHERE h.analysis_date < %s
+            AND EXISTS (
+                SELECT 1 FROM serp_analysis_history n
+                WHERE n.keyword_id = h.keyword_id AND n.id > h.id
+            )
+            ORDER BY h.id
+            LIMIT %s
+        """, (history_cutoff, batch_size))
+        ids = [row['id'] for row in cursor.fetchall()]
+        if not ids:
+            break
+
+        placeholders = ','.join(['%s'] * len(ids))
+        cursor.execute(f"DELETE FROM serp_competitor_appearances WHERE serp_analysis_id IN ({placeholders})", ids)
+        cursor.execute(f"DELETE FROM serp_analysis_history WHERE id IN ({placeholders})", ids)
+        cursor.connection.commit()
+        total += len(ids)
+
+    print(f"   🗑️ serp_analysis_history: удалено строк {total}")
+    return total
+
+
+def run_retention(payload_days, history_days, dry_run=False, partition=False):
+    """Полный цикл очистки; возвращает отчёт build_report"""
+    connection = None
+    try:
+        connection = pymysql.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+        cursor = connection.cursor()
+
+        payload_cutoff = datetime.now() - timedelta(days=payload_days)
+        history_cutoff = datetime.now() - timedelta(days=history_days)
+        batch_size = Config.SERP_RETENTION_BATCH_SIZE
+
+        print(f"🗓️  Сырые данные старше {payload_cutoff:%Y-%m-%d} ({payload_days} дн.), "
+              f"записи старше {history_cutoff:%Y-%m-%d} ({history_days} дн.)")
+
+        if partition and not dry_run:
+            print("\n🔄 Секционирование serp_logs")
+            partition_serp_logs(cursor)
+
+        report = build_report(cursor, payload_cutoff, history_cutoff)
+        print_report(report)
+
+        if dry_run:
+            print("\n⏸️  --dry-run: изменения не выполнялись")
+            cursor.close()
+            return report
+
+        print("\n📅 Итоги")
+        rollup_daily(cursor)
+        rollup_monthly(cursor)
+        connection.commit()
+
+        print("\n🧹 Сырые данные")
+        for table in SERP_PAYLOAD_COLUMNS:
+            if table_exists(cursor, table):
+                prune_payload_references(cursor, table, payload_cutoff, batch_size)
+        prune_orphan_payloads(cursor, batch_size)
+
+        print("\n🗑️  Старые записи")
+        if table_exists(cursor, 'serp_logs'):
+            prune_serp_logs(cursor, history_cutoff, batch_size)
+            ensure_future_partitions(cursor, 'serp_logs')
+        prune_history(cursor, history_cutoff, batch_size)
+
+        print("\n📊 Сверка конкурентности")
+        update_competitors_competitiveness(connection)
+        connection.commit()
+
+        cursor.close()
+        return report
+
+    except Exception as e:
+        print(f"❌ Error during SERP retention: {str(e)}")
+        if connection:
+            connection.rollback()
+        raise
+
+    finally:
+        if connection:
+            connection.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Очистка и итоги истории SERP')
+    parser.add_argument('--dry-run', action='store_true', help='Только отчёт, без изменений')
+    parser.add_argument('--days', type=int, default=Config.SERP_PAYLOAD_RETENTION_DAYS,
+                        help='Сколько дней хранить raw_response / parsed_items')
+    parser.add_argument('--history-days', type=int, default=Config.SERP_HISTORY_RETENTION_DAYS,
+                        help='Сколько дней хранить записи serp_logs / serp_analysis_history')
+    parser.add_argument('--partition', action='store_true',
+                        help='Секционировать serp_logs по месяцам (однократно)')
+    args = parser.parse_args()
+
+    if args.history_days < args.days:
+        parser.error('--history-days не может быть меньше --days')
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        report = run_retention(args.days, args.history_days, args.dry_run, args.partition)
+        print(f"\n{'='*50}")
+        print(f"SERP retention completed: ~{format_bytes(report['total_bytes'])} "
+              f"{'can be reclaimed' if args.dry_run else 'reclaimed'}")
+        print(f"{'='*50}")
+        sys.exit(0)
+    except Exception as e:
+        print(f"\n{'='*50}")
+        print(f"SERP retention failed: {str(e)}")
+        print(f"{'='*50}")
+        sys.exit(1)
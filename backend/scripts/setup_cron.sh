@@ -1,13 +1,15 @@
 #!/bin/bash
 # backend/scripts/setup_cron.sh
-# Скрипт для настройки cron задачи автоматической очистки корзины
+# Скрипт для настройки cron задач автоматической очистки корзины и истории SERP
 
 PROJECT_DIR="/www/wwwroot/keylock.interschool.online/www/backend"
 PYTHON_PATH="$PROJECT_DIR/venv/bin/python3"
 SCRIPT_PATH="$PROJECT_DIR/scripts/cleanup_trash.py"
 LOG_PATH="$PROJECT_DIR/logs/cleanup_trash.log"
+RETENTION_SCRIPT_PATH="$PROJECT_DIR/scripts/serp_retention.py"
+RETENTION_LOG_PATH="$PROJECT_DIR/logs/serp_retention.log"
 
-echo "🔧 Setting up cron job for trash cleanup..."
+echo "🔧 Setting up cron jobs for trash cleanup and SERP retention..."
 
 # Создаём директорию для логов если не существует
 mkdir -p "$PROJECT_DIR/logs"
@@ -18,10 +20,10 @@ TEMP_CRON=$(mktemp)
 # Получаем текущий crontab (если есть)
 crontab -l > "$TEMP_CRON" 2>/dev/null || true
 
-# Проверяем, не добавлена ли уже задача
-if grep -q "cleanup_trash.py" "$TEMP_CRON"; then
-    echo "⚠️  Cron job already exists, removing old entry..."
-    grep -v "cleanup_trash.py" "$TEMP_CRON" > "${TEMP_CRON}.new"
+# Проверяем, не добавлены ли уже задачи
+if grep -q "cleanup_trash.py\|serp_retention.py" "$TEMP_CRON"; then
+    echo "⚠️  Cron jobs already exist, removing old entries..."
+    grep -v "cleanup_trash.py\|serp_retention.py\|Keyword Lock:" "$TEMP_CRON" > "${TEMP_CRON}.new"
     mv "${TEMP_CRON}.new" "$TEMP_CRON"
 fi
 
@@ -30,19 +32,24 @@ echo "" >> "$TEMP_CRON"
 echo "# Keyword Lock: Auto cleanup trash (every day at 3:00 AM)" >> "$TEMP_CRON"
 echo "0 3 * * * $PYTHON_PATH $SCRIPT_PATH >> $LOG_PATH 2>&1" >> "$TEMP_CRON"
 
+# Итоги и очистка истории SERP (каждый день в 3:30 ночи)
+echo "# Keyword Lock: SERP history retention (every day at 3:30 AM)" >> "$TEMP_CRON"
+echo "30 3 * * * $PYTHON_PATH $RETENTION_SCRIPT_PATH >> $RETENTION_LOG_PATH 2>&1" >> "$TEMP_CRON"
+
 # Устанавливаем новый crontab
 crontab "$TEMP_CRON"
 
 # Удаляем временный файл
 rm "$TEMP_CRON"
 
-echo "✅ Cron job successfully installed!"
+echo "✅ Cron jobs successfully installed!"
 echo ""
 echo "📋 Current crontab:"
 crontab -l | grep -A 1 "Keyword Lock"
 echo ""
-echo "📝 Logs will be saved to: $LOG_PATH"
-echo "🕐 Task will run every day at 3:00 AM"
+echo "📝 Logs will be saved to: $LOG_PATH, $RETENTION_LOG_PATH"
+echo "🕐 Tasks will run every day at 3:00 AM and 3:30 AM"
 echo ""
-echo "To test the script manually, run:"
-echo "   $PYTHON_PATH $SCRIPT_PATH"
\ No newline at end of file
+echo "To test the scripts manually, run:"
+echo "   $PYTHON_PATH $SCRIPT_PATH"
+echo "   $PYTHON_PATH $RETENTION_SCRIPT_PATH --dry-run"
\ No newline at end of file
@@ -1,60 +1,218 @@
 # backend/services/config_manager.py
+"""
+Настройки приложения из зашифрованного config/app_config.enc
+
+Файл расшифровывается один раз и хранится в памяти. Перед чтением
+(не чаще SETTINGS_CHECK_INTERVAL) проверяется mtime файла: если его
+изменил другой процесс, настройки перечитываются. save_settings() пишет
+файл атомарно (временный файл + os.replace) и сразу обновляет кэш.
+
+Подписчики (subscribe) получают множество изменившихся ключей - так
+пул БД и клиент DataForSeo подхватывают новые настройки без перезапуска.
+"""
 import json
 import os
+import tempfile
+import threading
+import time
 from cryptography.fernet import Fernet
 from pathlib import Path
 
+# Как часто проверять mtime файла настроек (сек)
+SETTINGS_CHECK_INTERVAL = 1.0
+
 class ConfigManager:
     def __init__(self):
         self.config_file = Path(__file__).parent.parent / 'config' / 'app_config.enc'
         self.key_file = Path(__file__).parent.parent / 'config' / 'app.key'
+        self._lock = threading.RLock()
+        self._cipher = None
+        self._settings = None
+        self._file_state = None
+        self._last_check = 0.0
+        self._subscribers = []
         self._ensure_key_exists()
-    
+
     def _ensure_key_exists(self):
         """Создает ключ шифрования если его нет"""
         os.makedirs(self.key_file.parent, exist_ok=True)
-        
+
         if not self.key_file.exists():
             key = Fernet.generate_key()
             with open(self.key_file, 'wb') as f:
                 f.write(key)
             print(f"⚠️ Создан новый ключ шифрования: {self.key_file}")
-    
+
     def _get_cipher(self):
-        """Получает объект шифрования"""
-        with open(self.key_file, 'rb') as f:
-            key = f.read()
-        return Fernet(key)
-    
-    def save_settings(self, settings):
-        """Сохраняет настройки в зашифрованный файл"""
+        """Получает объект шифрования (ключ читается один раз)"""
+        if self._cipher is None:
+            with open(self.key_file, 'rb') as f:
+                key = f.read()
+            self._cipher = Fernet(key)
+        return self._cipher
+
+    def _stat_file(self):
+        """(mtime_ns, size) файла настроек или None, если его нет"""
         try:
-            cipher = self._get_cipher()
-            encrypted_data = cipher.encrypt(json.dumps(settings).encode())
-            
-            os.makedirs(self.config_file.parent, exist_ok=True)
-            with open(self.config_file, 'wb') as f:
+            stat = self.config_file.stat()
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _read_file(self) -> dict:
+        """Читает и расшифровывает файл настроек"""
+        if not self.config_file.exists():
+            return {}
+
+        cipher = self._get_cipher()
+        with open(self.config_file, 'rb') as f:
+            encrypted_data = f.read()
+
+        decrypted_data = cipher.decrypt(encrypted_data)
+        return json.loads(decrypted_data.decode())
+
+    def _current(self) -> dict:
+        """Кэш настроек; перечитывает файл, если он изменился на диске"""
+        changed = None
+        with self._lock:
+            now = time.monotonic()
+            if self._settings is not None and now - self._last_check < SETTINGS_CHECK_INTERVAL:
+                return self._settings
+            self._last_check = now
+
+            file_state = self._stat_file()
+            if self._settings is not None and file_state == self._file_state:
+                return self._settings
+
+            try:
+                settings = self._read_file()
+            except Exception as e:
+                print(f"Error loading settings: {e}")
+                if self._settings is not None:
+                    return self._settings
+                settings = {}
+
+            if self._settings is not None:
+                changed = self._diff(self._settings, settings)
+                print(f"🔄 Файл настроек изменён, перечитан (изменено: {', '.join(sorted(changed)) or 'нет'})")
+            self._settings = settings
+            self._file_state = file_state
+            current = self._settings
+
+        if changed:
+            self._notify(changed, current)
+        return current
+
+    @staticmethod
+    def _diff(old: dict, new: dict) -> set:
+        return {key for key in set(old) | set(new) if old.get(key) != new.get(key)}
+
+    def _notify(self, changed: set, settings: dict):
+        for callback in list(self._subscribers):
+            try:
+                callback(changed, settings)
+            except Exception as e:
+                print(f"⚠️ Ошибка подписчика настроек {getattr(callback, '__name__', callback)}: {e}")
+
+    def subscribe(self, callback):
+        """
+        Подписка на изменение настроек: callback(changed_keys: set, settings: dict)
+        Вызывается после save_settings() и после перечитывания изменённого файла.
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        return callback
+
+    def _write(self, settings: dict):
+        """Атомарная запись файла и кэша (вызывается под _lock)"""
+        cipher = self._get_cipher()
+        encrypted_data = cipher.encrypt(json.dumps(settings).encode())
+
+        os.makedirs(self.config_file.parent, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.config_file.parent, prefix='.app_config.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
                 f.write(encrypted_data)
-            return True
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        previous = self._settings if self._settings is not None else {}
+        self._settings = dict(settings)
+        self._file_state = self._stat_file()
+        self._last_check = time.monotonic()
+        return self._diff(previous, self._settings), self._settings
+
+    def save_settings(self, settings):
+        """Сохраняет настройки в зашифрованный файл (атомарно) и обновляет кэш"""
+        try:
+            with self._lock:
+                changed, current = self._write(settings)
         except Exception as e:
             print(f"Error saving settings: {e}")
             return False
-    
-    def load_settings(self):
-        """Загружает настройки из зашифрованного файла"""
+
+        if changed:
+            self._notify(changed, current)
+        return True
+
+    def update_settings(self, data: dict):
+        """
+        Объединяет data с текущими настройками и сохраняет.
+        Возвращает множество изменившихся ключей или None при ошибке записи.
+        """
+        self._current()
         try:
-            if not self.config_file.exists():
-                return {}
-            
-            cipher = self._get_cipher()
-            with open(self.config_file, 'rb') as f:
-                encrypted_data = f.read()
-            
-            decrypted_data = cipher.decrypt(encrypted_data)
-            return json.loads(decrypted_data.decode())
+            with self._lock:
+                changed, current = self._write({**(self._settings or {}), **data})
         except Exception as e:
-            print(f"Error loading settings: {e}")
-            return {}
+            print(f"Error saving settings: {e}")
+            return None
+
+        if changed:
+            self._notify(changed, current)
+        return changed
+
+    def refresh_if_changed(self):
+        """
+        Проверяет, не изменил ли файл другой процесс (не чаще SETTINGS_CHECK_INTERVAL),
+        и оповещает подписчиков. Дёшево - вызывается на горячих путях
+        (получение клиента DataForSeo, соединения из пула).
+        """
+        if self._settings is not None and time.monotonic() - self._last_check < SETTINGS_CHECK_INTERVAL:
+            return
+        self._current()
+
+    def load_settings(self):
+        """Загружает настройки (копия кэша - изменять её безопасно)"""
+        return dict(self._current())
+
+    def get(self, key: str, default=None):
+        value = self._current().get(key)
+        return default if value is None else value
+
+    def get_str(self, key: str, default: str = '') -> str:
+        value = self.get(key)
+        return default if value is None else str(value).strip()
+
+    def get_int(self, key: str, default: int = 0) -> int:
+        try:
+            return int(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.get(key)
+        if value is None:
+            return default
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        return bool(value)
 
 # Глобальный экземпляр
-config_manager = ConfigManager()
\ No newline at end of file
+config_manager = ConfigManager()
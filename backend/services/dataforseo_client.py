@@ -1,13 +1,144 @@
 # services/dataforseo_client.py - исправленная версия с правильными отступами
 import requests
 import base64
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Any, Optional
 from config import Config
-import sys
+from services.config_manager import config_manager
+from utils.logging_setup import get_logger
+
+logger = get_logger('dataforseo_client')
 
 def debug_print(*args, **kwargs):
-    print(*args, **kwargs)
-    sys.stdout.flush()
+    """Отладочный вывод клиента - уровень DEBUG (виден при LOG_LEVEL=DEBUG)"""
+    message = ' '.join(str(arg) for arg in args).strip('\n')
+    if message.strip():
+        logger.debug(message)
+
+# Общая HTTP-сессия с пулом keep-alive соединений к api.dataforseo.com.
+# Пул urllib3 потокобезопасен, поэтому одна сессия используется всеми
+# экземплярами клиента (в т.ч. из потоков SERP-анализа).
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def _build_http_session() -> requests.Session:
+    """Создаёт сессию с настроенным пулом соединений"""
+    session = requests.Session()
+    
+    # Повторяем только ошибки установки соединения: повтор POST после
+    # отправки запроса может привести к двойному списанию за задачу
+    retry = Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.3)
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=Config.DATAFORSEO_POOL_SIZE,
+        pool_block=True,
+        max_retries=retry
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Connection": "keep-alive"
+    })
+    
+    debug_print(f"🔌 DataForSeo HTTP пул создан (размер: {Config.DATAFORSEO_POOL_SIZE})")
+    return session
+
+def get_http_session() -> requests.Session:
+    """Возвращает общую HTTP-сессию (ленивая инициализация)"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = _build_http_session()
+    return _http_session
+
+class RateLimiter:
+    """
+    Потокобезопасный token bucket: не более `rate` запросов в секунду
+    с допустимым всплеском `burst`
+    """
+    
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = max(float(rate), 0.1)
+        self.capacity = float(burst or max(int(self.rate), 1))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Блокирует поток до появления свободного токена"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+# Лимитеры по логину: лимит API считается на аккаунт, а не на экземпляр клиента
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(login: str) -> RateLimiter:
+    """Возвращает общий лимитер для аккаунта DataForSeo"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(login)
+        if limiter is None:
+            limiter = RateLimiter(Config.DATAFORSEO_RATE_LIMIT)
+            _rate_limiters[login] = limiter
+        return limiter
+
+def get_pool_stats() -> Dict:
+    """
+    Статистика пула соединений: сколько соединений открыто
+    и сколько запросов прошло по уже открытым (reused)
+    """
+    stats = {
+        'pool_size': Config.DATAFORSEO_POOL_SIZE,
+        'timeouts': {
+            'connect': Config.DATAFORSEO_CONNECT_TIMEOUT,
+            'read': Config.DATAFORSEO_READ_TIMEOUT
+        },
+        'hosts': [],
+        'new_connections': 0,
+        'reused_connections': 0,
+        'requests': 0
+    }
+    
+    if _http_session is None:
+        return stats
+    
+    adapter = _http_session.get_adapter('https://')
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        new_connections = pool.num_connections
+        requests_count = pool.num_requests
+        reused = max(requests_count - new_connections, 0)
+        
+        stats['hosts'].append({
+            'host': pool.host,
+            'new_connections': new_connections,
+            'reused_connections': reused,
+            'requests': requests_count,
+            'idle': sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0
+        })
+        stats['new_connections'] += new_connections
+        stats['reused_connections'] += reused
+        stats['requests'] += requests_count
+    
+    return stats
 
 class DataForSeoClient:
     
@@ -23,11 +154,9 @@ class DataForSeoClient:
         else:
             # Загружаем из настроек приложения
             try:
-                from services.config_manager import config_manager
-                settings = config_manager.load_settings()
-                
-                self.login = settings.get('dataforseo_login', '').strip()
-                self.password = settings.get('dataforseo_password', '').strip()
+                # Кэш настроек: файл не расшифровывается на каждый клиент
+                self.login = config_manager.get_str('dataforseo_login')
+                self.password = config_manager.get_str('dataforseo_password')
                 
                 debug_print(f"📋 Логин из настроек: '{self.login}'")
                 debug_print(f"📋 Пароль из настроек: {'***' if self.password else 'ПУСТОЙ'}")
@@ -43,10 +172,10 @@ class DataForSeoClient:
                 if self.login and self.password:
                     debug_print(f"✅ DataForSeo: загружены настройки из файла: {self.login}")
                 else:
-                    debug_print(f"⚠️ DataForSeo: настройки не найдены в файле, пробуем fallback")
+                    logger.warning(f"⚠️ DataForSeo: настройки не найдены в файле, пробуем fallback")
                     
             except Exception as e:
-                debug_print(f"❌ Ошибка загрузки DataForSeo credentials: {e}")
+                logger.error(f"❌ Ошибка загрузки DataForSeo credentials: {e}")
                 # Последний fallback - переменные окружения
                 import os
                 self.login = os.environ.get('DATAFORSEO_LOGIN', '').strip()
@@ -54,7 +183,7 @@ class DataForSeoClient:
         
         # Проверяем что credentials заполнены
         if not self.login or not self.password:
-            debug_print(f"❌ Не хватает credentials:")
+            logger.error(f"❌ Не хватает credentials:")
             debug_print(f"   - login: '{self.login}' (пустой: {not self.login})")
             debug_print(f"   - password: пустой: {not self.password}")
             raise ValueError(
@@ -65,26 +194,29 @@ class DataForSeoClient:
         self.auth_string = base64.b64encode(
             f"{self.login}:{self.password}".encode()
         ).decode()
+        self.auth_headers = {"Authorization": f"Basic {self.auth_string}"}
+        self.rate_limiter = get_rate_limiter(self.login)
         
         debug_print(f"🔑 DataForSeo client initialized with login: {self.login}")
     
     def _make_request(self, method: str, endpoint: str, data: Any = None) -> Dict:
         """Базовый метод для выполнения запросов к API"""
         url = f"{self.BASE_URL}{endpoint}"
-        headers = {
-            "Authorization": f"Basic {self.auth_string}",
-            "Content-Type": "application/json"
-        }
+        headers = self.auth_headers
+        timeout = (Config.DATAFORSEO_CONNECT_TIMEOUT, Config.DATAFORSEO_READ_TIMEOUT)
         
         debug_print(f"🌐 Выполняем {method} запрос к: {url}")
         if data:
             debug_print(f"📋 Размер данных: {len(str(data))} символов")
         
+        session = get_http_session()
+        self.rate_limiter.acquire()
+        
         try:
             if method == "GET":
-                response = requests.get(url, headers=headers)
+                response = session.get(url, headers=headers, timeout=timeout)
             elif method == "POST":
-                response = requests.post(url, headers=headers, json=data)
+                response = session.post(url, headers=headers, json=data, timeout=timeout)
             else:
                 raise ValueError(f"Unsupported method: {method}")
             
@@ -95,11 +227,15 @@ class DataForSeoClient:
             debug_print(f"✅ JSON распарсен успешно")
             return json_response
         except requests.exceptions.RequestException as e:
-            debug_print(f"❌ Error making request to DataForSeo: {e}")
+            logger.error(f"❌ Error making request to DataForSeo: {e}")
             if hasattr(e, 'response') and e.response is not None:
-                debug_print(f"❌ Response: {e.response.text}")
+                logger.error(f"❌ Response: {e.response.text}")
             raise
     
+    def pool_stats(self) -> Dict:
+        """Статистика общего пула HTTP-соединений"""
+        return get_pool_stats()
+    
     def get_keywords_for_keywords(
         self, 
         keywords: List[str], 
@@ -158,7 +294,7 @@ class DataForSeoClient:
         keywords_data = []
         
         if not response.get("tasks"):
-            debug_print("❌ No tasks in response")
+            logger.error("❌ No tasks in response")
             return keywords_data
         
         debug_print(f"📊 Количество tasks: {len(response['tasks'])}")
@@ -166,12 +302,12 @@ class DataForSeoClient:
         # Проходим по всем задачам
         for task in response.get("tasks", []):
             if task.get("status_code") != 20000:
-                debug_print(f"❌ Task error: {task.get('status_message')}")
+                logger.error(f"❌ Task error: {task.get('status_message')}")
                 continue
             
             # Получаем результаты из задачи
             if not task.get("result"):
-                debug_print("❌ No result in task")
+                logger.error("❌ No result in task")
                 continue
                 
             result_items = task.get("result", [])
@@ -207,7 +343,7 @@ class DataForSeoClient:
                         if three_months_ago > 0:
                             three_month_change = ((current - three_months_ago) / three_months_ago) * 100
                     except (IndexError, ZeroDivisionError, TypeError):
-                        debug_print("⚠️ Ошибка расчета three_month_change")
+                        logger.warning("⚠️ Ошибка расчета three_month_change")
                 
                 if monthly_searches and len(monthly_searches) >= 12:
                     try:
@@ -216,7 +352,7 @@ class DataForSeoClient:
                         if year_ago > 0:
                             yearly_change = ((current - year_ago) / year_ago) * 100
                     except (IndexError, ZeroDivisionError, TypeError):
-                        debug_print("⚠️ Ошибка расчета yearly_change")
+                        logger.warning("⚠️ Ошибка расчета yearly_change")
                 
                 # Определяем тип конкуренции
                 competition_map = {
@@ -358,13 +494,21 @@ class DataForSeoClient:
         
         return self._make_request("POST", endpoint, data)
 
-# Создаем глобальный экземпляр клиента
+# Общий экземпляр клиента: клиент не хранит состояния запросов (сессия и
+# лимитер общие), поэтому один экземпляр обслуживает все потоки. Сбрасывается
+# подпиской на config_manager при смене логина/пароля.
+_cached_client = None
+_cached_client_lock = threading.Lock()
+
+# Ключи настроек, при изменении которых клиент пересоздаётся
+CLIENT_SETTINGS_KEYS = ('dataforseo_login', 'dataforseo_password')
+
 def get_dataforseo_client(login: str = None, password: str = None) -> DataForSeoClient:
     """
-    Получает экземпляр DataForSeoClient с ленивой инициализацией
+    Получает общий экземпляр DataForSeoClient (создаётся при первом вызове)
     
     Args:
-        login: Логин (опционально, для тестов)
+        login: Логин (опционально, для тестов) - с ним создаётся отдельный клиент
         password: Пароль (опционально, для тестов)
     
     Returns:
@@ -373,25 +517,42 @@ def get_dataforseo_client(login: str = None, password: str = None) -> DataForSeo
     Raises:
         ValueError: Если не удалось получить credentials
     """
-    debug_print(f"🔧 get_dataforseo_client вызван")
-    try:
+    global _cached_client
+    if login and password:
         return DataForSeoClient(login, password)
-    except ValueError as e:
-        debug_print(f"❌ Ошибка инициализации DataForSeo client: {e}")
-        debug_print("💡 Настройте API ключи в разделе Settings")
-        raise e
-
-# Глобальная переменная для кэширования (опционально)
-_cached_client = None
+    
+    # Логин/пароль могли сменить в другом процессе (другой воркер gunicorn
+    # сохранил настройки) - подписка сбросит клиент до его выдачи
+    config_manager.refresh_if_changed()
+    
+    client = _cached_client
+    if client is not None:
+        return client
+    
+    with _cached_client_lock:
+        if _cached_client is None:
+            try:
+                _cached_client = DataForSeoClient()
+            except ValueError as e:
+                logger.error(f"❌ Ошибка инициализации DataForSeo client: {e}")
+                debug_print("💡 Настройте API ключи в разделе Settings")
+                raise e
+        return _cached_client
 
 def get_cached_dataforseo_client() -> DataForSeoClient:
-    """Получает кэшированный экземпляр клиента"""
-    global _cached_client
-    if _cached_client is None:
-        _cached_client = get_dataforseo_client()
-    return _cached_client
+    """Получает кэшированный экземпляр клиента (то же, что get_dataforseo_client())"""
+    return get_dataforseo_client()
 
 def clear_client_cache():
     """Очищает кэш клиента (для обновления настроек)"""
     global _cached_client
-    _cached_client = None
\ No newline at end of file
+    with _cached_client_lock:
+        _cached_client = None
+
+def _on_settings_changed(changed: set, settings: dict):
+    """Подписка на config_manager: новый логин/пароль - новый клиент"""
+    if changed & set(CLIENT_SETTINGS_KEYS):
+        clear_client_cache()
+        debug_print("🔄 DataForSeo credentials изменены - клиент будет создан заново")
+
+config_manager.subscribe(_on_settings_changed)
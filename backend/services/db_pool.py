@@ -0,0 +1,252 @@
+# backend/services/db_pool.py
+"""
+Общий пул соединений MySQL для всех blueprint'ов и фоновых потоков
+
+Соединения pymysql с DictCursor, как и раньше у get_db_connection(),
+поэтому вызывающий код не меняется: connection.close() возвращает
+соединение в пул, а не закрывает его.
+
+При смене настроек БД (reconfigure, вызывается подпиской на config_manager)
+новый пул создаётся и подменяет старый без перезапуска процесса; старый
+пул закрывается, когда в него вернутся все выданные соединения. Изменения,
+сохранённые другим процессом, замечаются при следующем get_connection().
+"""
+import threading
+import time
+import pymysql
+import pymysql.cursors
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from config import Config, USE_SAVED_SETTINGS
+from services.config_manager import config_manager
+from utils.logging_setup import get_logger
+
+logger = get_logger('db_pool')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Ключи настроек (config_manager) с параметрами подключения
+DB_SETTINGS_KEYS = ('db_host', 'db_port', 'db_name', 'db_user', 'db_password')
+
+# Результат последней смены настроек БД
+_last_reconfigure = None
+
+# Вызываются после подмены пула: callback(params)
+_reconfigure_listeners = []
+
+# Метрики ожидания соединения
+_stats_lock = threading.Lock()
+_stats = {
+    'checkouts': 0,
+    'timeouts': 0,
+    'wait_total': 0.0,
+    'wait_max': 0.0,
+    'reconnects': 0
+}
+
+
+def _current_params() -> dict:
+    """Параметры подключения из Config"""
+    return {
+        'host': Config.DB_HOST,
+        'port': Config.DB_PORT,
+        'user': Config.DB_USER,
+        'password': Config.DB_PASSWORD,
+        'database': Config.DB_NAME
+    }
+
+
+def _create_connection(params: dict):
+    """Новое физическое соединение с БД"""
+    return pymysql.connect(
+        **params,
+        connect_timeout=Config.DB_CONNECT_TIMEOUT,
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+
+def _build_pool(params: dict = None) -> QueuePool:
+    """Создаёт пул с ограниченным размером и recycle"""
+    params = dict(params or _current_params())
+
+    # Пул привязан к своим параметрам: старый пул при смене настроек
+    # продолжает работать со старой БД, пока не закроется
+    def creator():
+        return _create_connection(params)
+
+    pool = QueuePool(
+        creator,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_POOL_MAX_OVERFLOW,
+        timeout=Config.DB_POOL_TIMEOUT,
+        recycle=Config.DB_POOL_RECYCLE,
+        reset_on_return='rollback'
+    )
+
+    @event.listens_for(pool, 'checkout')
+    def ping_connection(dbapi_connection, connection_record, connection_proxy):
+        """Pre-ping: соединение, закрытое сервером, пул заменит новым"""
+        try:
+            dbapi_connection.ping(reconnect=False)
+        except Exception:
+            with _stats_lock:
+                _stats['reconnects'] += 1
+            raise exc.DisconnectionError()
+
+    logger.info(f"🔌 Пул MySQL создан: {params['host']}:{params['port']}/{params['database']} "
+                f"(размер: {Config.DB_POOL_SIZE}, overflow: {Config.DB_POOL_MAX_OVERFLOW})")
+    return pool
+
+
+def _drain_pool(pool: QueuePool):
+    """Закрывает старый пул, дождавшись возврата выданных соединений"""
+    deadline = time.monotonic() + Config.DB_POOL_DRAIN_TIMEOUT
+    while pool.checkedout() > 0 and time.monotonic() < deadline:
+        time.sleep(0.5)
+    if pool.checkedout() > 0:
+        logger.warning(f"⚠️ Старый пул MySQL закрыт с {pool.checkedout()} невозвращёнными соединениями")
+    pool.dispose()
+    logger.info("🔌 Старый пул MySQL закрыт")
+
+
+def reconfigure(host: str, port: int, name: str, user: str, password: str) -> dict:
+    """
+    Переключает приложение на другую БД без перезапуска процесса.
+    
+    Сначала проверяется подключение с новыми параметрами (при ошибке
+    остаётся старый пул и выбрасывается исключение), затем новый пул
+    подменяет старый. Запросы, уже взявшие соединение, дорабатывают
+    со старой БД; старый пул закрывается в фоне после их завершения.
+    """
+    global _pool, _last_reconfigure
+    params = {
+        'host': host,
+        'port': int(port),
+        'user': user,
+        'password': password or '',
+        'database': name
+    }
+    started = time.monotonic()
+
+    if _pool is not None and params == _current_params():
+        _last_reconfigure = {'success': True, 'error': None, 'database': f"{host}:{port}/{name}", 'elapsed_ms': 0}
+        return _last_reconfigure
+
+    try:
+        test_connection = _create_connection(params)
+        test_connection.ping(reconnect=False)
+        test_connection.close()
+    except Exception as e:
+        _last_reconfigure = {'success': False, 'error': str(e), 'database': f"{host}:{port}/{name}"}
+        logger.error(f"❌ Не удалось подключиться к новой БД {host}:{port}/{name}: {e}")
+        raise
+
+    new_pool = _build_pool(params)
+    with _pool_lock:
+        old_pool = _pool
+        _pool = new_pool
+        Config.set_db_settings(host, int(port), name, user, password or '')
+
+    if old_pool is not None:
+        threading.Thread(target=_drain_pool, args=(old_pool,), name='db-pool-drain', daemon=True).start()
+
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+    _last_reconfigure = {'success': True, 'error': None, 'database': f"{host}:{port}/{name}", 'elapsed_ms': elapsed_ms}
+    logger.info(f"✅ Пул MySQL переключён на {host}:{port}/{name} за {elapsed_ms} мс")
+
+    for callback in list(_reconfigure_listeners):
+        try:
+            callback(params)
+        except Exception as e:
+            logger.exception(f"⚠️ Ошибка обработчика смены БД {getattr(callback, '__name__', callback)}: {e}")
+    return _last_reconfigure
+
+
+def on_reconfigure(callback):
+    """Регистрирует callback(params), вызываемый после переключения пула на новую БД"""
+    if callback not in _reconfigure_listeners:
+        _reconfigure_listeners.append(callback)
+    return callback
+
+
+def get_last_reconfigure():
+    """Результат последнего reconfigure() или None"""
+    return _last_reconfigure
+
+
+def _on_settings_changed(changed: set, settings: dict):
+    """Подписка на config_manager: новые настройки БД применяются сразу"""
+    if not USE_SAVED_SETTINGS or not changed & set(DB_SETTINGS_KEYS):
+        return
+    try:
+        reconfigure(
+            settings.get('db_host', 'localhost'),
+            int(settings.get('db_port', 3306)),
+            settings.get('db_name', 'keyword_lock'),
+            settings.get('db_user', 'root'),
+            settings.get('db_password', '')
+        )
+    except Exception:
+        # Ошибка уже в get_last_reconfigure(), приложение работает со старой БД
+        pass
+
+
+config_manager.subscribe(_on_settings_changed)
+
+
+def get_pool() -> QueuePool:
+    """Возвращает общий пул (ленивая инициализация)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _build_pool()
+    return _pool
+
+
+def get_connection():
+    """
+    Берёт соединение из пула
+    Ждёт не дольше DB_POOL_TIMEOUT, затем выбрасывает sqlalchemy.exc.TimeoutError
+    """
+    # Настройки БД могли сменить в другом процессе - подписка подменит пул
+    config_manager.refresh_if_changed()
+    pool = get_pool()
+    started = time.monotonic()
+    try:
+        connection = pool.connect()
+    except exc.TimeoutError:
+        with _stats_lock:
+            _stats['timeouts'] += 1
+        logger.error(f"❌ Пул MySQL исчерпан: нет свободного соединения за {Config.DB_POOL_TIMEOUT} сек")
+        raise
+
+    waited = time.monotonic() - started
+    with _stats_lock:
+        _stats['checkouts'] += 1
+        _stats['wait_total'] += waited
+        _stats['wait_max'] = max(_stats['wait_max'], waited)
+    return connection
+
+
+def get_pool_stats() -> dict:
+    """Статистика пула для /api/health"""
+    pool = get_pool()
+    with _stats_lock:
+        stats = dict(_stats)
+
+    checkouts = stats['checkouts']
+    return {
+        'database': f"{Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}",
+        'size': pool.size(),
+        'max_overflow': Config.DB_POOL_MAX_OVERFLOW,
+        'in_use': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'checkouts': checkouts,
+        'timeouts': stats['timeouts'],
+        'reconnects': stats['reconnects'],
+        'wait_avg_ms': round(stats['wait_total'] / checkouts * 1000, 2) if checkouts else 0,
+        'wait_max_ms': round(stats['wait_max'] * 1000, 2)
+    }
@@ -0,0 +1,456 @@
+# backend/services/job_queue.py
+"""
+Очередь фоновых задач в таблице background_jobs
+
+Задача переживает перезапуск процесса: исполнитель (JobWorker) забирает её
+через SELECT ... FOR UPDATE SKIP LOCKED, раз в JOB_HEARTBEAT_INTERVAL
+отмечается в heartbeat_at, а обработчик сохраняет checkpoint после каждого
+шага. Задачу, исполнитель которой пропал, requeue_stale_jobs() возвращает
+в очередь, и новый исполнитель продолжает её с checkpoint.
+
+Исполнители работают в потоках Flask-процесса (start_embedded_workers)
+и/или отдельными процессами (scripts/job_worker.py).
+
+Обработчики регистрируются декоратором @job_handler('тип') и получают
+JobContext: job.payload, job.checkpoint, job.progress(), job.save_checkpoint().
+Прогресс и завершение задачи публикуются в services/progress_bus.py для SSE.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from config import Config
+from services.db_pool import get_connection
+from services.progress_bus import progress_bus
+from utils.logging_setup import get_logger, job_log_context
+
+logger = get_logger('jobs')
+
+JOB_ACTIVE_STATUSES = ('queued', 'running')
+JOB_FINISHED_STATUSES = ('complete', 'error', 'cancelled')
+
+_handlers = {}
+
+# Будит исполнители этого процесса при постановке новой задачи
+_wakeup = threading.Event()
+
+_embedded_workers = []
+_embedded_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем или перехвачена другим исполнителем"""
+
+
+def job_handler(job_type: str):
+    """Регистрирует обработчик задач типа job_type"""
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def _to_json(value):
+    return json.dumps(value, ensure_ascii=False, default=str) if value is not None else None
+
+
+def _from_json(value):
+    if isinstance(value, (str, bytes)):
+        return json.loads(value)
+    return value
+
+
+def _execute(query: str, params=None, fetch: str = None):
+    """Один запрос на соединении из пула с коммитом"""
+    connection = get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        if fetch == 'one':
+            result = cursor.fetchone()
+        elif fetch == 'all':
+            result = cursor.fetchall()
+        else:
+            result = cursor.rowcount
+        connection.commit()
+        cursor.close()
+        return result
+    finally:
+        connection.close()
+
+
+# ==================== ПОСТАНОВКА И УПРАВЛЕНИЕ ====================
+
+def enqueue_job(job_type: str, payload: dict, job_id: str = None, priority: int = 0,
+                total: int = 0, checkpoint: dict = None, max_attempts: int = None) -> str:
+    """Ставит задачу в очередь и возвращает её id"""
+    job_id = job_id or str(uuid.uuid4())
+    _execute("""
+        INSERT INTO background_jobs (
+            id, job_type, status, priority, payload, checkpoint,
+            progress_current, progress_total, progress_keyword,
+            attempts, max_attempts, cancel_requested, created_at, updated_at
+        ) VALUES (%s, %s, 'queued', %s, %s, %s, 0, %s, '', 0, %s, 0, NOW(), NOW())
+    """, (
+        job_id, job_type, priority, _to_json(payload), _to_json(checkpoint),
+        total, max_attempts or Config.JOB_MAX_ATTEMPTS
+    ))
+    _wakeup.set()
+    logger.info(f"📥 Задача {job_type} {job_id} поставлена в очередь (приоритет {priority})")
+    return job_id
+
+
+def requeue_job(job_id: str, checkpoint: dict = None) -> bool:
+    """
+    Возвращает завершённую задачу в очередь. Отменённые задачи и задачи,
+    исчерпавшие max_attempts, не возвращаются; счётчик попыток не сбрасывается.
+    False - задача активна, отменена, исчерпала попытки или не найдена.
+    """
+    updated = _execute("""
+        UPDATE background_jobs
+        SET status = 'queued', checkpoint = COALESCE(%s, checkpoint),
+            worker_id = NULL, error = NULL, finished_at = NULL, updated_at = NOW()
+        WHERE id = %s AND status IN ('complete', 'error')
+        AND cancel_requested = 0 AND attempts < max_attempts
+    """, (_to_json(checkpoint), job_id))
+    if updated:
+        _wakeup.set()
+    return updated > 0
+
+
+def cancel_job(job_id: str):
+    """
+    Отмена задачи: ожидающая отменяется сразу, выполняющаяся - при следующем
+    heartbeat исполнителя. Возвращает статус задачи или None, если её нет.
+    """
+    _execute("""
+        UPDATE background_jobs
+        SET status = IF(status = 'queued', 'cancelled', status),
+            finished_at = IF(status = 'cancelled', NOW(), finished_at),
+            cancel_requested = 1, updated_at = NOW()
+        WHERE id = %s AND status IN ('queued', 'running')
+    """, (job_id,))
+    job = get_job(job_id)
+    if job and job['status'] == 'cancelled':
+        progress_bus.publish(job_id, job_event(job))
+    return job['status'] if job else None
+
+
+def get_job(job_id: str):
+    """Задача по id (JSON-поля разобраны) или None"""
+    row = _execute("SELECT * FROM background_jobs WHERE id = %s", (job_id,), fetch='one')
+    if row:
+        for field in ('payload', 'checkpoint', 'result'):
+            row[field] = _from_json(row[field])
+    return row
+
+
+def job_event(job: dict) -> dict:
+    """Событие SSE (как в progress_bus) по строке get_job_progress / get_job"""
+    status = job['status']
+    if status == 'complete':
+        result = job['result'] or {}
+        return {'type': 'complete', 'message': result.get('message', 'Completed'), 'result': result}
+    if status in ('error', 'cancelled'):
+        return {'type': 'error', 'message': job['error'] or ('Задача отменена' if status == 'cancelled' else 'Unknown error')}
+    return {
+        'type': 'progress',
+        'current': job['progress_current'],
+        'total': job['progress_total'],
+        'keyword': job['progress_keyword']
+    }
+
+
+def get_job_progress(job_id: str):
+    """Только статус и прогресс задачи (её часто опрашивает SSE)"""
+    row = _execute("""
+        SELECT status, progress_current, progress_total, progress_keyword, result, error
+        FROM background_jobs WHERE id = %s
+    """, (job_id,), fetch='one')
+    if row:
+        row['result'] = _from_json(row['result'])
+    return row
+
+
+def list_jobs(status: str = None, limit: int = 50) -> list:
+    """Последние задачи без payload/checkpoint"""
+    where = "WHERE status = %s" if status else ""
+    params = ([status] if status else []) + [limit]
+    return _execute(f"""
+        SELECT id, job_type, status, priority, progress_current, progress_total,
+               progress_keyword, error, attempts, cancel_requested, worker_id,
+               created_at, started_at, finished_at
+        FROM background_jobs
+        {where}
+        ORDER BY created_at DESC
+        LIMIT %s
+    """, params, fetch='all')
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Возвращает в очередь задачи, исполнитель которых не отмечался дольше
+    JOB_STALE_TIMEOUT; после max_attempts попыток задача завершается с ошибкой
+    """
+    connection = get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE background_jobs
+            SET status = 'error', error = 'Исполнитель задачи остановился', finished_at = NOW(), updated_at = NOW()
+            WHERE status = 'running'
+            AND heartbeat_at < NOW() - INTERVAL %s SECOND
+            AND (attempts >= max_attempts OR cancel_requested = 1)
+        """, (Config.JOB_STALE_TIMEOUT,))
+        cursor.execute("""
+            UPDATE background_jobs
+            SET status = 'queued', worker_id = NULL, updated_at = NOW()
+            WHERE status = 'running'
+            AND heartbeat_at < NOW() - INTERVAL %s SECOND
+        """, (Config.JOB_STALE_TIMEOUT,))
+        requeued = cursor.rowcount
+        connection.commit()
+        cursor.close()
+    finally:
+        connection.close()
+
+    if requeued:
+        logger.warning(f"🔁 Возвращено в очередь зависших задач: {requeued}")
+        _wakeup.set()
+    return requeued
+
+
+def release_process_jobs() -> int:
+    """
+    Возвращает в очередь задачи, числившиеся за этим процессом
+    (после перезапуска через os.execv pid тот же, а потоки уже мертвы)
+    """
+    released = _execute("""
+        UPDATE background_jobs
+        SET status = 'queued', worker_id = NULL, updated_at = NOW()
+        WHERE status = 'running' AND worker_id LIKE %s
+    """, (f"{_process_prefix()}:%",))
+    if released:
+        logger.warning(f"🔁 Возвращено в очередь задач прошлого запуска процесса: {released}")
+    return released
+
+
+def prune_finished_jobs(days: int) -> int:
+    """Удаляет завершённые задачи старше days дней"""
+    return _execute("""
+        DELETE FROM background_jobs
+        WHERE status IN ('complete', 'error', 'cancelled')
+        AND finished_at < NOW() - INTERVAL %s DAY
+    """, (days,))
+
+
+# ==================== ИСПОЛНЕНИЕ ====================
+
+def _process_prefix() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobContext:
+    """Выполняемая задача, передаётся обработчику"""
+
+    def __init__(self, row: dict, worker_id: str):
+        self.id = row['id']
+        self.job_type = row['job_type']
+        self.payload = _from_json(row['payload']) or {}
+        self.checkpoint = _from_json(row['checkpoint']) or {}
+        self.attempts = row['attempts']
+        self.worker_id = worker_id
+        self.cancelled = False
+        self.lost = False
+
+    def check_cancelled(self):
+        """Прерывает обработчик, если задачу отменили"""
+        if self.cancelled or self.lost:
+            raise JobCancelled(self.id)
+
+    def progress(self, current: int, total: int, keyword: str = ''):
+        """Сохраняет прогресс (его читают SSE и /api/jobs)"""
+        self.check_cancelled()
+        _execute("""
+            UPDATE background_jobs
+            SET progress_current = %s, progress_total = %s, progress_keyword = %s, updated_at = NOW()
+            WHERE id = %s AND worker_id = %s
+        """, (current, total, (keyword or '')[:500], self.id, self.worker_id))
+        progress_bus.publish(self.id, {'type': 'progress', 'current': current, 'total': total, 'keyword': keyword or ''})
+
+    def save_checkpoint(self, checkpoint: dict):
+        """Сохраняет состояние, с которого задача продолжится после сбоя"""
+        self.checkpoint = checkpoint
+        _execute("""
+            UPDATE background_jobs SET checkpoint = %s, updated_at = NOW()
+            WHERE id = %s AND worker_id = %s
+        """, (_to_json(checkpoint), self.id, self.worker_id))
+
+    def heartbeat(self):
+        """Отметка исполнителя и проверка отмены"""
+        row = None
+        connection = get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE background_jobs SET heartbeat_at = NOW()
+                WHERE id = %s AND worker_id = %s AND status = 'running'
+            """, (self.id, self.worker_id))
+            cursor.execute("""
+                SELECT status, worker_id, cancel_requested FROM background_jobs WHERE id = %s
+            """, (self.id,))
+            row = cursor.fetchone()
+            connection.commit()
+            cursor.close()
+        finally:
+            connection.close()
+
+        if not row or row['worker_id'] != self.worker_id or row['status'] != 'running':
+            self.lost = True
+        elif row['cancel_requested']:
+            self.cancelled = True
+
+    def _finish(self, status: str, result=None, error: str = None):
+        finished = _execute("""
+            UPDATE background_jobs
+            SET status = %s, result = %s, error = %s, finished_at = NOW(), updated_at = NOW()
+            WHERE id = %s AND worker_id = %s
+        """, (status, _to_json(result), error, self.id, self.worker_id))
+        if finished:
+            progress_bus.publish(self.id, job_event({'status': status, 'result': result, 'error': error}))
+
+
+def claim_job(worker_id: str, job_types=None):
+    """
+    Забирает следующую задачу из очереди (приоритет, затем время постановки)
+    SKIP LOCKED: параллельные исполнители не ждут друг друга и не берут одну задачу.
+    """
+    types = list(job_types or _handlers)
+    if not types:
+        return None
+
+    connection = get_connection()
+    try:
+        cursor = connection.cursor()
+        connection.begin()
+        placeholders = ','.join(['%s'] * len(types))
+        cursor.execute(f"""
+            SELECT id FROM background_jobs
+            WHERE status = 'queued' AND job_type IN ({placeholders})
+            ORDER BY priority DESC, created_at, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, types)
+        row = cursor.fetchone()
+        if not row:
+            connection.commit()
+            return None
+
+        cursor.execute("""
+            UPDATE background_jobs
+            SET status = 'running', worker_id = %s, attempts = attempts + 1,
+                started_at = COALESCE(started_at, NOW()), heartbeat_at = NOW(), updated_at = NOW()
+            WHERE id = %s
+        """, (worker_id, row['id']))
+        cursor.execute("SELECT * FROM background_jobs WHERE id = %s", (row['id'],))
+        job = cursor.fetchone()
+        connection.commit()
+        cursor.close()
+        return job
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+class JobWorker:
+    """Цикл исполнителя: забирает задачи и выполняет их обработчики"""
+
+    def __init__(self, name: str = None, job_types=None):
+        self.worker_id = f"{_process_prefix()}:{name or threading.get_ident()}"
+        self.job_types = job_types
+        self._stop = threading.Event()
+        self._last_stale_check = 0
+
+    def stop(self):
+        self._stop.set()
+        _wakeup.set()
+
+    def run(self):
+        logger.info(f"👷 Исполнитель задач {self.worker_id} запущен")
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - self._last_stale_check > Config.JOB_STALE_TIMEOUT / 2:
+                    self._last_stale_check = time.monotonic()
+                    requeue_stale_jobs()
+
+                row = claim_job(self.worker_id, self.job_types)
+                if row:
+                    self.run_job(row)
+                    continue
+            except Exception as e:
+                logger.exception(f"❌ Исполнитель {self.worker_id}: {e}")
+
+            _wakeup.wait(Config.JOB_POLL_INTERVAL)
+            _wakeup.clear()
+        logger.info(f"👷 Исполнитель задач {self.worker_id} остановлен")
+
+    def run_job(self, row: dict):
+        job = JobContext(row, self.worker_id)
+        handler = _handlers.get(job.job_type)
+        if handler is None:
+            job._finish('error', error=f"Нет обработчика для задачи {job.job_type}")
+            return
+
+        with job_log_context(job.id):
+            logger.info(f"▶️ Задача {job.job_type} {job.id} (попытка {job.attempts})")
+            done = threading.Event()
+
+            def heartbeat_loop():
+                while not done.wait(Config.JOB_HEARTBEAT_INTERVAL):
+                    try:
+                        job.heartbeat()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Heartbeat задачи {job.id}: {e}")
+
+            heartbeat_thread = threading.Thread(target=heartbeat_loop, name=f"job-heartbeat-{job.id}", daemon=True)
+            heartbeat_thread.start()
+            try:
+                result = handler(job)
+                job._finish('complete', result=result)
+                logger.info(f"✅ Задача {job.id} завершена")
+            except JobCancelled:
+                if job.lost:
+                    logger.warning(f"⚠️ Задача {job.id} перехвачена другим исполнителем")
+                else:
+                    job._finish('cancelled', error='Задача отменена')
+                    logger.info(f"⏹️ Задача {job.id} отменена")
+            except Exception as e:
+                logger.exception(f"❌ Задача {job.id}: {e}")
+                job._finish('error', error=str(e))
+            finally:
+                done.set()
+                heartbeat_thread.join()
+
+
+def start_embedded_workers(count: int = None) -> list:
+    """Запускает исполнителей в потоках текущего процесса (один раз на процесс)"""
+    count = Config.JOB_WORKER_THREADS if count is None else count
+    with _embedded_lock:
+        if _embedded_workers or count <= 0:
+            return _embedded_workers
+
+        try:
+            release_process_jobs()
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось проверить задачи прошлого запуска: {e}")
+
+        for index in range(count):
+            worker = JobWorker(name=f"embedded-{index}")
+            thread = threading.Thread(target=worker.run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            _embedded_workers.append(worker)
+    return _embedded_workers
@@ -0,0 +1,101 @@
+# backend/services/payload_store.py
+"""
+Хранилище сырых SERP-данных (serp_raw_payloads)
+
+raw_response и parsed_items хранятся один раз, сжатыми zlib, по ключу
+SHA-256 от содержимого. serp_logs и serp_analysis_history ссылаются на
+них колонками *_hash, поэтому одинаковые данные не дублируются.
+
+Формат blob совместим с MySQL COMPRESS(): 4 байта длины исходной строки
+(little-endian) + поток zlib. Благодаря этому списки могут распаковывать
+данные прямо в SQL через UNCOMPRESS() (см. payload_sql).
+"""
+import hashlib
+import json
+import struct
+import zlib
+
+COMPRESSION_LEVEL = 6
+PAYLOADS_TABLE = 'serp_raw_payloads'
+
+
+def serialize_payload(payload) -> str:
+    """Строка JSON для хранения (строки сохраняются как есть)"""
+    if payload is None or isinstance(payload, str):
+        return payload
+    if isinstance(payload, bytes):
+        return payload.decode('utf-8')
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def payload_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress_payload(text: str) -> bytes:
+    """Сжатие в формате MySQL COMPRESS()"""
+    raw = text.encode('utf-8')
+    if not raw:
+        return b''
+    return struct.pack('<I', len(raw)) + zlib.compress(raw, COMPRESSION_LEVEL)
+
+
+def decompress_payload(blob: bytes) -> str:
+    if not blob:
+        return ''
+    return zlib.decompress(bytes(blob[4:])).decode('utf-8')
+
+
+def store_payload(cursor, payload):
+    """
+    Сохраняет данные и возвращает их hash (None для пустых данных)
+    Повторное сохранение того же содержимого ничего не пишет.
+    """
+    text = serialize_payload(payload)
+    if text is None:
+        return None
+
+    digest = payload_hash(text)
+    blob = compress_payload(text)
+    cursor.execute(f"""
+        INSERT INTO {PAYLOADS_TABLE} (hash, size_raw, size_compressed, data, created_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE hash = hash
+    """, (digest, len(text.encode('utf-8')), len(blob), blob))
+    return digest
+
+
+def load_payload(cursor, digest):
+    """Распакованные данные по hash (None, если записи нет)"""
+    if not digest:
+        return None
+    cursor.execute(f"SELECT data FROM {PAYLOADS_TABLE} WHERE hash = %s", (digest,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return decompress_payload(row['data'])
+
+
+def resolve_payload(cursor, row: dict, column: str):
+    """
+    Значение колонки строки с учётом хранилища
+    Для новых записей данные берутся по {column}_hash, для старых - из самой колонки.
+    """
+    digest = row.get(f'{column}_hash')
+    if digest:
+        text = load_payload(cursor, digest)
+        if text is not None:
+            return text
+    return row.get(column)
+
+
+def payload_sql(column: str, alias: str = '') -> str:
+    """
+    SQL-выражение, возвращающее распакованное значение колонки
+    Используется в списках, где данные нужны для многих строк сразу.
+    """
+    prefix = f"{alias}." if alias else ''
+    return f"""COALESCE(
+        (SELECT CONVERT(UNCOMPRESS(p.data) USING utf8mb4) FROM {PAYLOADS_TABLE} p WHERE p.hash = {prefix}{column}_hash),
+        {prefix}{column}
+    )"""
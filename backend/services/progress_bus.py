@@ -0,0 +1,102 @@
+# backend/services/progress_bus.py
+"""
+Шина событий прогресса фоновых задач для SSE
+
+Исполнитель задачи публикует событие (publish), а все SSE-подписчики
+этой задачи сразу просыпаются на её Condition - без опроса по таймеру.
+Каждое событие получает последовательный id: по нему браузер после
+переподключения (заголовок Last-Event-ID) получает только пропущенные события.
+
+События хранятся в services/progress_store.py (Config.PROGRESS_STORE):
+- memory - в памяти процесса. Задачи, которые выполняет другой процесс
+  (scripts/job_worker.py), SSE подхватывает из background_jobs и публикует
+  сюда же (см. apply_serp_sse).
+- mysql - общая таблица для всех процессов; события из других процессов
+  подписчики забирают раз в PROGRESS_POLL_INTERVAL.
+"""
+import threading
+import time
+from services.progress_store import create_progress_store
+
+
+class _Waiters:
+    """Подписчики одной задачи в этом процессе"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.subscribers = 0
+
+
+class ProgressBus:
+    """Fan-out событий прогресса по task_id"""
+
+    def __init__(self, store=None):
+        self._store = store
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        # Создаётся при первом обращении: Config.PROGRESS_STORE уже прочитан
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = create_progress_store()
+        return self._store
+
+    @property
+    def shared(self) -> bool:
+        """События видны всем процессам (не нужно сверять их с background_jobs)"""
+        return self.store.shared
+
+    def publish(self, task_id: str, event: dict) -> int:
+        """Сохраняет событие задачи и будит подписчиков; возвращает id события"""
+        with self._lock:
+            active = {key for key, waiters in self._waiters.items() if waiters.subscribers}
+            waiters = self._waiters.get(task_id)
+        event_id = self.store.append(task_id, event, active)
+        if waiters is not None:
+            with waiters.condition:
+                waiters.generation += 1
+                waiters.condition.notify_all()
+        return event_id
+
+    def last_event(self, task_id: str):
+        """(id, событие) последнего события задачи или None"""
+        return self.store.last(task_id)
+
+    def wait(self, task_id: str, last_id: int, timeout: float) -> list:
+        """События с id > last_id; если их нет - ждёт до timeout секунд"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            waiters = self._waiters.setdefault(task_id, _Waiters())
+            waiters.subscribers += 1
+        try:
+            while True:
+                with waiters.condition:
+                    generation = waiters.generation
+
+                events = self.store.since(task_id, last_id)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+
+                # Общее хранилище опрашиваем: события других процессов не будят Condition
+                if self.store.poll_interval:
+                    remaining = min(remaining, self.store.poll_interval)
+                with waiters.condition:
+                    waiters.condition.wait_for(lambda: waiters.generation != generation, timeout=remaining)
+        finally:
+            with self._lock:
+                waiters.subscribers -= 1
+                if not waiters.subscribers:
+                    self._waiters.pop(task_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscribers = sum(waiters.subscribers for waiters in self._waiters.values())
+        return {**self.store.stats(), 'subscribers': subscribers}
+
+
+progress_bus = ProgressBus()
@@ -0,0 +1,196 @@
+# backend/services/progress_store.py
+"""
+Хранилища событий прогресса задач для services/progress_bus.py
+
+- MemoryProgressStore (по умолчанию): события в памяти процесса, кольцевой
+  буфер на задачу, завершённые и заброшенные задачи удаляются по TTL.
+- SqlProgressStore: события в таблице background_job_events. Id событий
+  общие для всех процессов, поэтому SSE может обслуживать любой воркер
+  gunicorn, а Last-Event-ID работает после переподключения к другому воркеру.
+
+Выбор - Config.PROGRESS_STORE ('memory' / 'mysql').
+"""
+import json
+import threading
+import time
+from collections import deque
+from config import Config
+from services.db_pool import get_connection
+
+# Сколько последних событий задачи хранить в памяти для Last-Event-ID
+PROGRESS_BUFFER_SIZE = 256
+
+# Не больше стольких задач в памяти (сначала вытесняются самые старые)
+PROGRESS_MAX_TASKS = 1000
+
+TERMINAL_EVENT_TYPES = ('complete', 'error')
+
+
+class _Topic:
+    """События одной задачи"""
+
+    def __init__(self):
+        self.events = deque(maxlen=PROGRESS_BUFFER_SIZE)
+        self.last_id = 0
+        self.updated_at = time.monotonic()
+        self.finished_at = None
+
+
+class MemoryProgressStore:
+    """События в памяти процесса с TTL"""
+
+    # События видны только этому процессу
+    shared = False
+    # Новые события всегда публикуются в этом же процессе - опрашивать не нужно
+    poll_interval = None
+
+    def __init__(self, ttl: float = None):
+        self.ttl = Config.PROGRESS_EVENT_TTL if ttl is None else ttl
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, active: set):
+        """Удаляет завершённые и заброшенные задачи (вызывается под _lock)"""
+        now = time.monotonic()
+        expired = [
+            task_id for task_id, topic in self._topics.items()
+            if task_id not in active and (
+                (topic.finished_at is not None and now - topic.finished_at > self.ttl)
+                or now - topic.updated_at > self.ttl * 6
+            )
+        ]
+        for task_id in expired:
+            del self._topics[task_id]
+
+        overflow = len(self._topics) - PROGRESS_MAX_TASKS
+        if overflow > 0:
+            idle = sorted(
+                (topic.updated_at, task_id) for task_id, topic in self._topics.items()
+                if task_id not in active
+            )
+            for _, task_id in idle[:overflow]:
+                del self._topics[task_id]
+
+    def append(self, task_id: str, event: dict, active: set = frozenset()) -> int:
+        with self._lock:
+            topic = self._topics.get(task_id)
+            if topic is None:
+                self._evict(active)
+                topic = self._topics[task_id] = _Topic()
+            topic.last_id += 1
+            topic.events.append((topic.last_id, event))
+            topic.updated_at = time.monotonic()
+            if event.get('type') in TERMINAL_EVENT_TYPES:
+                topic.finished_at = topic.updated_at
+            return topic.last_id
+
+    def since(self, task_id: str, last_id: int) -> list:
+        """
+        События с id > last_id. Если буфер уже не содержит всех пропущенных
+        событий (или last_id выдан другим процессом) - только последнее:
+        это актуальное состояние задачи.
+        """
+        with self._lock:
+            topic = self._topics.get(task_id)
+            if topic is None or not topic.events:
+                return []
+            if last_id > topic.last_id:
+                return [topic.events[-1]]
+            events = [(event_id, event) for event_id, event in topic.events if event_id > last_id]
+            if events and last_id and events[0][0] != last_id + 1:
+                return events[-1:]
+            return events
+
+    def last(self, task_id: str):
+        with self._lock:
+            topic = self._topics.get(task_id)
+            return topic.events[-1] if topic and topic.events else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'store': 'memory', 'tasks': len(self._topics)}
+
+
+class SqlProgressStore:
+    """События в таблице background_job_events (общие для всех процессов)"""
+
+    shared = True
+
+    def __init__(self, poll_interval: float = None):
+        self.poll_interval = Config.PROGRESS_POLL_INTERVAL if poll_interval is None else poll_interval
+
+    def _execute(self, query: str, params, fetch: str = None):
+        connection = get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            if fetch == 'all':
+                result = cursor.fetchall()
+            elif fetch == 'one':
+                result = cursor.fetchone()
+            else:
+                result = cursor.lastrowid
+            connection.commit()
+            cursor.close()
+            return result
+        finally:
+            connection.close()
+
+    def append(self, task_id: str, event: dict, active: set = frozenset()) -> int:
+        return self._execute("""
+            INSERT INTO background_job_events (job_id, event, created_at)
+            VALUES (%s, %s, NOW())
+        """, (task_id, json.dumps(event, ensure_ascii=False, default=str)))
+
+    @staticmethod
+    def _decode(row) -> tuple:
+        event = row['event']
+        return row['id'], json.loads(event) if isinstance(event, (str, bytes)) else event
+
+    def since(self, task_id: str, last_id: int) -> list:
+        rows = self._execute("""
+            SELECT id, event FROM background_job_events
+            WHERE job_id = %s AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (task_id, last_id, PROGRESS_BUFFER_SIZE + 1), fetch='all')
+        events = [self._decode(row) for row in rows]
+        # Отстали больше чем на буфер - достаточно актуального состояния
+        if len(events) > PROGRESS_BUFFER_SIZE:
+            return [self.last(task_id)]
+        return events
+
+    def last(self, task_id: str):
+        row = self._execute("""
+            SELECT id, event FROM background_job_events
+            WHERE job_id = %s
+            ORDER BY id DESC
+            LIMIT 1
+        """, (task_id,), fetch='one')
+        return self._decode(row) if row else None
+
+    def stats(self) -> dict:
+        return {'store': 'mysql', 'poll_interval': self.poll_interval}
+
+
+PROGRESS_STORES = {
+    'memory': MemoryProgressStore,
+    'mysql': SqlProgressStore,
+}
+
+
+def create_progress_store(name: str = None):
+    """Хранилище по имени из Config.PROGRESS_STORE"""
+    name = (name or Config.PROGRESS_STORE).lower()
+    if name not in PROGRESS_STORES:
+        raise ValueError(f"Unknown PROGRESS_STORE: {name} (expected: {', '.join(PROGRESS_STORES)})")
+    return PROGRESS_STORES[name]()
+
+
+def prune_progress_events(cursor, hours: int) -> int:
+    """Удаляет события SqlProgressStore старше hours часов (для cron-скриптов)"""
+    cursor.execute("""
+        DELETE FROM background_job_events
+        WHERE created_at < NOW() - INTERVAL %s HOUR
+    """, (hours,))
+    return cursor.rowcount
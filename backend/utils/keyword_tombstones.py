@@ -0,0 +1,31 @@
+# backend/utils/keyword_tombstones.py
+"""
+Следы (tombstones) окончательно удалённых ключевых слов
+
+Мягкое удаление (status = 'Removed') видно в delta-синхронизации по updated_at,
+а строки, удалённые через DELETE, исчезают бесследно - поэтому перед
+DELETE их id записываются в keyword_tombstones.
+"""
+
+
+def record_keyword_tombstones(cursor, where_sql: str, params) -> int:
+    """
+    Записывает следы для строк keywords, подходящих под where_sql
+    Вызывать в той же транзакции непосредственно перед DELETE с тем же условием.
+    """
+    cursor.execute(f"""
+        INSERT INTO keyword_tombstones (keyword_id, ad_group_id, deleted_at)
+        SELECT id, ad_group_id, NOW()
+        FROM keywords
+        WHERE {where_sql}
+    """, params)
+    return cursor.rowcount
+
+
+def prune_keyword_tombstones(cursor, days: int) -> int:
+    """Удаляет следы старше days дней (клиенты с более старым токеном делают полную загрузку)"""
+    cursor.execute("""
+        DELETE FROM keyword_tombstones
+        WHERE deleted_at < NOW() - INTERVAL %s DAY
+    """, (days,))
+    return cursor.rowcount
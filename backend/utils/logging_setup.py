@@ -0,0 +1,136 @@
+# backend/utils/logging_setup.py
+"""
+Логирование приложения
+
+Логгеры модулей - дочерние к 'keylock' (get_logger('dataforseo') ->
+'keylock.dataforseo'). Записи кладутся в очередь (QueueHandler), а в stdout
+их пишет отдельный поток QueueListener: запрос или SERP-задача не ждут
+вывода и flush на каждой строке.
+
+Настройки (Config): LOG_LEVEL - уровень (INFO по умолчанию),
+LOG_FORMAT - 'text' или 'json' (одна JSON-запись на строку для сборщиков логов).
+
+Подробная трассировка горячих циклов (разбор каждого элемента SERP)
+по умолчанию выключена и включается на время задачи:
+    with job_log_context(job.id, trace=True): ...
+Внутри блока записи получают поле job_id (видно в JSON-формате).
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import Config
+
+ROOT_LOGGER = 'keylock'
+
+# Трассировка включена и id задачи в текущем потоке
+_trace_enabled = contextvars.ContextVar('trace_enabled', default=False)
+_job_id = contextvars.ContextVar('job_id', default=None)
+
+_setup_lock = threading.Lock()
+_listener = None
+
+# Стандартные поля LogRecord - всё остальное из extra= попадает в JSON
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-запись на строку"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _JobContextFilter(logging.Filter):
+    """Добавляет job_id текущей задачи в запись"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        job_id = _job_id.get()
+        if job_id is not None:
+            record.job_id = job_id
+        return True
+
+
+def _build_formatter(fmt: str) -> logging.Formatter:
+    if fmt == 'json':
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s %(levelname)-7s [%(name)s] %(message)s')
+
+
+def setup_logging(level: str = None, fmt: str = None):
+    """Настраивает логгер 'keylock' (повторный вызов ничего не делает)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(_build_formatter((fmt or Config.LOG_FORMAT).lower()))
+
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel((level or Config.LOG_LEVEL).upper())
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(_JobContextFilter())
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        # Трассировка проверяется флагом задачи, а не уровнем логгера
+        logging.getLogger(f"{ROOT_LOGGER}.trace").setLevel(logging.DEBUG)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер модуля: get_logger('dataforseo') -> 'keylock.dataforseo'"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+_trace_logger = logging.getLogger(f"{ROOT_LOGGER}.trace")
+
+
+def is_trace_enabled() -> bool:
+    return _trace_enabled.get() or Config.SERP_TRACE
+
+
+@contextmanager
+def job_log_context(job_id: str = None, trace: bool = False):
+    """id задачи в записях и подробная трассировка на время блока"""
+    job_token = _job_id.set(job_id)
+    trace_token = _trace_enabled.set(bool(trace))
+    try:
+        yield
+    finally:
+        _trace_enabled.reset(trace_token)
+        _job_id.reset(job_token)
+
+
+def trace(*args):
+    """Строка трассировки: без флага задачи (или SERP_TRACE) ничего не пишет"""
+    if not is_trace_enabled():
+        return
+    message = ' '.join(str(arg) for arg in args).strip('\n')
+    if message.strip():
+        setup_logging()
+        _trace_logger.debug(message)
@@ -2,6 +2,9 @@
 """
 Вспомогательные функции для работы с конкурентами в SERP-анализе
 """
+from utils.logging_setup import get_logger
+
+logger = get_logger('serp_competitors')
 
 def get_campaign_domain(campaign_id: int, connection) -> str:
     """
@@ -27,161 +30,259 @@ def get_campaign_domain(campaign_id: int, connection) -> str:
         return None
         
     except Exception as e:
-        print(f"❌ Error getting campaign domain: {e}")
+        logger.error(f"❌ Error getting campaign domain: {e}")
         return None
 
 
-def save_serp_competitors(connection, serp_analysis_id: int, organic_results: list, paid_results: list, maps_results: list, campaign_id: int):
+def lock_keyword_for_analysis(connection, keyword_id: int):
+    """
+    Блокирует строку ключевого слова до конца транзакции
+    
+    Вызывается перед записью нового анализа слова: параллельные анализы
+    одного слова сохраняются по очереди, и каждый считает дельту
+    конкурентности от уже сохранённого предыдущего анализа.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id FROM keywords WHERE id = %s FOR UPDATE", (keyword_id,))
+    finally:
+        cursor.close()
+
+
+def save_serp_competitors(connection, serp_analysis_id: int, organic_results: list, paid_results: list, maps_results: list, campaign_id: int, context=None):
     """
     Сохранение конкурентов из SERP-анализа в БД с установкой флага is_new
+    
+    Выполняется тремя запросами независимо от числа доменов:
+    один multi-row INSERT новых доменов, один SELECT их ID
+    и один multi-row INSERT появлений.
+    
+    context - SerpAnalysisContext задачи (домен кампании берётся из кэша)
     """
     cursor = connection.cursor()
     
     try:
         # Получаем домен нашего сайта
-        our_domain = get_campaign_domain(campaign_id, connection)
+        if context is not None:
+            our_domain = context.campaign_domain(campaign_id)
+        else:
+            our_domain = get_campaign_domain(campaign_id, connection)
         if our_domain:
             our_domain = our_domain.lower()
-            print(f"   📌 Наш домен: {our_domain}")
+            logger.debug(f"📌 Наш домен: {our_domain}")
         
-        # Собираем все домены из результатов
+        # Собираем все появления доменов из результатов
         all_domains = []
+        for result_type, items in (('organic', organic_results), ('paid', paid_results), ('maps', maps_results)):
+            for item in items:
+                domain = item.get('domain', '').lower().strip()
+                if domain and domain != our_domain:
+                    all_domains.append({
+                        'domain': domain,
+                        'position': item.get('position'),
+                        'url': item.get('url', ''),
+                        'title': item.get('title', ''),
+                        'result_type': result_type
+                    })
         
-        # Органические результаты
-        for item in organic_results:
-            domain = item.get('domain', '').lower().strip()
-            if domain and domain != our_domain:
-                all_domains.append({
-                    'domain': domain,
-                    'position': item.get('organic_position'),
-                    'url': item.get('url', ''),
-                    'title': item.get('title', ''),
-                    'result_type': 'organic'
-                })
-        
-        # Рекламные результаты
-        for item in paid_results:
-            domain = item.get('domain', '').lower().strip()
-            if domain and domain != our_domain:
-                all_domains.append({
-                    'domain': domain,
-                    'position': item.get('position'),
-                    'url': item.get('url', ''),
-                    'title': item.get('title', ''),
-                    'result_type': 'paid'
-                })
-        
-        # Карты
-        for item in maps_results:
-            domain = item.get('domain', '').lower().strip()
-            if domain and domain != our_domain:
-                all_domains.append({
-                    'domain': domain,
-                    'position': item.get('position'),
-                    'url': item.get('url', ''),
-                    'title': item.get('title', ''),
-                    'result_type': 'maps'
-                })
-        
-        unique_domains = list(set([d['domain'] for d in all_domains]))
-        print(f"   📊 Найдено уникальных доменов: {len(unique_domains)}")
-        
-        # Обрабатываем каждый уникальный домен
-        for domain in unique_domains:
-            # Проверяем, существует ли домен
-            cursor.execute("SELECT id, is_new FROM competitor_schools WHERE domain = %s", (domain,))
-            existing = cursor.fetchone()
-            
-            if not existing:
-                # ✅ НОВЫЙ ДОМЕН - добавляем с is_new=TRUE
-                try:
-                    cursor.execute("""
-                        INSERT INTO competitor_schools (domain, org_type, is_new, created_at, updated_at)
-                        VALUES (%s, 'Школа', TRUE, NOW(), NOW())
-                    """, (domain,))
-                    competitor_id = cursor.lastrowid
-                    print(f"      ✅ НОВЫЙ конкурент добавлен: {domain} (id={competitor_id}, is_new=TRUE)")
-                except Exception as insert_error:
-                    print(f"      ⚠️ Ошибка добавления {domain}: {insert_error}")
-                    # Если ошибка уникальности - пытаемся получить существующий
-                    cursor.execute("SELECT id FROM competitor_schools WHERE domain = %s", (domain,))
-                    existing = cursor.fetchone()
-                    if existing:
-                        competitor_id = existing['id']
-                    else:
-                        continue
-            else:
-                competitor_id = existing['id']
-                is_new_flag = existing.get('is_new', False)
-                print(f"      ℹ️ Существующий конкурент: {domain} (id={competitor_id}, is_new={is_new_flag})")
-            
-            # Добавляем записи о всех появлениях этого домена
-            domain_items = [d for d in all_domains if d['domain'] == domain]
-            for item in domain_items:
-                try:
-                    cursor.execute("""
-                        INSERT INTO serp_competitor_appearances 
-                        (serp_analysis_id, competitor_id, position, result_type, url, title, created_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, NOW())
-                    """, (
-                        serp_analysis_id,
-                        competitor_id,
-                        item['position'],
-                        item['result_type'],
-                        item['url'],
-                        item['title']
-                    ))
-                except Exception as appearance_error:
-                    print(f"      ⚠️ Ошибка добавления appearance для {domain}: {appearance_error}")
-        
-        # Обновляем конкурентность после добавления
-        update_competitors_competitiveness(connection)
-        
-        print(f"   ✅ Конкуренты из SERP сохранены, коммит...")
+        # Уникальные домены в порядке появления
+        unique_domains = list(dict.fromkeys(d['domain'] for d in all_domains))
+        logger.debug(f"📊 Найдено уникальных доменов: {len(unique_domains)}")
+        
+        if not unique_domains:
+            # Конкурентов нет - домены прошлого анализа ключа теряют конкурентность
+            update_competitiveness_for_analysis(connection, serp_analysis_id, set())
+            return
+        
+        # 1. Новые домены добавляем одним запросом с is_new=TRUE,
+        #    существующие не трогаем
+        values_sql = ', '.join(["(%s, 'Школа', TRUE, NOW(), NOW())"] * len(unique_domains))
+        cursor.execute(f"""
+            INSERT INTO competitor_schools (domain, org_type, is_new, created_at, updated_at)
+            VALUES {values_sql}
+            ON DUPLICATE KEY UPDATE id = id
+        """, unique_domains)
+        new_count = cursor.rowcount
+        if new_count:
+            logger.info(f"✅ НОВЫХ конкурентов добавлено: {new_count} (is_new=TRUE)")
+        
+        # 2. ID всех доменов одним запросом
+        placeholders = ', '.join(['%s'] * len(unique_domains))
+        cursor.execute(f"""
+            SELECT id, domain FROM competitor_schools WHERE domain IN ({placeholders})
+        """, unique_domains)
+        competitor_ids = {row['domain'].lower(): row['id'] for row in cursor.fetchall()}
+        
+        # 3. Все появления одним запросом
+        appearance_params = []
+        for item in all_domains:
+            competitor_id = competitor_ids.get(item['domain'])
+            if competitor_id is None:
+                logger.warning(f"⚠️ Не найден ID конкурента для {item['domain']}")
+                continue
+            appearance_params.extend([
+                serp_analysis_id,
+                competitor_id,
+                item['position'],
+                item['result_type'],
+                item['url'],
+                item['title']
+            ])
+        
+        if appearance_params:
+            values_sql = ', '.join(['(%s, %s, %s, %s, %s, %s, NOW())'] * (len(appearance_params) // 6))
+            cursor.execute(f"""
+                INSERT INTO serp_competitor_appearances 
+                (serp_analysis_id, competitor_id, position, result_type, url, title, created_at)
+                VALUES {values_sql}
+            """, appearance_params)
+        
+        # Инкрементально обновляем конкурентность только затронутых доменов
+        update_competitiveness_for_analysis(connection, serp_analysis_id, set(competitor_ids.values()))
+        
+        logger.debug("✅ Конкуренты из SERP сохранены")
         
     except Exception as e:
-        print(f"   ❌ Ошибка сохранения конкурентов: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Ошибка сохранения конкурентов: {e}")
         raise  # Пробрасываем ошибку дальше
     finally:
         cursor.close()
 
 
+def update_competitiveness_for_analysis(connection, serp_analysis_id: int, competitor_ids: set):
+    """
+    Инкрементальное обновление конкурентности после нового SERP-анализа
+    
+    Конкурентность = число ключевых слов, в последнем анализе которых
+    встречается домен. Новый анализ заменяет предыдущий анализ того же
+    ключевого слова, поэтому меняются только домены из разницы двух наборов:
+    ушедшие из выдачи получают -1, появившиеся +1.
+    
+    competitor_ids - ID конкурентов, найденных в новом анализе
+    
+    Вызывающий код блокирует слово (lock_keyword_for_analysis) до записи
+    анализа; предыдущий анализ читается блокирующим чтением, т.е. с учётом
+    анализов, закоммиченных после начала транзакции.
+    """
+    cursor = connection.cursor()
+    
+    try:
+        cursor.execute("""
+            SELECT keyword_id, analysis_date
+            FROM serp_analysis_history
+            WHERE id = %s
+        """, (serp_analysis_id,))
+        analysis = cursor.fetchone()
+        if not analysis:
+            return
+        
+        analysis_date = analysis['analysis_date']
+        
+        cursor.execute("""
+            SELECT MAX(id) as prev_id
+            FROM serp_analysis_history
+            WHERE keyword_id = %s AND id <> %s
+            LOCK IN SHARE MODE
+        """, (analysis['keyword_id'], serp_analysis_id))
+        prev_id = cursor.fetchone()['prev_id']
+        
+        # Домены нового анализа видели сейчас
+        if competitor_ids:
+            placeholders = ', '.join(['%s'] * len(competitor_ids))
+            cursor.execute(f"""
+                UPDATE competitor_schools 
+                SET last_seen_at = %s
+                WHERE id IN ({placeholders})
+                AND (last_seen_at IS NULL OR last_seen_at < %s)
+            """, [analysis_date, *competitor_ids, analysis_date])
+        
+        # Анализ старее уже сохранённого - на конкурентность не влияет
+        if prev_id and prev_id > serp_analysis_id:
+            return
+        
+        previous_ids = set()
+        if prev_id:
+            cursor.execute("""
+                SELECT DISTINCT competitor_id 
+                FROM serp_competitor_appearances 
+                WHERE serp_analysis_id = %s
+                LOCK IN SHARE MODE
+            """, (prev_id,))
+            previous_ids = {row['competitor_id'] for row in cursor.fetchall()}
+        
+        added = competitor_ids - previous_ids
+        removed = previous_ids - competitor_ids
+        
+        if added:
+            placeholders = ', '.join(['%s'] * len(added))
+            cursor.execute(f"""
+                UPDATE competitor_schools 
+                SET competitiveness = COALESCE(competitiveness, 0) + 1
+                WHERE id IN ({placeholders})
+            """, list(added))
+        
+        if removed:
+            placeholders = ', '.join(['%s'] * len(removed))
+            cursor.execute(f"""
+                UPDATE competitor_schools 
+                SET competitiveness = GREATEST(COALESCE(competitiveness, 0) - 1, 0)
+                WHERE id IN ({placeholders})
+            """, list(removed))
+        
+        logger.debug(f"📊 Конкурентность: +1 для {len(added)}, -1 для {len(removed)} доменов")
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка обновления конкурентности: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
 def update_competitors_competitiveness(connection):
     """
-    Обновление конкурентности для всех конкурентов
+    Полный пересчёт конкурентности для всех конкурентов
+    
+    Нужен для сверки (кнопка пересчёта, после ручной чистки истории,
+    ежедневно в scripts/serp_retention.py) - при SERP-анализе конкурентность
+    поддерживается update_competitiveness_for_analysis.
     """
     cursor = connection.cursor()
     
     try:
         cursor.execute("""
             UPDATE competitor_schools c
+            LEFT JOIN (
+                SELECT sca.competitor_id, COUNT(DISTINCT sa.keyword_id) as cnt
+                FROM (
+                    SELECT MAX(id) as id 
+                    FROM serp_analysis_history 
+                    GROUP BY keyword_id
+                ) latest
+                JOIN serp_analysis_history sa ON sa.id = latest.id
+                JOIN serp_competitor_appearances sca ON sca.serp_analysis_id = sa.id
+                GROUP BY sca.competitor_id
+            ) agg ON agg.competitor_id = c.id
+            LEFT JOIN (
+                SELECT sca.competitor_id, MAX(sa.analysis_date) as last_seen
+                FROM serp_competitor_appearances sca
+                JOIN serp_analysis_history sa ON sca.serp_analysis_id = sa.id
+                GROUP BY sca.competitor_id
+            ) seen ON seen.competitor_id = c.id
             SET 
-                competitiveness = (
-                    SELECT COUNT(DISTINCT sa.keyword_id)
-                    FROM serp_competitor_appearances sca
-                    JOIN serp_analysis_history sa ON sca.serp_analysis_id = sa.id
-                    WHERE sca.competitor_id = c.id
-                    AND sa.id IN (
-                        SELECT MAX(id) 
-                        FROM serp_analysis_history 
-                        GROUP BY keyword_id
-                    )
-                ),
-                last_seen_at = (
-                    SELECT MAX(sa.analysis_date)
-                    FROM serp_competitor_appearances sca
-                    JOIN serp_analysis_history sa ON sca.serp_analysis_id = sa.id
-                    WHERE sca.competitor_id = c.id
-                ),
-                updated_at = NOW()
+                c.competitiveness = COALESCE(agg.cnt, 0),
+                -- История могла быть почищена (serp_retention): last_seen_at
+                -- только сдвигается вперёд и не сбрасывается в NULL
+                c.last_seen_at = GREATEST(
+                    COALESCE(seen.last_seen, c.last_seen_at),
+                    COALESCE(c.last_seen_at, seen.last_seen)
+                )
         """)
         updated = cursor.rowcount
-        print(f"   📊 Обновлена конкурентность для {updated} записей")
+        logger.info(f"📊 Обновлена конкурентность для {updated} записей")
+        return updated
         
     except Exception as e:
-        print(f"❌ Ошибка обновления конкурентности: {e}")
+        logger.error(f"❌ Ошибка обновления конкурентности: {e}")
         raise
     finally:
-        cursor.close()
\ No newline at end of file
+        cursor.close()
@@ -0,0 +1,114 @@
+# backend/utils/serp_context.py
+"""
+Контекст SERP-анализа: справочные данные, общие для всех слов одной задачи
+"""
+import threading
+import time
+from config import Config
+from utils.logging_setup import get_logger
+from utils.serp_competitors_helper import get_campaign_domain
+
+logger = get_logger('serp_context')
+
+# Версия набора школ в этом процессе - увеличивается при любом изменении
+# competitor_schools через API, чтобы контексты запущенных задач перечитали набор
+_school_domains_version = 0
+_school_domains_version_lock = threading.Lock()
+
+def invalidate_school_domains():
+    """Сообщает запущенным SERP-задачам, что список школ изменился"""
+    global _school_domains_version
+    with _school_domains_version_lock:
+        _school_domains_version += 1
+
+def load_school_domains(connection) -> set:
+    """
+    Загружает домены школ-конкурентов из БД
+    ТОЛЬКО обработанные школы (is_new=FALSE и org_type='Школа')
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT domain 
+            FROM competitor_schools 
+            WHERE is_new = FALSE 
+            AND org_type = 'Школа'
+        """)
+        
+        domains = set()
+        for row in cursor.fetchall():
+            if row['domain']:
+                domain = row['domain'].lower()
+                # Убираем www. если есть
+                if domain.startswith('www.'):
+                    domain = domain[4:]
+                domains.add(domain)
+        return domains
+    finally:
+        cursor.close()
+
+def school_domains_fingerprint(connection) -> tuple:
+    """
+    Контрольная сумма набора школ: одна строка вместо всей таблицы.
+    Меняется при добавлении, удалении и смене типа/статуса школы
+    (в т.ч. из другого процесса).
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) AS cnt, COALESCE(SUM(CRC32(domain)), 0) AS checksum
+            FROM competitor_schools
+            WHERE is_new = FALSE 
+            AND org_type = 'Школа'
+        """)
+        row = cursor.fetchone()
+        return (row['cnt'], int(row['checksum']))
+    finally:
+        cursor.close()
+
+
+class SerpAnalysisContext:
+    """
+    Кэш доменов кампаний и набора школ на время одной SERP-задачи.
+    
+    Домены кампаний загружаются один раз на кампанию. Набор школ
+    перечитывается только если он изменился: сразу после изменений через
+    API этого процесса и не чаще раза в recheck_interval секунд по
+    контрольной сумме из БД (изменения из других процессов).
+    """
+    
+    def __init__(self, connection, recheck_interval: float = None):
+        self.connection = connection
+        self.recheck_interval = Config.SERP_CONTEXT_RECHECK_INTERVAL if recheck_interval is None else recheck_interval
+        self._campaign_domains = {}
+        self._school_domains = None
+        self._fingerprint = None
+        self._version = None
+        self._checked_at = 0.0
+    
+    def campaign_domain(self, campaign_id: int) -> str:
+        """Домен нашего сайта для кампании (None, если не указан)"""
+        if campaign_id not in self._campaign_domains:
+            self._campaign_domains[campaign_id] = get_campaign_domain(campaign_id, self.connection)
+        return self._campaign_domains[campaign_id]
+    
+    def school_domains(self) -> set:
+        """Актуальный набор доменов школ-конкурентов"""
+        now = time.monotonic()
+        
+        if self._school_domains is None or self._version != _school_domains_version:
+            self._reload_school_domains(now)
+        elif now - self._checked_at >= self.recheck_interval:
+            self._checked_at = now
+            if school_domains_fingerprint(self.connection) != self._fingerprint:
+                self._reload_school_domains(now)
+        
+        return self._school_domains
+    
+    def _reload_school_domains(self, now: float):
+        self._version = _school_domains_version
+        self._fingerprint = school_domains_fingerprint(self.connection)
+        self._school_domains = load_school_domains(self.connection)
+        self._checked_at = now
+        
+        logger.info(f"📋 Загружено ОБРАБОТАННЫХ школ (org_type='Школа', is_new=FALSE): {len(self._school_domains)}")
@@ -0,0 +1,121 @@
+# backend/utils/streaming.py
+"""
+Потоковая выдача больших выборок (JSON / NDJSON)
+
+Строки читаются серверным курсором (SSDictCursor) и сразу отдаются клиенту,
+поэтому память не растёт с размером результата, а первый байт уходит
+до окончания выборки.
+"""
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+import pymysql.cursors
+from flask import Response, stream_with_context
+from services.db_pool import get_connection
+
+STREAM_FORMATS = ('ndjson', 'stream')
+CHUNK_SIZE = 64 * 1024
+
+
+def get_stream_format(args):
+    """Формат потоковой выдачи из query параметра format (None - обычный JSON)"""
+    fmt = (args.get('format') or '').lower()
+    return fmt if fmt in STREAM_FORMATS else None
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+
+def iter_query_rows(query: str, params=None):
+    """
+    Генератор строк запроса через серверный курсор на отдельном соединении пула
+    Если клиент оборвал чтение, соединение закрывается, а не дочитывается.
+    """
+    connection = get_connection()
+    cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+    completed = False
+    try:
+        cursor.execute(query, params)
+        for row in cursor:
+            yield row
+        completed = True
+    finally:
+        if completed:
+            cursor.close()
+            connection.close()
+        else:
+            # Недочитанный результат блокирует соединение - выбрасываем его из пула
+            connection.invalidate()
+
+
+def stream_query_response(query: str, params, format_row, fmt: str, envelope: dict = None, items_key: str = 'data') -> Response:
+    """
+    Потоковый ответ для запроса
+
+    fmt = 'ndjson' - по одной строке JSON на запись (application/x-ndjson)
+    fmt = 'stream' - обычный JSON-объект: поля envelope, массив items_key и count
+    format_row - преобразование строки БД в dict (None - пропустить строку)
+    """
+    def generate_ndjson():
+        for row in iter_query_rows(query, params):
+            item = format_row(row)
+            if item is not None:
+                yield to_json(item) + '\n'
+
+    def generate_json():
+        head = to_json(envelope or {})[:-1]
+        yield head + (', ' if len(head) > 1 else '') + f'"{items_key}": ['
+        count = 0
+        for row in iter_query_rows(query, params):
+            item = format_row(row)
+            if item is None:
+                continue
+            yield (', ' if count else '') + to_json(item)
+            count += 1
+        yield f'], "count": {count}}}'
+
+    if fmt == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
+
+def stream_text_response(text, accept_gzip: bool, mimetype: str = 'application/json') -> Response:
+    """
+    Отдаёт большой текст кусками по CHUNK_SIZE
+    Если клиент принимает gzip, куски сжимаются на лету (Content-Encoding: gzip).
+    """
+    data = text.encode('utf-8') if isinstance(text, str) else text
+
+    def generate_plain():
+        for offset in range(0, len(data), CHUNK_SIZE):
+            yield data[offset:offset + CHUNK_SIZE]
+
+    def generate_gzip():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in generate_plain():
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    if not accept_gzip:
+        response = Response(generate_plain(), mimetype=mimetype)
+        response.headers['Content-Length'] = str(len(data))
+        return response
+
+    response = Response(generate_gzip(), mimetype=mimetype)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,41 @@
+# backend/utils/ttl_cache.py
+"""
+Простой потокобезопасный кэш с временем жизни записей
+Используется для ответов API, которые дорого собирать и которые
+меняются только при записи (см. invalidate)
+"""
+import threading
+import time
+
+
+class TTLCache:
+    """Кэш в памяти процесса: значения живут не дольше ttl секунд"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Значение по ключу или None, если его нет или оно устарело"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key=None):
+        """Сброс одного ключа или всего кэша"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
@@ -16,7 +16,8 @@ const ApplySerpModal = ({ show, onHide, onApply, selectedKeywords }) => {
       browser_screen_width: 1920,
       browser_screen_height: 1080,
       se_domain: '',
-      skip_analyzed: true
+      skip_analyzed: true,
+      mode: 'live'
     });
 
   // Список локаций загружается из БД
@@ -269,6 +270,24 @@ const ApplySerpModal = ({ show, onHide, onApply, selectedKeywords }) => {
             </Col>
           </Row>
 
+          <Row className="mb-3">
+            <Col md={12}>
+              <Form.Group>
+                <Form.Label>⚙️ Режим анализа:</Form.Label>
+                <Form.Select
+                  value={params.mode}
+                  onChange={(e) => setParams(prev => ({ ...prev, mode: e.target.value }))}
+                >
+                  <option value="live">Live - результат сразу</option>
+                  <option value="standard">Стандартная очередь - дешевле, для больших объёмов</option>
+                </Form.Select>
+                <Form.Text className="text-muted">
+                  Стандартная очередь DataForSeo выполняет задачи за несколько минут и продолжает работу после перезапуска сервера
+                </Form.Text>
+              </Form.Group>
+            </Col>
+          </Row>
+
           <Row className="mb-3">
             <Col md={6}>
               <Form.Group>
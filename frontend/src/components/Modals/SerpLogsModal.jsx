@@ -34,6 +34,10 @@ const SerpLogsModal = ({ show, onHide, selectedKeywordIds = null, adGroupId = nu
   
   // Новый state для вкладок в деталях
   const [detailsTab, setDetailsTab] = useState('full');
+  
+  // Список приходит без parsed_items и raw_response - догружаем по клику
+  const [detailsLoading, setDetailsLoading] = useState(false);
+  const [rawLoadingId, setRawLoadingId] = useState(null);
 
   useEffect(() => {
       if (show) {
@@ -51,6 +55,56 @@ const SerpLogsModal = ({ show, onHide, selectedKeywordIds = null, adGroupId = nu
       }
     }, [show, selectedKeywordIds, adGroupId]);
 
+  // raw_response нужен только вкладкам "Полная выдача" и "Сырые данные"
+  useEffect(() => {
+    if (!selectedLog || selectedLog.raw_response !== undefined) return;
+    if (detailsTab !== 'full' && detailsTab !== 'raw') return;
+    if (rawLoadingId === selectedLog.id) return;
+    loadLogRaw(selectedLog.id);
+  }, [selectedLog?.id, selectedLog?.raw_response, detailsTab, rawLoadingId]);
+
+  const selectLog = (log) => {
+    setSelectedLog(log);
+    setActiveTab('details');
+    setDetailsTab('full'); // Сброс на первую вкладку
+    if (log.parsed_items === undefined) {
+      loadLogDetails(log.id);
+    }
+  };
+
+  const loadLogDetails = async (logId) => {
+    setDetailsLoading(true);
+    
+    try {
+      const response = await api.getSerpLogDetails(logId);
+      
+      if (response.success && response.log) {
+        setSelectedLog(prev => (prev && prev.id === logId ? { ...prev, ...response.log } : prev));
+      }
+    } catch (err) {
+      console.error('Error loading SERP log details:', err);
+    } finally {
+      setDetailsLoading(false);
+    }
+  };
+
+  const loadLogRaw = async (logId) => {
+    setRawLoadingId(logId);
+    let rawResponse = null;
+    
+    try {
+      rawResponse = await api.getSerpLogRaw(logId);
+    } catch (err) {
+      // 404 - raw-ответ не сохранён для этого анализа
+      if (err.response?.status !== 404) {
+        console.error('Error loading raw response:', err);
+      }
+    } finally {
+      setSelectedLog(prev => (prev && prev.id === logId ? { ...prev, raw_response: rawResponse } : prev));
+      setRawLoadingId(null);
+    }
+  };
+
   const loadAllLogs = async () => {
     setLoading(true);
     setError(null);
@@ -228,11 +282,7 @@ const SerpLogsModal = ({ show, onHide, selectedKeywordIds = null, adGroupId = nu
           {displayLogs.map((log, idx) => (
             <tr 
               key={log.id}
-              onClick={() => {
-                setSelectedLog(log);
-                setActiveTab('details');
-                setDetailsTab('full'); // Сброс на первую вкладку
-              }}
+              onClick={() => selectLog(log)}
               style={{ cursor: 'pointer' }}
             >
               <td>{idx + 1}</td>
@@ -317,6 +367,13 @@ const SerpLogsModal = ({ show, onHide, selectedKeywordIds = null, adGroupId = nu
     );
   };
 
+  const renderDetailsLoading = (text) => (
+    <div className="text-center py-4">
+      <Spinner animation="border" size="sm" className="me-2" />
+      <small className="text-muted">{text}</small>
+    </div>
+  );
+
   const renderLogDetails = () => {
     if (!selectedLog) {
       return (
@@ -543,6 +600,10 @@ const SerpLogsModal = ({ show, onHide, selectedKeywordIds = null, adGroupId = nu
 
 // ИСПРАВЛЕННАЯ ФУНКЦИЯ: Полная выдача
 const renderFullSerp = (log) => {
+  if (log.raw_response === undefined) {
+    return renderDetailsLoading('Загрузка выдачи...');
+  }
+
   // Собираем все элементы в один массив с типами
   const allItems = [];
 
@@ -730,6 +791,10 @@ const getTypeBadge = (type) => {
   // Отображение только органики
 // Отображение только органики
 const renderOrganicOnly = (log) => {
+  if (detailsLoading && log.organic_results === undefined) {
+    return renderDetailsLoading('Загрузка результатов...');
+  }
+
   if (!log.organic_results || log.organic_results.length === 0) {
     return (
       <Alert variant="warning">
@@ -791,6 +856,10 @@ const renderOrganicOnly = (log) => {
   
   // Отображение сырых данных
     const renderRawData = (log) => {
+      if (log.raw_response === undefined) {
+        return renderDetailsLoading('Загрузка raw-ответа...');
+      }
+    
       if (!log.raw_response) {
         return (
           <Alert variant="warning">
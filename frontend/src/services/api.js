@@ -3,6 +3,9 @@ import axios from 'axios';
 
 const API_BASE_URL = '/api';
 
+// Сколько подряд переподключений SSE без единого события допускать
+const SSE_MAX_RECONNECTS = 5;
+
 const api = {
   // Keywords
   getKeywords: async (adGroupId) => {
@@ -10,6 +13,15 @@ const api = {
     return response.data;
   },
 
+  // Delta-синхронизация: только изменения с момента sync_token
+  // (строки за последние минуты приходят повторно - заменять по id)
+  getKeywordChanges: async (adGroupId, since) => {
+    const response = await axios.get(`${API_BASE_URL}/keywords/changes/${adGroupId}`, {
+      params: since ? { since } : {}
+    });
+    return response.data;
+  },
+
   addKeywords: async (adGroupId, keywords) => {
     const response = await axios.post(`${API_BASE_URL}/keywords/add`, {
       ad_group_id: adGroupId,
@@ -70,8 +82,8 @@ const api = {
     try {
       const keywordsCount = requestParams.keyword_ids.length;
       
-      // Для 1 слова - обычный запрос без SSE (быстро)
-      if (keywordsCount === 1) {
+      // Для 1 слова - обычный запрос без SSE (быстро), кроме стандартной очереди
+      if (keywordsCount === 1 && requestParams.mode !== 'standard') {
         const response = await axios.post(`${API_BASE_URL}/dataforseo/apply-serp`, requestParams);
         console.log('📨 Response:', response.data);
         return response.data;
@@ -93,18 +105,14 @@ const api = {
           
           console.log('🔄 Connecting to SSE:', sseUrl);
           
+          // Ограничения по времени нет: сервер шлёт heartbeat, а после обрыва
+          // EventSource сам переподключается с Last-Event-ID
           const eventSource = new EventSource(sseUrl);
           let isResolved = false;
-          
-          const timeout = setTimeout(() => {
-            if (!isResolved) {
-              console.warn('⏱️ SSE timeout');
-              eventSource.close();
-              reject(new Error('SSE connection timeout'));
-            }
-          }, 300000);
+          let reconnectAttempts = 0;
           
           eventSource.onmessage = (event) => {
+            reconnectAttempts = 0;
             try {
               const data = JSON.parse(event.data);
               console.log('📡 SSE event:', data.type);
@@ -114,7 +122,6 @@ const api = {
                   onProgress(data.current, data.total, data.keyword);
                 }
               } else if (data.type === 'complete') {
-                clearTimeout(timeout);
                 eventSource.close();
                 isResolved = true;
                 resolve({
@@ -123,7 +130,6 @@ const api = {
                   ...data.result
                 });
               } else if (data.type === 'error') {
-                clearTimeout(timeout);
                 eventSource.close();
                 isResolved = true;
                 reject(new Error(data.message || 'SERP analysis failed'));
@@ -135,8 +141,15 @@ const api = {
           
           eventSource.onerror = (error) => {
             console.error('❌ SSE connection error:', error);
+            reconnectAttempts += 1;
+            
+            // Браузер переподключается сам, пока соединение не закрыто окончательно
+            if (eventSource.readyState === EventSource.CONNECTING && reconnectAttempts <= SSE_MAX_RECONNECTS) {
+              console.warn(`🔄 SSE reconnect attempt ${reconnectAttempts}`);
+              return;
+            }
+            
             if (!isResolved) {
-              clearTimeout(timeout);
               eventSource.close();
               isResolved = true;
               resolve({
@@ -166,11 +179,24 @@ const api = {
       if (params.keyword_ids) queryParams.append('keyword_ids', params.keyword_ids);
       if (params.ad_group_id) queryParams.append('ad_group_id', params.ad_group_id);
       if (params.latest_only !== undefined) queryParams.append('latest_only', params.latest_only);
+      if (params.include) queryParams.append('include', params.include);
       
       const response = await axios.get(`${API_BASE_URL}/dataforseo/serp-logs?${queryParams.toString()}`);
       return response.data;
     },
     
+    // Детали одного анализа (с parsed_items) - загружаются по клику
+    getSerpLogDetails: async (logId) => {
+      const response = await axios.get(`${API_BASE_URL}/dataforseo/serp-logs/${logId}`);
+      return response.data;
+    },
+    
+    // Полный raw_response одного анализа (сжимается сервером)
+    getSerpLogRaw: async (logId) => {
+      const response = await axios.get(`${API_BASE_URL}/dataforseo/serp-logs/${logId}/raw`);
+      return response.data;
+    },
+    
     recalculateSchoolPercentages: async (logIds) => {
       const response = await axios.post(`${API_BASE_URL}/dataforseo/recalculate-school-percentages`, {
         log_ids: logIds
@@ -178,6 +204,17 @@ const api = {
       return response.data;
     },
 
+  // Фоновые задачи (SERP анализ, сбор ключевых слов)
+  getJob: async (jobId) => {
+    const response = await axios.get(`${API_BASE_URL}/jobs/${jobId}`);
+    return response.data;
+  },
+
+  cancelJob: async (jobId) => {
+    const response = await axios.post(`${API_BASE_URL}/jobs/${jobId}/cancel`);
+    return response.data;
+  },
+
   // Settings
   getSettings: async () => {
     const response = await axios.get(`${API_BASE_URL}/settings/get`);